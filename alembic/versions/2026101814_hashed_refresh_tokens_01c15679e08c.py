@@ -0,0 +1,68 @@
+"""hashed refresh tokens
+
+Revision ID: 01c15679e08c
+Revises: 5b1e0c7d2a94
+Create Date: 2026-10-18 14:03:51.207714
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "01c15679e08c"
+down_revision = "5b1e0c7d2a94"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "refresh_token",
+        sa.Column("token_hash", sa.LargeBinary(length=32), nullable=True),
+    )
+    # existing tokens stay valid, the app hashes tokens with sha256 of their utf-8 bytes
+    op.execute(
+        "UPDATE refresh_token SET token_hash = sha256(convert_to(refresh_token, 'UTF8'))"
+    )
+    op.alter_column("refresh_token", "token_hash", nullable=False)
+    op.drop_index(op.f("ix_refresh_token_refresh_token"), table_name="refresh_token")
+    op.drop_column("refresh_token", "refresh_token")
+    op.create_index(
+        op.f("ix_refresh_token_token_hash"),
+        "refresh_token",
+        ["token_hash"],
+        unique=True,
+    )
+    op.create_index(
+        op.f("ix_refresh_token_exp"), "refresh_token", ["exp"], unique=False
+    )
+    # a partial index predicate must be immutable, so it cannot compare exp to
+    # now(), expired rows are removed by the reaper instead
+    op.create_index(
+        "ix_refresh_token_user_id_unused",
+        "refresh_token",
+        ["user_id"],
+        unique=False,
+        postgresql_where=sa.text("NOT used"),
+    )
+
+
+def downgrade() -> None:
+    # the tokens cannot be recovered from their hashes, everyone logs in again
+    op.drop_index("ix_refresh_token_user_id_unused", table_name="refresh_token")
+    op.drop_index(op.f("ix_refresh_token_exp"), table_name="refresh_token")
+    op.drop_index(op.f("ix_refresh_token_token_hash"), table_name="refresh_token")
+    op.execute("DELETE FROM refresh_token")
+    op.drop_column("refresh_token", "token_hash")
+    op.add_column(
+        "refresh_token",
+        sa.Column("refresh_token", sa.String(length=512), nullable=False),
+    )
+    op.create_index(
+        op.f("ix_refresh_token_refresh_token"),
+        "refresh_token",
+        ["refresh_token"],
+        unique=True,
+    )
@@ -1,6 +1,15 @@
 # Llamaindex imports
+import asyncio
+import uuid
+from typing import Any, AsyncIterator, Callable, get_args
 from llama_index.llms.openai import OpenAI
-from llama_index.agent.openai import OpenAIAgent
+from llama_index.llms.openai.utils import OpenAIToolCall
+from llama_index.agent.openai import OpenAIAgentWorker
+from llama_index.core.agent import AgentRunner
+from llama_index.core.agent.types import Task, TaskStep, TaskStepOutput
+from llama_index.core.agent.utils import add_user_step_to_memory
+from llama_index.core.base.llms.types import ChatResponse, MessageRole
+from llama_index.core.chat_engine.types import ChatResponseMode
 from llama_index.tools.exa import ExaToolSpec
 from llama_index.core.workflow import (
     Event,
@@ -20,6 +29,198 @@ from pydantic import Field
 
 
 
+class ParallelOpenAIAgentWorker(OpenAIAgentWorker):
+    """OpenAIAgentWorker that runs all tool calls of one LLM turn concurrently.
+
+    Same as `OpenAIAgentWorker._arun_step`, except the tool calls are gathered
+    instead of awaited one by one. Copied from llama-index-agent-openai 0.2.9,
+    compare with the installed version when upgrading it.
+    """
+
+    async def _arun_step(
+        self,
+        step: TaskStep,
+        task: Task,
+        mode: ChatResponseMode = ChatResponseMode.WAIT,
+        tool_choice: str | dict = "auto",
+    ) -> TaskStepOutput:
+        if step.input is not None:
+            add_user_step_to_memory(
+                step, task.extra_state["new_memory"], verbose=self._verbose
+            )
+
+        tools = self.get_tools(task.input)
+        openai_tools = [tool.metadata.to_openai_tool() for tool in tools]
+
+        llm_chat_kwargs = self._get_llm_chat_kwargs(task, openai_tools, tool_choice)
+        agent_chat_response = await self._get_async_agent_response(
+            task, mode=mode, **llm_chat_kwargs
+        )
+
+        latest_tool_calls = self.get_latest_tool_calls(task) or []
+        is_done = not self._should_continue(
+            latest_tool_calls, task.extra_state["n_function_calls"]
+        )
+
+        if not is_done:
+            for tool_call in latest_tool_calls:
+                if not isinstance(tool_call, get_args(OpenAIToolCall)):
+                    raise ValueError("Invalid tool_call object")
+                if tool_call.type != "function":
+                    raise ValueError("Invalid tool type. Unsupported by OpenAI")
+
+            return_direct = await asyncio.gather(
+                *(
+                    self._acall_function(
+                        tools,
+                        tool_call,
+                        task.extra_state["new_memory"],
+                        task.extra_state["sources"],
+                    )
+                    for tool_call in latest_tool_calls
+                )
+            )
+            task.extra_state["n_function_calls"] += len(latest_tool_calls)
+
+            if len(latest_tool_calls) == 1 and return_direct[0]:
+                is_done = True
+                response_str = task.extra_state["sources"][-1].content
+                chat_response = ChatResponse(
+                    message=ChatMessage(role=MessageRole.ASSISTANT, content=response_str)
+                )
+                agent_chat_response = self._process_message(task, chat_response)
+                agent_chat_response.is_dummy_stream = mode == ChatResponseMode.STREAM
+
+        new_steps = (
+            [step.get_next_step(step_id=str(uuid.uuid4()), input=None)]
+            if not is_done
+            else []
+        )
+
+        return TaskStepOutput(
+            output=agent_chat_response,
+            task_step=step,
+            is_last=is_done,
+            next_steps=new_steps,
+        )
+
+
+def build_agent(tool_list, system_prompt: str, llm: OpenAI) -> AgentRunner:
+    """OpenAI agent whose tool calls of a single turn run concurrently."""
+    worker = ParallelOpenAIAgentWorker.from_tools(
+        tool_list, llm=llm, verbose=True, system_prompt=system_prompt
+    )
+    return AgentRunner(worker, llm=llm, callback_manager=llm.callback_manager)
+
+
+class ProgressWorkflow(Workflow):
+    """Workflow that reports every event its steps emit to a `progress` callback.
+
+    Used by the job subsystem (`app.api.jobs`) to persist per-step progress.
+    """
+
+    def __init__(self, *args: Any, progress: Callable[[Event], None] | None = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._progress = progress
+
+    def send_event(self, message: Event, step: str | None = None) -> None:
+        super().send_event(message, step)
+        if self._progress is not None:
+            self._progress(message)
+
+    async def run(self, **kwargs: Any) -> Any:
+        try:
+            return await super().run(**kwargs)
+        except asyncio.CancelledError:
+            # Workflow.run leaves the step tasks running when it gets cancelled
+            for task in self._tasks:
+                task.cancel()
+            self._tasks = set()
+            raise
+
+
+async def init_run_state(ctx: Context, chat_history) -> dict:
+    """Reset the per-run state kept in the workflow Context.
+
+    Flows are instantiated per request, so nothing run specific may live on the
+    class or instance - steps read and write the report through the Context.
+    """
+    report = {}
+    await ctx.set("report", report)
+    await ctx.set("chat_history", chat_history)
+    return report
+
+
+def trend_analysis_tools() -> list:
+    exa_tool = ExaToolSpec(
+        api_key=get_settings().EXA_API_KEY
+    )
+
+    tool_list = [FunctionTool.from_defaults(tools.perplexity_ai_search, async_fn=tools.perplexity_ai_search,
+                    name="perplexity_ai_search", 
+                    description="You can use this tool, to understand concepts or search for certain queries for elaboration. Useful when conducting research using Perplexity AI online model."
+                    ),
+
+                FunctionTool.from_defaults(tools.youtube_search, async_fn=tools.youtube_search,
+                    name="youtube_search", 
+                    description="Use this tool for searching YouTube videos for related topics. Make sure to pay attention to views and views to subscriber ratios."
+                    ),
+                
+                FunctionTool.from_defaults(tools.channel_details_tool, async_fn=tools.channel_details_tool,
+                    name="channel_details_tool", 
+                    description="Use this tool to retrieve details of a specific YouTube channel, like the subscriber count and channel description."
+                    ),
+
+                FunctionTool.from_defaults(tools.youtube_video_details, async_fn=tools.youtube_video_details,
+                    name="youtube_video_details", 
+                    description="Use this tool for retrieving detailed information about a youtube video, like the views, publish date, like count, channel id."
+                    ),
+
+                FunctionTool.from_defaults(tools.transcribe_video, async_fn=tools.transcribe_video,
+                    name="transcribe_video", 
+                    description="Transcribe a YouTube video using Youtube Transcriptor RapidAPI."
+                    ),
+
+                FunctionTool.from_defaults(tools.avatar_information, async_fn=tools.avatar_information,
+                    name="Avatar", 
+                    description="use it to find out more about our target audience, our avatars. Their information about interests, age, employment and other information about them."
+                    )
+    ]
+
+    tool_list.extend(exa_tool.to_tool_list())
+    return tool_list
+
+
+def seo_tools() -> list:
+    exa_tool = ExaToolSpec(
+        api_key=get_settings().EXA_API_KEY
+    )
+
+    tool_list = [FunctionTool.from_defaults(tools.google_promise, async_fn=tools.google_promise,
+                    name="google_promise", 
+                    description="Google Promise Keyword Tool used via RapidAPI, that should be used whenever you need to find information about current search volumes and popularity on any topic and keyword or phrase. It runs both dedicated global search for English language. You can also do dedicated location research by specifying country, like US or GB. Purpose: Fetches keyword data, including search volume, competition, and related keywords, from Google Keyword Planner via RapidAPI. Make sure that the input is no longer than 1-2 words"
+                    )
+    ]
+
+    tool_list.extend(exa_tool.to_tool_list())
+    return tool_list
+
+
+def content_strategy_tools() -> list:
+    tool_list = [
+                FunctionTool.from_defaults(tools.ultimatebrain_information, async_fn=tools.ultimatebrain_information,
+                    name="scripting_brain", 
+                    description="This is the scripting_brain that contains a lot of curated distilled knowledge about scripting, content creation, AI and optimal way to write youtube video scripts. It contains a lot of viable useful crucial key information for perfect youtube video masterpiece creation process. Especially titles, thumbnails, hooks, payoffs, cognitive bias, retention methods etc."
+                    ),
+
+                FunctionTool.from_defaults(tools.avatar_information, async_fn=tools.avatar_information,
+                    name="Avatar", 
+                    description="use it to find out more about our target audience, our avatars. Their information about interests, age, employment and other information about them."
+                    )
+    ]
+    return tool_list
+
+
 class SEO_Platform_Strategist(Event):
     input: str
 
@@ -30,132 +231,192 @@ class Target_Audience_Trend_Alchemist(Event):
     input: str
 
 
-class IdeationFlow(Workflow):
+class IdeationFlow(ProgressWorkflow):
     llm = OpenAI(api_key=get_settings().OPENAI_API_KEY, model=get_settings().RESEARCH_LLM_NAME)
-    
-    chat_history = []
-    report = {}
 
     @step()
-    async def start_agent_flow(self, ev: StartEvent) -> Target_Audience_Trend_Alchemist:
+    async def start_agent_flow(self, ctx: Context, ev: StartEvent) -> Target_Audience_Trend_Alchemist:
         
         initial_input = ev.input
-        self.chat_history = ev.chat_history
-        prompt = f"Here is the initial topic I need youtube ideas on - {initial_input}. \n\n The chat history with the brainstorming agent is: {self.chat_history}"
+        chat_history = ev.chat_history
+        await init_run_state(ctx, chat_history)
+        prompt = f"Here is the initial topic I need youtube ideas on - {initial_input}. \n\n The chat history with the brainstorming agent is: {chat_history}"
         
         return Target_Audience_Trend_Alchemist(input=str(prompt))
 
     @step()
-    async def trend_analysis(self, ev: Target_Audience_Trend_Alchemist) -> SEO_Platform_Strategist:
+    async def trend_analysis(self, ctx: Context, ev: Target_Audience_Trend_Alchemist) -> SEO_Platform_Strategist:
         input = ev.input
         
         system_prompt= prompts.Target_Audience_Trend_Alchemist_Prompt
 
-        exa_tool = ExaToolSpec(
-            api_key=get_settings().EXA_API_KEY
-        )
+        tool_list = trend_analysis_tools()
 
-        tool_list = [FunctionTool.from_defaults(tools.perplexity_ai_search, 
-                        name="perplexity_ai_search", 
-                        description="You can use this tool, to understand concepts or search for certain queries for elaboration. Useful when conducting research using Perplexity AI online model."
-                        ),
+        agent = build_agent(tool_list, system_prompt, self.llm)
 
-                    FunctionTool.from_defaults(tools.youtube_search, 
-                        name="youtube_search", 
-                        description="Use this tool for searching YouTube videos for related topics. Make sure to pay attention to views and views to subscriber ratios."
-                        ),
-                    
-                    FunctionTool.from_defaults(tools.channel_details_tool, 
-                        name="channel_details_tool", 
-                        description="Use this tool to retrieve details of a specific YouTube channel, like the subscriber count and channel description."
-                        ),
+        response = await agent.achat(input)
+        await tools.save_outputs_in_notion(str(response), f"Trend And Audience Analysis - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+        report = await ctx.get("report")
+        report["Trend_And_Audience_Analysis"] = str(response)
 
-                    FunctionTool.from_defaults(tools.youtube_video_details, 
-                        name="youtube_video_details", 
-                        description="Use this tool for retrieving detailed information about a youtube video, like the views, publish date, like count, channel id."
-                        ),
+        return SEO_Platform_Strategist(input=str(response))
+        # return StopEvent(result=str(response))
 
-                    FunctionTool.from_defaults(tools.transcribe_video, 
-                        name="transcribe_video", 
-                        description="Transcribe a YouTube video using Youtube Transcriptor RapidAPI."
-                        ),
+    @step()
+    async def seo_optimization(self, ctx: Context, ev: SEO_Platform_Strategist) -> Content_Strategist_Prompt_Weaver:
 
-                    FunctionTool.from_defaults(tools.avatar_information, 
-                        name="Avatar", 
-                        description="use it to find out more about our target audience, our avatars. Their information about interests, age, employment and other information about them."
-                        )
-        ]
+        chat_history = await ctx.get("chat_history")
+        input = f"Here is the output of the Target Audience Trend Alchemist: {ev.input}. I need you to validate the topics, titles, and thumbnails for search optimization.  \n\n The chat history with the brainstorming agent is: {chat_history}"
 
-        tool_list.extend(exa_tool.to_tool_list())
+        system_prompt= prompts.SEO_Platform_Strategist_Prompt
 
-        agent = OpenAIAgent.from_tools(tool_list, verbose=True, system_prompt=system_prompt, llm=self.llm)
+        tool_list = seo_tools()
 
-        response = agent.chat(input)
-        tools.save_outputs_in_notion(str(response), f"Trend And Audience Analysis - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-        self.report["Trend_And_Audience_Analysis"] = str(response)
+        agent = build_agent(tool_list, system_prompt, self.llm)
 
-        return SEO_Platform_Strategist(input=str(response))
-        # return StopEvent(result=str(response))
+        response = await agent.achat(input)
+
+        await tools.save_outputs_in_notion(str(response), f"SEO Analysis - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+        
+        report = await ctx.get("report")
+        report["SEO_Analysis"] = str(response)
+
+        return Content_Strategist_Prompt_Weaver(input=str(response))
+        
 
     @step()
-    async def seo_optimization(self, ev: SEO_Platform_Strategist) -> Content_Strategist_Prompt_Weaver:
+    async def content_strategy(self, ctx: Context, ev: Content_Strategist_Prompt_Weaver) -> StopEvent:
 
-        input = f"Here is the output of the Target Audience Trend Alchemist: {ev.input}. I need you to validate the topics, titles, and thumbnails for search optimization.  \n\n The chat history with the brainstorming agent is: {self.chat_history}"
+        report = await ctx.get("report")
+        chat_history = await ctx.get("chat_history")
+        input = f"This is the output of the Target_Audience_Trend_Alchemist: {report["Trend_And_Audience_Analysis"]}. \n\n This is the output of the SEO_Platform_Strategist:  {report["SEO_Analysis"]}   \n\n The chat history with the brainstorming agent is: {chat_history}"
 
-        system_prompt= prompts.SEO_Platform_Strategist_Prompt
+        system_prompt= prompts.Content_Strategist_Prompt_Weaver_Prompt
 
-        exa_tool = ExaToolSpec(
-            api_key=get_settings().EXA_API_KEY
-        )
+        tool_list = content_strategy_tools()
+        agent = build_agent(tool_list, system_prompt, self.llm)
 
-        tool_list = [FunctionTool.from_defaults(tools.google_promise, 
-                        name="google_promise", 
-                        description="Google Promise Keyword Tool used via RapidAPI, that should be used whenever you need to find information about current search volumes and popularity on any topic and keyword or phrase. It runs both dedicated global search for English language. You can also do dedicated location research by specifying country, like US or GB. Purpose: Fetches keyword data, including search volume, competition, and related keywords, from Google Keyword Planner via RapidAPI. Make sure that the input is no longer than 1-2 words"
-                        )
-        ]
+        response = await agent.achat(input)
 
-        tool_list.extend(exa_tool.to_tool_list())
+        await tools.save_outputs_in_notion(str(response), f"Content Strategist - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+
+        report["Content_Strategist_Prompt_Weaver"] = str(response)
 
-        agent = OpenAIAgent.from_tools(tool_list, verbose=True, system_prompt=system_prompt, llm=self.llm)
+        return StopEvent(result=str(response))
 
-        response = agent.chat(input)
 
-        tools.save_outputs_in_notion(str(response), f"SEO Analysis - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-        
-        self.report["SEO_Analysis"] = str(response)
+class Trend_Research(Event):
+    input: str
 
-        return Content_Strategist_Prompt_Weaver(input=str(response))
-        
+class Keyword_Research(Event):
+    input: str
+
+class Avatar_Profiling(Event):
+    input: str
+
+class Ideation_Branch_Done(Event):
+    input: str
+
+
+class ParallelIdeationFlow(ProgressWorkflow):
+    """Fan-out/fan-in variant of IdeationFlow.
+
+    Trend research, keyword pre-research on the raw topic and avatar profiling
+    run at the same time, `join_branches` waits for all three and feeds the
+    content strategist.
+    """
+    llm = OpenAI(api_key=get_settings().OPENAI_API_KEY, model=get_settings().RESEARCH_LLM_NAME)
 
     @step()
-    async def content_strategy(self, ev: Content_Strategist_Prompt_Weaver) -> StopEvent:
+    async def start_agent_flow(self, ctx: Context, ev: StartEvent) -> Trend_Research | Keyword_Research | Avatar_Profiling:
 
-        input = f"This is the output of the Target_Audience_Trend_Alchemist: {self.report["Trend_And_Audience_Analysis"]}. \n\n This is the output of the SEO_Platform_Strategist:  {self.report["SEO_Analysis"]}   \n\n The chat history with the brainstorming agent is: {self.chat_history}"
+        initial_input = ev.input
+        chat_history = ev.chat_history
+        await init_run_state(ctx, chat_history)
 
-        system_prompt= prompts.Content_Strategist_Prompt_Weaver_Prompt
+        self.send_event(Trend_Research(input=f"Here is the initial topic I need youtube ideas on - {initial_input}. \n\n The chat history with the brainstorming agent is: {chat_history}"))
+        self.send_event(Keyword_Research(input=f"Here is the initial topic I need youtube ideas on - {initial_input}. There are no titles yet, extract the keywords from the topic and research their search volume, competition and related keywords.  \n\n The chat history with the brainstorming agent is: {chat_history}"))
+        self.send_event(Avatar_Profiling(input=f"Here is the initial topic I need youtube ideas on - {initial_input}. \n\n The chat history with the brainstorming agent is: {chat_history}"))
 
-        tool_list = [
-                    FunctionTool.from_defaults(tools.ultimatebrain_information, 
-                        name="scripting_brain", 
-                        description="This is the scripting_brain that contains a lot of curated distilled knowledge about scripting, content creation, AI and optimal way to write youtube video scripts. It contains a lot of viable useful crucial key information for perfect youtube video masterpiece creation process. Especially titles, thumbnails, hooks, payoffs, cognitive bias, retention methods etc."
-                        ),
+    @step()
+    async def trend_research(self, ctx: Context, ev: Trend_Research) -> Ideation_Branch_Done:
 
-                    FunctionTool.from_defaults(tools.avatar_information, 
+        agent = build_agent(trend_analysis_tools(), prompts.Target_Audience_Trend_Alchemist_Prompt, self.llm)
+
+        response = await agent.achat(ev.input)
+
+        await tools.save_outputs_in_notion(str(response), f"Trend And Audience Analysis - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+
+        report = await ctx.get("report")
+        report["Trend_And_Audience_Analysis"] = str(response)
+
+        return Ideation_Branch_Done(input="")
+
+    @step()
+    async def keyword_research(self, ctx: Context, ev: Keyword_Research) -> Ideation_Branch_Done:
+
+        agent = build_agent(seo_tools(), prompts.SEO_Platform_Strategist_Prompt, self.llm)
+
+        response = await agent.achat(ev.input)
+
+        await tools.save_outputs_in_notion(str(response), f"SEO Analysis - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+
+        report = await ctx.get("report")
+        report["SEO_Analysis"] = str(response)
+
+        return Ideation_Branch_Done(input="")
+
+    @step()
+    async def avatar_profiling(self, ctx: Context, ev: Avatar_Profiling) -> Ideation_Branch_Done:
+
+        tool_list = [FunctionTool.from_defaults(tools.avatar_information, async_fn=tools.avatar_information,
                         name="Avatar", 
                         description="use it to find out more about our target audience, our avatars. Their information about interests, age, employment and other information about them."
                         )
-            ]
-        agent = OpenAIAgent.from_tools(tool_list, verbose=True, system_prompt=system_prompt, llm=self.llm)
+        ]
 
-        response = agent.chat(input)
+        agent = build_agent(tool_list, prompts.Avatar_Profiler_Prompt, self.llm)
 
-        tools.save_outputs_in_notion(str(response), f"Content Strategist - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+        response = await agent.achat(ev.input)
 
-        self.report["Content_Strategist_Prompt_Weaver"] = str(response)
+        report = await ctx.get("report")
+        report["Avatar_Profile"] = str(response)
+
+        return Ideation_Branch_Done(input="")
+
+    @step()
+    async def join_branches(self, ctx: Context, ev: Ideation_Branch_Done) -> Content_Strategist_Prompt_Weaver | None:
+
+        ready = ctx.collect_events(ev, [Ideation_Branch_Done] * 3)
+        if ready is None:
+            return None
+
+        report = await ctx.get("report")
+        chat_history = await ctx.get("chat_history")
+        input = f"This is the output of the Target_Audience_Trend_Alchemist: {report["Trend_And_Audience_Analysis"]}. \n\n This is the keyword research of the SEO_Platform_Strategist:  {report["SEO_Analysis"]}   \n\n This is the profile of our target audience: {report["Avatar_Profile"]}   \n\n The chat history with the brainstorming agent is: {chat_history}"
+
+        return Content_Strategist_Prompt_Weaver(input=input)
+
+    @step()
+    async def content_strategy(self, ctx: Context, ev: Content_Strategist_Prompt_Weaver) -> StopEvent:
+
+        agent = build_agent(content_strategy_tools(), prompts.Content_Strategist_Prompt_Weaver_Prompt, self.llm)
+
+        response = await agent.achat(ev.input)
+
+        await tools.save_outputs_in_notion(str(response), f"Content Strategist - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+
+        report = await ctx.get("report")
+        report["Content_Strategist_Prompt_Weaver"] = str(response)
 
         return StopEvent(result=str(response))
 
 
+IDEATION_FLOWS = {
+    "serial": IdeationFlow,
+    "parallel": ParallelIdeationFlow,
+}
+
 
 class Research_Navigator(Event):
     input: str
@@ -164,63 +425,63 @@ class Knowledge_Curator_Fact_Checker(Event):
     input: str
 
 
-class ResearchFlow(Workflow):
+class ResearchFlow(ProgressWorkflow):
     llm = OpenAI(api_key=get_settings().OPENAI_API_KEY, model=get_settings().RESEARCH_LLM_NAME)
-    
-    report = {}
-    chat_history = []
 
     @step()
-    async def start_agent_flow(self, ev: StartEvent) -> Research_Navigator:
+    async def start_agent_flow(self, ctx: Context, ev: StartEvent) -> Research_Navigator:
         
         initial_input = ev.input
         ideation_output = ev.ideation
-        self.chat_history = ev.chat_history
-        prompt = f"Here is the initial topic - {initial_input}. \n I need you to find statistics, studies, examples from reputable scientific sources and store properly. \n\n Here are the 3 idea sets finalized: {ideation_output}.  \n\n The chat history with the brainstorming agent is: {self.chat_history}"
+        chat_history = ev.chat_history
+        await init_run_state(ctx, chat_history)
+        prompt = f"Here is the initial topic - {initial_input}. \n I need you to find statistics, studies, examples from reputable scientific sources and store properly. \n\n Here are the 3 idea sets finalized: {ideation_output}.  \n\n The chat history with the brainstorming agent is: {chat_history}"
         
         return Research_Navigator(input=str(prompt))
 
     @step()
-    async def research_navigator(self, ev: Research_Navigator) -> Knowledge_Curator_Fact_Checker:
+    async def research_navigator(self, ctx: Context, ev: Research_Navigator) -> Knowledge_Curator_Fact_Checker:
         input = str(ev.input)
         
         system_prompt= prompts.Research_Navigator_Prompt
 
-        tool_list = [FunctionTool.from_defaults(tools.Med_Articles_PMC, 
+        tool_list = [FunctionTool.from_defaults(tools.Med_Articles_PMC, async_fn=tools.Med_Articles_PMC,
                         name="Med_Articles_PMC", 
                         description="Fetches medical literature data from the Europe PMC API. Use it to find scientific news - new research, letters, case reports and reviews from medical world."
                         ),
 
-                    FunctionTool.from_defaults(tools.Semantic_Scholar_Tool, 
+                    FunctionTool.from_defaults(tools.Semantic_Scholar_Tool, async_fn=tools.Semantic_Scholar_Tool,
                         name="Semantic_Scholar_Tool", 
                         description="Use this tool to access a free, AI-powered research tool for scientific literature."
                         ),
                     
-                    FunctionTool.from_defaults(tools.PubMed_Tool, 
+                    FunctionTool.from_defaults(tools.PubMed_Tool, async_fn=tools.PubMed_Tool,
                         name="PubMed_Tool", 
                         description="Searches PubMed NCBI Database for medical publications and research papers."
                         ),
 
-                    FunctionTool.from_defaults(tools.Google_Scholar_Tool, 
+                    FunctionTool.from_defaults(tools.Google_Scholar_Tool, async_fn=tools.Google_Scholar_Tool,
                         name="Google_Scholar_Tool", 
                         description="Fetches scholarly articles from Google Scholar using SerpAPI"
                         )
         ]
 
-        agent = OpenAIAgent.from_tools(tool_list, verbose=True, system_prompt=system_prompt, llm=self.llm)
+        agent = build_agent(tool_list, system_prompt, self.llm)
 
         response = await agent.achat(input)
 
-        tools.save_outputs_in_notion(str(response), f"Research Navigator - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+        await tools.save_outputs_in_notion(str(response), f"Research Navigator - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
 
-        self.report["Research_Navigator"] = str(response)
+        report = await ctx.get("report")
+        report["Research_Navigator"] = str(response)
 
         return Knowledge_Curator_Fact_Checker(input=str(response))
 
     @step()
-    async def knowledge_curator(self, ev: Knowledge_Curator_Fact_Checker) -> StopEvent:
+    async def knowledge_curator(self, ctx: Context, ev: Knowledge_Curator_Fact_Checker) -> StopEvent:
 
-        input = f"Here is the output of the Research_Navigator: {ev.input}.  \n\n The chat history with the brainstorming agent is: {self.chat_history}"
+        chat_history = await ctx.get("chat_history")
+        input = f"Here is the output of the Research_Navigator: {ev.input}.  \n\n The chat history with the brainstorming agent is: {chat_history}"
 
         system_prompt= prompts.Knowledge_Curator_Fact_Checker_Prompt
 
@@ -228,17 +489,17 @@ class ResearchFlow(Workflow):
             api_key=get_settings().EXA_API_KEY
         )
 
-        tool_list = [FunctionTool.from_defaults(tools.perplexity_ai_search, 
+        tool_list = [FunctionTool.from_defaults(tools.perplexity_ai_search, async_fn=tools.perplexity_ai_search,
                         name="perplexity_ai_search", 
                         description="You can use this tool, to understand concepts or search for certain queries for elaboration. Useful when conducting research using Perplexity AI online model. You can also use this to fetch the content from the urls returns by Research_Navigator"
                         ),
 
-                    FunctionTool.from_defaults(tools.save_in_notion, 
+                    FunctionTool.from_defaults(tools.save_in_notion, async_fn=tools.save_in_notion,
                         name="save_in_notion", 
                         description="Use this to save research to Notion database. It accepts the content, title and list of DOIs of the research articles in the content like this DOI1, DOI2, DOI3..."
                         ),
 
-                    FunctionTool.from_defaults(tools.upsert_to_qdrant, 
+                    FunctionTool.from_defaults(tools.upsert_to_qdrant, async_fn=tools.upsert_to_qdrant,
                         name="upsert_to_qdrant", 
                         description="Use this to upsert the notion page's data into Qdrant Vector Store. Example input: page_id: 3c8babb6-0666-48e6-a584-444ddf7a008f"
                         )
@@ -247,13 +508,14 @@ class ResearchFlow(Workflow):
 
         tool_list.extend(exa_tool.to_tool_list())
 
-        agent = OpenAIAgent.from_tools(tool_list, verbose=True, system_prompt=system_prompt, llm=self.llm)
+        agent = build_agent(tool_list, system_prompt, self.llm)
 
         response = await agent.achat(input)
 
-        tools.save_outputs_in_notion(str(response), f"Knowledge Curator Fact Checker - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+        await tools.save_outputs_in_notion(str(response), f"Knowledge Curator Fact Checker - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
 
-        self.report["Knowledge_Curator_Fact_Checker"] = str(response)
+        report = await ctx.get("report")
+        report["Knowledge_Curator_Fact_Checker"] = str(response)
 
         return StopEvent(result=str(response))
         
@@ -269,95 +531,96 @@ class MR_BEAST_EVALUATOR(Event):
 class Evaluate_Score(Event):
     input: str
 
-class ScriptingFlow(Workflow):
+class ScriptingFlow(ProgressWorkflow):
     llm = OpenAI(api_key=get_settings().OPENAI_API_KEY, model=get_settings().RESEARCH_LLM_NAME)
-    
-    report = {}
-    chat_history = []
 
     @step()
-    async def start_agent_flow(self, ev: StartEvent) -> Lead_Scriptwriter_Engagement_Maestro:
+    async def start_agent_flow(self, ctx: Context, ev: StartEvent) -> Lead_Scriptwriter_Engagement_Maestro:
         
         ideation_output = ev.ideation
         research_output = ev.research
 
-        self.chat_history = ev.chat_history
-        self.report["ideation_output"] = ideation_output
-        self.report["research_output"] = research_output
+        chat_history = ev.chat_history
+        report = await init_run_state(ctx, chat_history)
+        report["ideation_output"] = ideation_output
+        report["research_output"] = research_output
 
-        prompt = f"Here is the chosen set from output of Team 1 (Ideation Workflow): {ideation_output}. \n\n Here is the output of Team 2 (Medical Researcher): {research_output}  \n\n The chat history is: {self.chat_history}"
+        prompt = f"Here is the chosen set from output of Team 1 (Ideation Workflow): {ideation_output}. \n\n Here is the output of Team 2 (Medical Researcher): {research_output}  \n\n The chat history is: {chat_history}"
         
         return Lead_Scriptwriter_Engagement_Maestro(input=str(prompt))
 
     @step()
-    async def scriptwriter(self, ev: Lead_Scriptwriter_Engagement_Maestro) -> GEORGE_BLACKMAN_EVALUATOR | MR_BEAST_EVALUATOR:
+    async def scriptwriter(self, ctx: Context, ev: Lead_Scriptwriter_Engagement_Maestro) -> GEORGE_BLACKMAN_EVALUATOR | MR_BEAST_EVALUATOR:
         input = ev.input
         
         system_prompt= prompts.Scriptwriter_Prompt
 
-        tool_list = [FunctionTool.from_defaults(tools.avatar_information, 
+        tool_list = [FunctionTool.from_defaults(tools.avatar_information, async_fn=tools.avatar_information,
                         name="Avatar", 
                         description="use it to find out more about our target audience, our avatars. Their information about interests, age, employment and other information about them."
                         ),
 
-                    FunctionTool.from_defaults(tools.sugarbrain_information, 
+                    FunctionTool.from_defaults(tools.sugarbrain_information, async_fn=tools.sugarbrain_information,
                         name="Ultimate_Brain", 
                         description="Use it to retrieve all the important information for current script in terms of scientific knowledge. It contains research papers, notes, insights, conclusions, scientific review articles and much more relating to current problem we are trying to tackle in the video. Use it always."
                         ),
-                    FunctionTool.from_defaults(tools.ultimatebrain_information, 
+                    FunctionTool.from_defaults(tools.ultimatebrain_information, async_fn=tools.ultimatebrain_information,
                         name="scripting_brain", 
                         description="This is a database that contains a lot of curated distilled knowledge about scripting, content creation and optimal way to write youtube video scripts. It contains a lot of viable, useful, crucial, key information for perfect, masterpiece youtube video content creation process."
                         ),
-                    FunctionTool.from_defaults(tools.search_notion_pages, 
+                    FunctionTool.from_defaults(tools.search_notion_pages, async_fn=tools.search_notion_pages,
                         name="search_notion_pages", 
                         description="Use this to search for relevent research articles to add references in the script."
                         ),
-                    FunctionTool.from_defaults(tools.extract_notion_page_content, 
+                    FunctionTool.from_defaults(tools.extract_notion_page_content, async_fn=tools.extract_notion_page_content,
                         name="extract_notion_page_content", 
                         description="Use this to extract the page content from notion"
                         )
         ]
 
-        agent = OpenAIAgent.from_tools(tool_list, verbose=True, system_prompt=system_prompt, llm=self.llm)
+        agent = build_agent(tool_list, system_prompt, self.llm)
 
-        response = agent.chat(input)
+        response = await agent.achat(input)
 
-        self.report["Final_Script"] = str(response)
+        report = await ctx.get("report")
+        report["Final_Script"] = str(response)
         
-        tools.save_outputs_in_notion(str(response), f"Final Script - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+        await tools.save_outputs_in_notion(str(response), f"Final Script - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
         
         self.send_event(GEORGE_BLACKMAN_EVALUATOR(input=str(response)))
         self.send_event(MR_BEAST_EVALUATOR(input=str(response)))
 
     @step()
-    async def mr_beast_evaluator(self, ev: MR_BEAST_EVALUATOR) -> Evaluate_Score:
+    async def mr_beast_evaluator(self, ctx: Context, ev: MR_BEAST_EVALUATOR) -> Evaluate_Score:
         input = ev.input
         
         system_prompt= prompts.MR_BEAST_EVALUATOR
 
         tool_list = []
 
-        agent = OpenAIAgent.from_tools(tool_list, verbose=True, system_prompt=system_prompt, llm=self.llm)
+        agent = build_agent(tool_list, system_prompt, self.llm)
 
-        response = agent.chat(input)
+        response = await agent.achat(input)
 
-        self.report["MR_BEAST_SCORE"] = str(response)
+        report = await ctx.get("report")
+        report["MR_BEAST_SCORE"] = str(response)
 
         return Evaluate_Score(input="")
 
     @step()
-    async def gorge_blackman_evaluator(self, ev: GEORGE_BLACKMAN_EVALUATOR) -> Evaluate_Score:
+    async def gorge_blackman_evaluator(self, ctx: Context, ev: GEORGE_BLACKMAN_EVALUATOR) -> Evaluate_Score:
         input = ev.input
         
         system_prompt= prompts.GEORGE_BLACKMAN_EVALUATOR
 
         tool_list = []
 
-        agent = OpenAIAgent.from_tools(tool_list, verbose=True, system_prompt=system_prompt, llm=self.llm)
+        agent = build_agent(tool_list, system_prompt, self.llm)
 
-        response = agent.chat(input)
+        response = await agent.achat(input)
 
-        self.report["GEORGE_BLACKMAN_SCORE"] = str(response)
+        report = await ctx.get("report")
+        report["GEORGE_BLACKMAN_SCORE"] = str(response)
 
         return Evaluate_Score(input="")
 
@@ -368,26 +631,28 @@ class ScriptingFlow(Workflow):
         if ready is None:
             return None
 
-        print(self.report["GEORGE_BLACKMAN_SCORE"])
-        print(self.report["MR_BEAST_SCORE"])
+        report = await ctx.get("report")
+
+        print(report["GEORGE_BLACKMAN_SCORE"])
+        print(report["MR_BEAST_SCORE"])
 
-        GEORGE_BLACKMAN_SCORE = self.report["GEORGE_BLACKMAN_SCORE"]
-        MR_BEAST_SCORE = self.report["MR_BEAST_SCORE"]
+        GEORGE_BLACKMAN_SCORE = report["GEORGE_BLACKMAN_SCORE"]
+        MR_BEAST_SCORE = report["MR_BEAST_SCORE"]
 
         if check_total_mb_score(GEORGE_BLACKMAN_SCORE) or check_total_mb_score(MR_BEAST_SCORE):
-            input = f'''This is the final script that was generated: {self.report["Final_Script"]}. 
-            Here is the chosen set from output of Team 1 (Ideation Workflow): {ideation_output}. 
-            Here is the output of Team 2 (Medical Researcher): {research_output}. 
+            input = f'''This is the final script that was generated: {report["Final_Script"]}. 
+            Here is the chosen set from output of Team 1 (Ideation Workflow): {report["ideation_output"]}. 
+            Here is the output of Team 2 (Medical Researcher): {report["research_output"]}. 
             Current date & time: {datetime.now().strftime("%Y-%m-%d %H:%M")}
             The score given to the final script by gorge blackman & Mr Beast is as following:
-            GEORGE_BLACKMAN_SCORE: {self.report["GEORGE_BLACKMAN_SCORE"]}
-            MR_BEAST_SCORE: {self.report["MR_BEAST_SCORE"]}
+            GEORGE_BLACKMAN_SCORE: {report["GEORGE_BLACKMAN_SCORE"]}
+            MR_BEAST_SCORE: {report["MR_BEAST_SCORE"]}
 
             The score wasn't up to mark. Please recreate the script again.
             '''
             return Lead_Scriptwriter_Engagement_Maestro(input=input)
         else:
-            return StopEvent(result=self.report)
+            return StopEvent(result=report)
 
 def check_total_mb_score(score_string):
     try:
@@ -408,37 +673,59 @@ def check_total_mb_score(score_string):
         print("Invalid input format.")
         return None
 
-async def modify_script(script: str, input: str, chat_history):
+def build_modification_agent() -> AgentRunner:
     llm = OpenAI(api_key=get_settings().OPENAI_API_KEY, model=get_settings().RESEARCH_LLM_NAME)
     tool_list = [
-                    FunctionTool.from_defaults(tools.search_notion_pages, 
+                    FunctionTool.from_defaults(tools.search_notion_pages, async_fn=tools.search_notion_pages,
                         name="search_notion_pages", 
                         description="Use this to search for relevent research articles to add references in the script."
                         ),
-                    FunctionTool.from_defaults(tools.extract_notion_page_content, 
+                    FunctionTool.from_defaults(tools.extract_notion_page_content, async_fn=tools.extract_notion_page_content,
                         name="extract_notion_page_content", 
                         description="Use this to extract the page content from notion"
                         )
         ]
+    return build_agent(tool_list, prompts.SCRIPT_MODIFICATION_PROMPT, llm)
+
+async def modify_script(script: str, input: str, chat_history):
     agent_input = f"The script is:{script}. The modification request is: {input} \n\n The chat history is: {chat_history}"
-    agent = OpenAIAgent.from_tools(tool_list, verbose=True, system_prompt=prompts.SCRIPT_MODIFICATION_PROMPT, llm=llm)
-    response = agent.chat(agent_input)
+    agent = build_modification_agent()
+    response = await agent.achat(agent_input)
     # resp = OpenAI(api_key=get_settings().OPENAI_API_KEY, model=get_settings().RESEARCH_LLM_NAME).chat(messages)
 
     return str(response)
 
-async def generate_final_new_script(initial_script: str, modification_prompt:str, modified_script: str):
-       
-    messages = [
+async def astream_modify_script(script: str, input: str, chat_history) -> AsyncIterator[str]:
+    """Streaming variant of `modify_script`, yields the answer tokens as they arrive."""
+    agent_input = f"The script is:{script}. The modification request is: {input} \n\n The chat history is: {chat_history}"
+    agent = build_modification_agent()
+    response = await agent.astream_chat(agent_input)
+    async for token in response.async_response_gen():
+        yield token
+
+def final_new_script_messages(initial_script: str, modification_prompt:str, modified_script: str) -> list[ChatMessage]:
+    return [
         ChatMessage(
             role="system", content="You are a skilled script writer and editor tasked with generating a final script based on the initial script, modification request and the modified script"
         ),
         ChatMessage(role="user", content=f"Generate the complete final script. \n\n This is the initial script: {initial_script} \n\n This is was the modification request: {modification_prompt} \n\n This is the modified script response based on the request: {modified_script}"),
     ]
-    response = OpenAI(api_key=get_settings().OPENAI_API_KEY, model=get_settings().RESEARCH_LLM_NAME).chat(messages)
+
+async def generate_final_new_script(initial_script: str, modification_prompt:str, modified_script: str):
+       
+    messages = final_new_script_messages(initial_script, modification_prompt, modified_script)
+    response = await OpenAI(api_key=get_settings().OPENAI_API_KEY, model=get_settings().RESEARCH_LLM_NAME).achat(messages)
 
     return str(response)
 
+async def astream_final_new_script(initial_script: str, modification_prompt:str, modified_script: str) -> AsyncIterator[str]:
+    """Streaming variant of `generate_final_new_script`, yields the tokens as they arrive."""
+    messages = final_new_script_messages(initial_script, modification_prompt, modified_script)
+    response = await OpenAI(api_key=get_settings().OPENAI_API_KEY, model=get_settings().RESEARCH_LLM_NAME).astream_chat(messages)
+    async for chunk in response:
+        if chunk.delta:
+            yield chunk.delta
+
 async def summarize_chat_history(chat: str):
        
     messages = [
@@ -447,7 +734,21 @@ async def summarize_chat_history(chat: str):
         ),
         ChatMessage(role="user", content=f"{chat}"),
     ]
-    response = OpenAI(api_key=get_settings().OPENAI_API_KEY, model=get_settings().RESEARCH_LLM_NAME).chat(messages)
+    response = await OpenAI(api_key=get_settings().OPENAI_API_KEY, model=get_settings().RESEARCH_LLM_NAME).achat(messages)
 
     return str(response)
 
+async def update_chat_summary(summary: str, new_messages: str):
+    """Fold the messages appended since `summary` was made into it."""
+    if not summary:
+        return await summarize_chat_history(new_messages)
+
+    messages = [
+        ChatMessage(
+            role="system", content=prompts.SUMMARIZATION_PROMPT
+        ),
+        ChatMessage(role="user", content=f"This is the summary of the chat so far: \n\n {summary} \n\n These are the new messages since that summary: \n\n {new_messages} \n\n Update the summary so it covers the whole chat."),
+    ]
+    response = await OpenAI(api_key=get_settings().OPENAI_API_KEY, model=get_settings().RESEARCH_LLM_NAME).achat(messages)
+
+    return str(response)
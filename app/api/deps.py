@@ -9,6 +9,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.api import api_messages
 from app.core import database_session
 from app.core.security.jwt import verify_jwt_token
+from app.core.user_cache import get_user_cache
 from app.models import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/access-token")
@@ -19,13 +20,21 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
+async def load_user(user_id: str) -> User | None:
+    async with database_session.get_async_session() as session:
+        user: User | None = await session.scalar(
+            select(User).where(User.user_id == user_id)
+        )
+        return user
+
+
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
-    session: AsyncSession = Depends(get_session),
 ) -> User:
     token_payload = verify_jwt_token(token)
 
-    user = await session.scalar(select(User).where(User.user_id == token_payload.sub))
+    # a database session is only opened on a cache miss
+    user = await get_user_cache().get_user(token_payload.sub, load_user)
 
     if user is None:
         raise HTTPException(
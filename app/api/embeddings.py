@@ -0,0 +1,161 @@
+# Embeddings of the ingestion path, in front of the OpenAI embeddings API.
+#
+# Every text is looked up in the `embedding_cache` table by the sha256 of the
+# model name and the text, vectors are stored as float32 bytes. Only texts
+# missing from it are sent, once each even when a call repeats them (templated
+# Notion pages share many chunks), in requests of EMBEDDING_BATCH_SIZE texts.
+# The service is shared by every run, so EMBEDDING_CONCURRENCY bounds the
+# requests in flight across concurrent ingestions.
+#
+# Re-ingesting content that was embedded before costs one cache query per
+# call instead of embedding requests.
+
+
+import asyncio
+import hashlib
+import logging
+from array import array
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.pydantic_v1 import SecretStr
+from langchain_openai import OpenAIEmbeddings
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app.core import database_session
+from app.core.config import get_settings
+from app.models import EmbeddingCacheEntry
+
+logger = logging.getLogger("uvicorn")
+
+
+@dataclass
+class EmbeddingStats:
+    texts: int = 0
+    unique_texts: int = 0
+    cache_hits: int = 0
+    embedded: int = 0
+    requests: int = 0
+
+
+# stats of the ingestion run the current task belongs to, see `track_embedding_stats`
+_run_stats: ContextVar[EmbeddingStats | None] = ContextVar(
+    "embedding_run_stats", default=None
+)
+
+
+def track_embedding_stats() -> EmbeddingStats:
+    """Collect the stats of the calls made by this task and the tasks it starts."""
+    stats = EmbeddingStats()
+    _run_stats.set(stats)
+    return stats
+
+
+def cache_key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}\0{text}".encode()).digest()
+
+
+def encode_vector(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def decode_vector(data: bytes) -> list[float]:
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class EmbeddingService(Embeddings):
+    def __init__(
+        self, embeddings: OpenAIEmbeddings, batch_size: int, concurrency: int
+    ) -> None:
+        self.embeddings = embeddings
+        self.model = embeddings.model
+        self.batch_size = batch_size
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.embeddings.aembed_query(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [cache_key(self.model, text) for text in texts]
+        unique = dict(zip(keys, texts))
+        vectors = await self._cached(list(unique))
+        missing = [key for key in unique if key not in vectors]
+
+        batches = [
+            missing[start : start + self.batch_size]
+            for start in range(0, len(missing), self.batch_size)
+        ]
+        for batch_vectors in await asyncio.gather(
+            *(self._embed_batch([unique[key] for key in batch]) for batch in batches)
+        ):
+            vectors.update(batch_vectors)
+
+        new_vectors = {key: vectors[key] for key in missing}
+        await self._save(new_vectors)
+
+        if (stats := _run_stats.get()) is not None:
+            stats.texts += len(texts)
+            stats.unique_texts += len(unique)
+            stats.cache_hits += len(unique) - len(missing)
+            stats.embedded += len(missing)
+            stats.requests += len(batches)
+        return [vectors[key] for key in keys]
+
+    async def _embed_batch(self, texts: list[str]) -> dict[bytes, list[float]]:
+        async with self._semaphore:
+            vectors = await self.embeddings.aembed_documents(texts)
+        return {
+            cache_key(self.model, text): vector for text, vector in zip(texts, vectors)
+        }
+
+    async def _cached(self, keys: list[bytes]) -> dict[bytes, list[float]]:
+        if not keys:
+            return {}
+        async with database_session.get_async_session() as session:
+            rows = await session.execute(
+                select(EmbeddingCacheEntry.key, EmbeddingCacheEntry.vector).where(
+                    EmbeddingCacheEntry.key.in_(keys)
+                )
+            )
+            return {key: decode_vector(vector) for key, vector in rows}
+
+    async def _save(self, vectors: dict[bytes, list[float]]) -> None:
+        if not vectors:
+            return
+        stmt = postgresql.insert(EmbeddingCacheEntry).values(
+            [
+                {"key": key, "vector": encode_vector(vector)}
+                for key, vector in vectors.items()
+            ]
+        )
+        async with database_session.get_async_session() as session:
+            await session.execute(
+                stmt.on_conflict_do_nothing(index_elements=[EmbeddingCacheEntry.key])
+            )
+            await session.commit()
+
+
+@lru_cache(maxsize=1)
+def get_embedding_service() -> EmbeddingService:
+    settings = get_settings()
+    return EmbeddingService(
+        OpenAIEmbeddings(
+            api_key=SecretStr(settings.OPENAI_API_KEY),
+            model=settings.EMBEDDING_MODEL,
+            # one API request per batch
+            chunk_size=settings.EMBEDDING_BATCH_SIZE,
+        ),
+        batch_size=settings.EMBEDDING_BATCH_SIZE,
+        concurrency=settings.EMBEDDING_CONCURRENCY,
+    )
@@ -1,35 +1,86 @@
-# import secrets
-# import time
-# from typing import Any
-
-# from fastapi import APIRouter, Depends, HTTPException, status
-# from fastapi.security import OAuth2PasswordRequestForm
-# from sqlalchemy import select
-# from sqlalchemy.exc import IntegrityError
-# from sqlalchemy.ext.asyncio import AsyncSession
-
-# from app.api import api_messages, deps
-# from app.core.config import get_settings
-# from app.core.security.jwt import create_jwt_token
-# from app.core.security.password import (
-#     DUMMY_PASSWORD,
-#     get_password_hash,
-#     verify_password,
-# )
-# from app.models import RefreshToken, User
-# from app.schemas.requests import RefreshTokenRequest, UserCreateRequest
-# from app.schemas.responses import AccessTokenResponse, UserResponse
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api import api_messages, deps
+from app.core.security.jwt import create_jwt_token
+from app.core.security.password import (
+    averify_and_update_password,
+    averify_dummy_password,
+)
+from app.core.security.refresh_token import new_refresh_token
+from app.core.user_cache import get_user_cache
+from app.models import User
+from app.schemas.responses import AccessTokenResponse
+
+# Not mounted in app.api.api_router. The login re-hashes passwords made with
+# older settings, see app.core.security.password.
+router = APIRouter()
+
+ACCESS_TOKEN_RESPONSES: dict[int | str, dict[str, Any]] = {
+    400: {
+        "description": "Invalid email or password",
+        "content": {
+            "application/json": {"example": {"detail": api_messages.PASSWORD_INVALID}}
+        },
+    },
+}
+
+
+@router.post(
+    "/access-token",
+    response_model=AccessTokenResponse,
+    responses=ACCESS_TOKEN_RESPONSES,
+    description="OAuth2 compatible token, get an access token for future requests using username and password",
+)
+async def login_access_token(
+    session: AsyncSession = Depends(deps.get_session),
+    form_data: OAuth2PasswordRequestForm = Depends(),
+) -> AccessTokenResponse:
+    user = await session.scalar(select(User).where(User.email == form_data.username))
+
+    if user is None:
+        # this is naive method to not return early, the dummy hash is made on
+        # the pool too, never on the event loop
+        await averify_dummy_password(form_data.password)
+
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=api_messages.PASSWORD_INVALID,
+        )
+
+    verified, new_hashed_password = await averify_and_update_password(
+        form_data.password, user.hashed_password
+    )
+    if not verified:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=api_messages.PASSWORD_INVALID,
+        )
+
+    if new_hashed_password is not None:
+        # hashed with older password settings, upgrade it while the password is known
+        user.hashed_password = new_hashed_password
+        session.add(user)
+
+    jwt_token = create_jwt_token(user_id=user.user_id)
+
+    refresh_token, refresh_token_row = new_refresh_token(user.user_id)
+    session.add(refresh_token_row)
+    await session.commit()
+    if new_hashed_password is not None:
+        await get_user_cache().invalidate(user.user_id)
+
+    return AccessTokenResponse(
+        access_token=jwt_token.access_token,
+        expires_at=jwt_token.payload.exp,
+        refresh_token=refresh_token,
+        refresh_token_expires_at=refresh_token_row.exp,
+    )
 
-# router = APIRouter()
-
-# ACCESS_TOKEN_RESPONSES: dict[int | str, dict[str, Any]] = {
-#     400: {
-#         "description": "Invalid email or password",
-#         "content": {
-#             "application/json": {"example": {"detail": api_messages.PASSWORD_INVALID}}
-#         },
-#     },
-# }
 
 # REFRESH_TOKEN_RESPONSES: dict[int | str, dict[str, Any]] = {
 #     400: {
@@ -60,51 +111,6 @@
 # }
 
 
-# @router.post(
-#     "/access-token",
-#     response_model=AccessTokenResponse,
-#     responses=ACCESS_TOKEN_RESPONSES,
-#     description="OAuth2 compatible token, get an access token for future requests using username and password",
-# )
-# async def login_access_token(
-#     session: AsyncSession = Depends(deps.get_session),
-#     form_data: OAuth2PasswordRequestForm = Depends(),
-# ) -> AccessTokenResponse:
-#     user = await session.scalar(select(User).where(User.email == form_data.username))
-
-#     if user is None:
-#         # this is naive method to not return early
-#         verify_password(form_data.password, DUMMY_PASSWORD)
-
-#         raise HTTPException(
-#             status_code=status.HTTP_400_BAD_REQUEST,
-#             detail=api_messages.PASSWORD_INVALID,
-#         )
-
-#     if not verify_password(form_data.password, user.hashed_password):
-#         raise HTTPException(
-#             status_code=status.HTTP_400_BAD_REQUEST,
-#             detail=api_messages.PASSWORD_INVALID,
-#         )
-
-#     jwt_token = create_jwt_token(user_id=user.user_id)
-
-#     refresh_token = RefreshToken(
-#         user_id=user.user_id,
-#         refresh_token=secrets.token_urlsafe(32),
-#         exp=int(time.time() + get_settings().security.refresh_token_expire_secs),
-#     )
-#     session.add(refresh_token)
-#     await session.commit()
-
-#     return AccessTokenResponse(
-#         access_token=jwt_token.access_token,
-#         expires_at=jwt_token.payload.exp,
-#         refresh_token=refresh_token.refresh_token,
-#         refresh_token_expires_at=refresh_token.exp,
-#     )
-
-
 # @router.post(
 #     "/refresh-token",
 #     response_model=AccessTokenResponse,
@@ -117,7 +123,7 @@
 # ) -> AccessTokenResponse:
 #     token = await session.scalar(
 #         select(RefreshToken)
-#         .where(RefreshToken.refresh_token == data.refresh_token)
+#         .where(RefreshToken.token_hash == hash_refresh_token(data.refresh_token))
 #         .with_for_update(skip_locked=True)
 #     )
 
@@ -142,19 +148,15 @@
 
 #     jwt_token = create_jwt_token(user_id=token.user_id)
 
-#     refresh_token = RefreshToken(
-#         user_id=token.user_id,
-#         refresh_token=secrets.token_urlsafe(32),
-#         exp=int(time.time() + get_settings().security.refresh_token_expire_secs),
-#     )
-#     session.add(refresh_token)
+#     refresh_token, refresh_token_row = new_refresh_token(token.user_id)
+#     session.add(refresh_token_row)
 #     await session.commit()
 
 #     return AccessTokenResponse(
 #         access_token=jwt_token.access_token,
 #         expires_at=jwt_token.payload.exp,
-#         refresh_token=refresh_token.refresh_token,
-#         refresh_token_expires_at=refresh_token.exp,
+#         refresh_token=refresh_token,
+#         refresh_token_expires_at=refresh_token_row.exp,
 #     )
 
 
@@ -177,7 +179,7 @@
 
 #     user = User(
 #         email=new_user.email,
-#         hashed_password=get_password_hash(new_user.password),
+#         hashed_password=await aget_password_hash(new_user.password),
 #     )
 #     session.add(user)
 
@@ -191,4 +193,4 @@
 #             detail=api_messages.EMAIL_ADDRESS_ALREADY_USED,
 #         )
 
-#     return user
\ No newline at end of file
+#     return user
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, status, HTTPException, Request
-from app.api import notion
+from fastapi import APIRouter, Depends, status, HTTPException, Request, Header, Query
+from fastapi.responses import StreamingResponse
+from app.api import deps, history, jobs, notion
 import logging
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import json
-from app.api.agents import IdeationFlow, ResearchFlow, ScriptingFlow, modify_script, generate_final_new_script, summarize_chat_history
-from motor.motor_asyncio import AsyncIOMotorClient
+import base64
+from app.api.agents import IDEATION_FLOWS, ResearchFlow, ScriptingFlow, modify_script, generate_final_new_script, update_chat_summary, astream_modify_script, astream_final_new_script
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from app.core import mongo
 from app.core.config import get_settings
+from app.core.rate_limiter import rate_limiter_stats
+from app.core.user_cache import get_user_cache
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -15,9 +20,36 @@ logger = logging.getLogger("uvicorn")
 
 router = APIRouter()
 
-# MongoDB connection setup
-client = AsyncIOMotorClient(get_settings().MONGODB_URL)
-db = client.DoctorAI
+# MongoDB connection setup, read_db reads from a secondary when there is one
+db = mongo.get_database()
+read_db = mongo.get_read_database()
+
+# Created at startup, see `create_indexes`
+MONGO_INDEXES = {
+    "Message": [IndexModel([("chat_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)])],
+    "Scripts": [
+        IndexModel([("ideation_id", ASCENDING), ("chat_id", ASCENDING)]),
+        IndexModel([("chat_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "Ideation": [IndexModel([("chat_id", ASCENDING), ("created_at", DESCENDING)])],
+    "History": [IndexModel([("sessionId", ASCENDING)])],
+    "HistoryBucket": [IndexModel([("sessionId", ASCENDING), ("start", ASCENDING)], unique=True)],
+    "HistorySummary": [IndexModel([("sessionId", ASCENDING)], unique=True)],
+    "JobEvent": [IndexModel([("job_id", ASCENDING), ("seq", ASCENDING)], unique=True)],
+}
+
+MESSAGE_PROJECTION = {"message": 1, "message_type": 1, "category": 1, "timestamp": 1, "chat_id": 1}
+CHAT_PROJECTION = {"timestamp": 1, "initial_message": 1}
+
+chat_history = history.ChatHistory(db)
+
+job_manager = jobs.JobManager(
+    db.Job,
+    db.JobEvent,
+    concurrency=get_settings().AGENT_JOB_CONCURRENCY,
+    poll_interval=get_settings().AGENT_JOB_EVENTS_POLL_INTERVAL,
+    idle_timeout=get_settings().AGENT_JOB_EVENTS_IDLE_TIMEOUT,
+)
 
 
 @router.post("/upsert", description="Upsert Notion DB/Page into Qdrant")
@@ -29,15 +61,22 @@ async def upsert(request: dict):
         doc_type = request.get('doc_type')
         cleanup_mode = request.get('cleanup_mode')
         last_update_time = request.get('last_update_time', "")
+        backfill = bool(request.get('backfill', False))
 
-        response = await notion.process_notion_data(notion_id, doc_type, cleanup_mode)
+        response = await notion.process_notion_data(
+            notion_id, doc_type, cleanup_mode, backfill=backfill
+        )
 
         total_time = time.time() - start_time
         return {
             "success": True,
             "total_vectors": response["total_vectors"],
             "total_embedding_cost": response["Embedding_cost"],
+            "tokens": response["Tokens"],
             "upsert_details": response["Qdrant_result"],
+            "page_cache": response["Page_cache"],
+            "bulk_upload": response["Bulk_upload"],
+            "rebuild": response["Rebuild"],
             "cleanup_mode": cleanup_mode,
             "last_update_time": last_update_time,
             "total_process_time": total_time
@@ -46,58 +85,100 @@ async def upsert(request: dict):
     except json.JSONDecodeError:
         raise HTTPException(status_code=400,
                             detail="Invalid JSON in request body")
+    except HTTPException:
+        raise
     except Exception as error:
         logger.error(f"Error in upsert: {str(error)}")
         raise HTTPException(status_code=500, detail=str(error))
 
-@router.post("/execute_agent_teams", description="The team of agents performs a thorough research and returns high-quality, scientifically accurate scripts ready for teleprompter use")
-async def agent_team(
-        request: dict, 
-        # session: AsyncSession = Depends(get_async_session)
-    ):
-    logger.info(f"Research started")
-    start_time = time.time()
-    try:
-        initial_input = request.get('initial_input')
-        chat_id = ObjectId(request.get('chat_id'))
-        collection = db.Ideation
-
-        full_chat_history = await messages(request.get('chat_id'))
+@router.get(
+    "/rate_limits",
+    description="Current tokens and wait-time histograms of the external API rate limiters",
+    dependencies=[Depends(deps.get_current_user)],
+)
+async def get_rate_limits():
+    return {
+        "success": True,
+        "data": rate_limiter_stats()
+    }
+
+@router.get(
+    "/user_cache",
+    description="Hit rate and estimated latency saved by the authenticated user cache",
+    dependencies=[Depends(deps.get_current_user)],
+)
+async def get_user_cache_stats():
+    return {
+        "success": True,
+        "data": get_user_cache().stats()
+    }
+
+def get_ideation_topology(request: dict) -> str:
+    ideation_topology = request.get('ideation_topology') or get_settings().IDEATION_TOPOLOGY
+    if ideation_topology not in IDEATION_FLOWS:
+        raise HTTPException(status_code=400,
+                            detail=f"Invalid ideation_topology, expected one of {list(IDEATION_FLOWS)}")
+    return ideation_topology
 
-        chat_summary = await summarize_chat_history(str(full_chat_history))
+async def run_agent_teams(request: dict, ideation_topology: str, progress=None) -> dict:
+    start_time = time.time()
 
-        ideation = IdeationFlow(timeout=300, verbose=True)
+    initial_input = request.get('initial_input')
+    chat_id = ObjectId(request.get('chat_id'))
 
-        ideation_result = await ideation.run(input=initial_input, chat_history=chat_summary)
+    chat_summary = await get_chat_summary(request.get('chat_id'))
 
-        research = ResearchFlow(timeout=300, verbose=True)
+    ideation = IDEATION_FLOWS[ideation_topology](timeout=300, verbose=True, progress=progress)
 
-        research_result = await research.run(input=initial_input, ideation=ideation_result, chat_history=chat_summary)
+    ideation_start_time = time.time()
+    ideation_result = await ideation.run(input=initial_input, chat_history=chat_summary)
+    ideation_time = time.time() - ideation_start_time
 
-        total_time = time.time() - start_time
-        
-        await add_message(f"Ideation result: {ideation_result}", request.get('chat_id'), "ai")
-        await add_message(f"Research result: {research_result}", request.get('chat_id'), "ai")
+    research = ResearchFlow(timeout=300, verbose=True, progress=progress)
 
-        document = {
-            "initial_input": initial_input,
-            "ideation_result": ideation_result,
-            "research_result": research_result,
-            "process_time": total_time,
-            "chat_id": chat_id,
-            "timestamp": time.time()
-        }
+    research_result = await research.run(input=initial_input, ideation=ideation_result, chat_history=chat_summary)
 
-        # Insert document into MongoDB
-        ideation_insert_result = await collection.insert_one(document)
+    total_time = time.time() - start_time
+    
+    batch = history.WriteBatch(chat_history)
+    batch.add_message(f"Ideation result: {ideation_result}", request.get('chat_id'), "ai")
+    batch.add_message(f"Research result: {research_result}", request.get('chat_id'), "ai")
+
+    document = {
+        "initial_input": initial_input,
+        "ideation_result": ideation_result,
+        "research_result": research_result,
+        "ideation_topology": ideation_topology,
+        "ideation_time": ideation_time,
+        "process_time": total_time,
+        "chat_id": chat_id,
+        "timestamp": time.time(),
+        "created_at": datetime.now(timezone.utc)
+    }
+
+    # Insert document into MongoDB, together with the history messages
+    ideation_id = batch.insert("Ideation", document)
+    await batch.flush()
+
+    return {
+        "success": True,
+        "ideation_result": ideation_result,
+        "research_result": research_result,
+        "ideation_topology": ideation_topology,
+        "ideation_time": ideation_time,
+        "total_process_time": total_time,
+        "ideation_id": str(ideation_id)
+    }
 
-        return {
-            "success": True,
-            "ideation_result": ideation_result,
-            "research_result": research_result,
-            "total_process_time": total_time,
-            "ideation_id": str(ideation_insert_result.inserted_id)
-        }
+@router.post("/execute_agent_teams", description="The team of agents performs a thorough research and returns high-quality, scientifically accurate scripts ready for teleprompter use")
+async def agent_team(
+        request: dict, 
+        # session: AsyncSession = Depends(get_async_session)
+    ):
+    logger.info(f"Research started")
+    ideation_topology = get_ideation_topology(request)
+    try:
+        return await run_agent_teams(request, ideation_topology)
 
     except json.JSONDecodeError:
         raise HTTPException(status_code=400,
@@ -106,54 +187,57 @@ async def agent_team(
         logger.error(f"Error in upsert: {str(error)}")
         raise HTTPException(status_code=500, detail=str(error))
 
+async def run_generate_script(request: dict, progress=None) -> dict:
+    start_time = time.time()
+
+    ideation_result = request.get('ideation_result')
+    research_result = request.get('research_result')
+    ideation_id = ObjectId(request.get("ideation_id"))
+    chat_id = ObjectId(request.get('chat_id'))
+
+    chat_summary = await get_chat_summary(request.get('chat_id'))
+
+    scripting = ScriptingFlow(timeout=300, verbose=True, progress=progress)
+
+    response = await scripting.run(ideation=ideation_result, research=research_result, chat_history=chat_summary)
+
+    total_time = time.time() - start_time
+
+    batch = history.WriteBatch(chat_history)
+    batch.add_message(f"Initial Script: {response["Final_Script"]}", request.get('chat_id'), "ai")
+    batch.add_message(f"MR Beast Feedback: {response["MR_BEAST_SCORE"]}", request.get('chat_id'), "ai")
+    batch.add_message(f"George Blackman Feedback: {response["GEORGE_BLACKMAN_SCORE"]}", request.get('chat_id'), "ai")
+
+    document = {
+        "ideation_id": ideation_id,
+        "initial_input": ideation_result,
+        "initial_script": response["Final_Script"],
+        "final_script": response["Final_Script"],
+        "mr_beast_score": response["MR_BEAST_SCORE"],
+        "george_blackman_score": response["GEORGE_BLACKMAN_SCORE"],
+        "chat_id": chat_id,
+        "process_time": total_time,
+        "timestamp": time.time(),
+        "created_at": datetime.now(timezone.utc)
+    }
+
+    # Insert document into MongoDB, together with the history messages
+    batch.insert("Scripts", document)
+    await batch.flush()
+
+    return {
+        "success": True,
+        "script": response["Final_Script"],
+        "mr_beast_score": response["MR_BEAST_SCORE"],
+        "george_blackman_score": response["GEORGE_BLACKMAN_SCORE"],
+        "total_process_time": total_time
+    }
+
 @router.post("/generate_script")
 async def generate_script(request: dict):
     logger.info(f"Research started")
-    start_time = time.time()
     try:
-        ideation_result = request.get('ideation_result')
-        research_result = request.get('research_result')
-        ideation_id = ObjectId(request.get("ideation_id"))
-        chat_id = ObjectId(request.get('chat_id'))
-        
-        full_chat_history = await messages(request.get('chat_id'))
-
-        chat_summary = await summarize_chat_history(str(full_chat_history))
-        
-        collection = db.Scripts
-
-        scripting = ScriptingFlow(timeout=300, verbose=True)
-
-        response = await scripting.run(ideation=ideation_result, research=research_result, chat_history=chat_summary)
-
-        total_time = time.time() - start_time
-
-        await add_message(f"Initial Script: {response["Final_Script"]}", request.get('chat_id'), "ai")
-        await add_message(f"MR Beast Feedback: {response["MR_BEAST_SCORE"]}", request.get('chat_id'), "ai")
-        await add_message(f"George Blackman Feedback: {response["GEORGE_BLACKMAN_SCORE"]}", request.get('chat_id'), "ai")
-
-        document = {
-            "ideation_id": ideation_id,
-            "initial_input": ideation_result,
-            "initial_script": response["Final_Script"],
-            "final_script": response["Final_Script"],
-            "mr_beast_score": response["MR_BEAST_SCORE"],
-            "george_blackman_score": response["GEORGE_BLACKMAN_SCORE"],
-            "chat_id": chat_id,
-            "process_time": total_time,
-            "timestamp": time.time()
-        }
-
-        # Insert document into MongoDB
-        await collection.insert_one(document)
-
-        return {
-            "success": True,
-            "script": response["Final_Script"],
-            "mr_beast_score": response["MR_BEAST_SCORE"],
-            "george_blackman_score": response["GEORGE_BLACKMAN_SCORE"],
-            "total_process_time": total_time
-        }
+        return await run_generate_script(request)
 
     except json.JSONDecodeError:
         raise HTTPException(status_code=400,
@@ -162,6 +246,61 @@ async def generate_script(request: dict):
         logger.error(f"Error in upsert: {str(error)}")
         raise HTTPException(status_code=500, detail=str(error))
 
+@router.post("/jobs/execute_agent_teams", description="Submit the agent teams flow as a background job, returns the job id right away")
+async def submit_agent_teams_job(request: dict):
+    ideation_topology = get_ideation_topology(request)
+    job_id = await job_manager.submit(
+        "execute_agent_teams",
+        request,
+        lambda progress: run_agent_teams(request, ideation_topology, progress),
+    )
+    return {
+        "success": True,
+        "job_id": job_id
+    }
+
+@router.post("/jobs/generate_script", description="Submit the scripting flow as a background job, returns the job id right away")
+async def submit_generate_script_job(request: dict):
+    job_id = await job_manager.submit(
+        "generate_script",
+        request,
+        lambda progress: run_generate_script(request, progress),
+    )
+    return {
+        "success": True,
+        "job_id": job_id
+    }
+
+@router.get("/jobs/{job_id}", description="Status of a background job, with its result once it succeeded")
+async def get_job(job_id: str):
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "success": True,
+        "data": job
+    }
+
+@router.get("/jobs/{job_id}/events", description="Server-Sent Events stream of the job progress, resumable with Last-Event-ID")
+async def stream_job_events(job_id: str, last_event_id: int = Header(default=0)):
+    if not ObjectId.is_valid(job_id) or await job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        job_manager.stream_events(job_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/jobs/{job_id}/cancel", description="Cancel a queued or running background job")
+async def cancel_job(job_id: str):
+    if not ObjectId.is_valid(job_id) or not await job_manager.cancel(job_id):
+        raise HTTPException(status_code=404, detail="Job not found or already finished")
+    return {
+        "success": True
+    }
+
 @router.post("/modify_script")
 async def generate_script(request: dict):
     logger.info(f"Research started")
@@ -172,9 +311,7 @@ async def generate_script(request: dict):
         script = str(request.get("script"))
         modification_prompt = str(request.get("modification_prompt"))
 
-        full_chat_history = await messages(request.get('chat_id'))
-
-        chat_summary = await summarize_chat_history(str(full_chat_history))
+        chat_summary = await get_chat_summary(request.get('chat_id'))
         
 
         # collection = db.Scripts
@@ -184,8 +321,10 @@ async def generate_script(request: dict):
 
         await update_final_script(str(request.get("script_id")), modified_script)
 
-        await add_message(f"{modification_prompt}", request.get('chat_id'), "human")
-        await add_message(f"Script modification agent's response: {modification_response}", request.get('chat_id'), "ai")
+        batch = history.WriteBatch(chat_history)
+        batch.add_message(f"{modification_prompt}", request.get('chat_id'), "human")
+        batch.add_message(f"Script modification agent's response: {modification_response}", request.get('chat_id'), "ai")
+        await batch.flush()
 
         total_time = time.time() - start_time
 
@@ -202,23 +341,79 @@ async def generate_script(request: dict):
         logger.error(f"Error in upsert: {str(error)}")
         raise HTTPException(status_code=500, detail=str(error))
 
+async def stream_script_modification(request: dict):
+    """JSON lines of the modification and final script tokens, persisted once the stream completes."""
+    start_time = time.time()
+    try:
+        script = str(request.get("script"))
+        modification_prompt = str(request.get("modification_prompt"))
+
+        chat_summary = await get_chat_summary(request.get('chat_id'))
+
+        modification_response = ""
+        async for token in astream_modify_script(script, modification_prompt, chat_summary):
+            modification_response += token
+            yield json.dumps({"type": "modification", "delta": token}) + "\n"
+
+        modified_script = ""
+        async for token in astream_final_new_script(script, modification_prompt, modification_response):
+            modified_script += token
+            yield json.dumps({"type": "final_script", "delta": token}) + "\n"
+
+        await update_final_script(str(request.get("script_id")), modified_script)
+
+        batch = history.WriteBatch(chat_history)
+        batch.add_message(f"{modification_prompt}", request.get('chat_id'), "human")
+        batch.add_message(f"Script modification agent's response: {modification_response}", request.get('chat_id'), "ai")
+        await batch.flush()
+
+        total_time = time.time() - start_time
+
+        yield json.dumps({
+            "type": "done",
+            "success": True,
+            "script": modification_response,
+            "total_process_time": total_time
+        }) + "\n"
+
+    except Exception as error:
+        # the status code is already sent, report the error in the stream
+        logger.error(f"Error in modify_script stream: {str(error)}")
+        detail = error.detail if isinstance(error, HTTPException) else str(error)
+        yield json.dumps({"type": "error", "success": False, "detail": detail}) + "\n"
+
+@router.post("/modify_script/stream", description="Streaming variant of /modify_script, sends the tokens as JSON lines while they are generated")
+async def modify_script_stream(request: dict):
+    logger.info(f"Streaming script modification started")
+    return StreamingResponse(
+        stream_script_modification(request),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @router.get("/get_ideation/{chat_id}")
 async def get_recent_ideation(chat_id: str):
     try:
-        # Reference the Ideation collection
-        collection = db.Ideation
-        object_id = ObjectId(chat_id)
-
         # Retrieve the most recent document from the collection for the given chat_id
-        recent_document_cursor = collection.find({"chat_id": object_id}).sort("created_at", -1).limit(1)
-        recent_document = None
+        recent_document = await latest_artifact("Ideation", chat_id)
 
-        # Iterate over the cursor and convert ObjectId to string
-        async for document in recent_document_cursor:
-            document["_id"] = str(document["_id"])  # Convert ObjectId to string
-            document["chat_id"] = str(document["chat_id"])
-            recent_document = document
+        # Return the recent document
+        return {
+            "success": True,
+            "data": recent_document
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@router.get("/get_latest_script/{chat_id}")
+async def get_latest_script(chat_id: str):
+    try:
+        # Retrieve the most recent script from the collection for the given chat_id
+        recent_document = await latest_artifact("Scripts", chat_id)
 
         # Return the recent document
         return {
@@ -239,7 +434,7 @@ async def get_scripts_by_ideation(ideation_id: str, chat_id: str):
         object_chat_id = ObjectId(chat_id)
 
         # Reference the Scripts collection
-        collection = db.Scripts
+        collection = read_db.Scripts
 
         # Query the Scripts collection for documents with the matching ideation_id and chat_id
         documents_cursor = collection.find({"ideation_id": object_ideation_id, "chat_id": object_chat_id})
@@ -302,40 +497,49 @@ async def save_message(request: dict):
         logger.error(f"Error saving message: {str(error)}")
         raise HTTPException(status_code=500, detail="Error saving message")
 
-@router.get("/get_messages_by_chat/{chat_id}")
-async def get_messages_by_chat(chat_id: str):
+@router.get("/get_messages_by_chat/{chat_id}", description="Messages of a chat in timestamp order, paginated with the returned next_cursor")
+async def get_messages_by_chat(chat_id: str, cursor: str | None = None, limit: int | None = Query(default=None, ge=1)):
     logger.info("Get messages by chat ID function started")
+    if not ObjectId.is_valid(chat_id):
+        raise HTTPException(status_code=400, detail="Invalid chat ID")
+    limit = page_size(limit)
+    query = {"chat_id": ObjectId(chat_id)}
+    if cursor is not None:
+        last = decode_cursor(cursor, ("timestamp", "_id"))
+        query["$or"] = [
+            {"timestamp": {"$gt": last["timestamp"]}},
+            {"timestamp": last["timestamp"], "_id": {"$gt": ObjectId(last["_id"])}},
+        ]
     try:
-        # Convert the chat_id to ObjectId to match MongoDB's _id type
-        object_id = ObjectId(chat_id)
-
         # Reference the Messages collection
-        collection = db.Message  # Ensure this collection exists in your MongoDB
-
-        # Query the Messages collection for documents with the matching chat_id
-        documents_cursor = collection.find({"chat_id": object_id})  # Assuming there is a field named "chat_id"
-        messages = []
-
-        # Iterate over the cursor and convert ObjectId to string
-        async for document in documents_cursor:
-            # Convert ObjectId to string for serialization
+        collection = read_db.Message  # Ensure this collection exists in your MongoDB
+
+        # Served by the chat_id + timestamp + _id index, one extra document tells if there is a next page
+        documents_cursor = collection.find(query, MESSAGE_PROJECTION).sort([("timestamp", ASCENDING), ("_id", ASCENDING)]).limit(limit + 1)
+        messages = await documents_cursor.to_list(length=limit + 1)
+        next_cursor = None
+        if len(messages) > limit:
+            messages = messages[:limit]
+            next_cursor = encode_cursor({"timestamp": messages[-1]["timestamp"], "_id": str(messages[-1]["_id"])})
+
+        # Convert ObjectId to string for serialization
+        for document in messages:
             document["_id"] = str(document["_id"])  # Convert message ID to string
             document["chat_id"] = str(document["chat_id"])  # Convert chat_id to string if it's in the message
-            messages.append(document)
-
-        # Return the list of messages
-        if messages:
-            return {
-                "success": True,
-                "data": messages
-            }
-        else:
-            raise HTTPException(status_code=404, detail="No messages found for the given chat ID")
 
     except Exception as error:
         logger.error(f"Error retrieving messages for chat ID {chat_id}: {str(error)}")
         raise HTTPException(status_code=500, detail="Error retrieving messages")
 
+    # Return the page of messages
+    if not messages and cursor is None:
+        raise HTTPException(status_code=404, detail="No messages found for the given chat ID")
+    return {
+        "success": True,
+        "data": messages,
+        "next_cursor": next_cursor
+    }
+
 @router.post("/create_chat")
 async def create_chat(request: Request):
     logger.info("Create chat function started")
@@ -400,26 +604,33 @@ async def update_chat(chat_id: str, request: dict):
         logger.error(f"Error updating chat: {str(error)}")
         raise HTTPException(status_code=500, detail="Error updating chat")
 
-@router.get("/get_all_chats")
-async def get_all_chats():
+@router.get("/get_all_chats", description="Chats in creation order, paginated with the returned next_cursor")
+async def get_all_chats(cursor: str | None = None, limit: int | None = Query(default=None, ge=1)):
     logger.info("Get all chats function started")
+    limit = page_size(limit)
+    query = {}
+    if cursor is not None:
+        query["_id"] = {"$gt": ObjectId(decode_cursor(cursor, ("_id",))["_id"])}
     try:
         # Reference the Chat collection
-        collection = db.Chat  # Ensure this collection exists in your MongoDB
+        collection = read_db.Chat  # Ensure this collection exists in your MongoDB
 
-        # Retrieve all documents from the collection
-        documents_cursor = collection.find()
-        chats = []
+        # ObjectIds grow with creation time, so _id is the keyset
+        documents_cursor = collection.find(query, CHAT_PROJECTION).sort("_id", ASCENDING).limit(limit + 1)
+        chats = await documents_cursor.to_list(length=limit + 1)
+        next_cursor = None
+        if len(chats) > limit:
+            chats = chats[:limit]
+            next_cursor = encode_cursor({"_id": str(chats[-1]["_id"])})
 
-        # Iterate over the cursor and convert ObjectId to string
-        async for document in documents_cursor:
+        for document in chats:
             document["_id"] = str(document["_id"])  # Convert ObjectId to string
-            chats.append(document)
 
-        # Return the list of chats
+        # Return the page of chats
         return {
             "success": True,
-            "data": chats
+            "data": chats,
+            "next_cursor": next_cursor
         }
 
     except Exception as error:
@@ -500,26 +711,10 @@ from fastapi import HTTPException
 import json
 
 async def add_message(message: str, session_id: str, msg_type: str) -> None:
-    collection = db.History
     """Append the message to the messages array in MongoDB"""
     try:
-        # Define the message structure
-        new_message = {
-            "type": msg_type,
-            "data": {
-                "content": message,
-                "additional_kwargs": {},
-                "response_metadata": {}
-            }
-        }
-
         # Handle cases where no document was found
-        result = await collection.update_one(
-            {"sessionId": session_id},
-            {"$push": {"messages": new_message}}
-        )
-
-        if result.matched_count == 0:
+        if not await chat_history.append(session_id, [history.history_message(message, msg_type)]):
             raise HTTPException(status_code=404, detail="Session not found")
         
     except Exception as e:
@@ -527,39 +722,72 @@ async def add_message(message: str, session_id: str, msg_type: str) -> None:
         raise HTTPException(status_code=500, detail="Error adding message to history")
 
 
-async def messages(session_id: str):
-    """Retrieve and format messages from MongoDB"""
-    collection = db.History
-    try:
-        # Find the document by sessionId
-        document = await collection.find_one({"sessionId": session_id})
-        
-        if not document or "messages" not in document:
-            return []
-
-        # Extract messages from the document
-        messages_list = document["messages"]
-
-        # Process the messages and pair human and ai messages
-        paired_messages = []
-        current_pair = {}
+def page_size(limit: int | None) -> int:
+    return min(limit or get_settings().MONGO_PAGE_SIZE, get_settings().MONGO_MAX_PAGE_SIZE)
 
-        for message in messages_list:
-            message_type = message["type"]
-            message_content = message["data"]["content"]
+def encode_cursor(position: dict) -> str:
+    """Opaque keyset pagination cursor from the sort keys of the last returned document"""
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
 
-            if message_type == "human":
-                # If it's a human message, start a new pair
-                current_pair = {"human": message_content}
-                paired_messages.append(current_pair)
-                current_pair = {}
-            elif message_type == "ai":
-                # If it's an AI message, complete the pair
-                current_pair["ai"] = message_content
-                paired_messages.append(current_pair)
-                current_pair = {}  # Reset for the next pair
+def decode_cursor(cursor: str, keys: tuple[str, ...]) -> dict:
+    """Position of a cursor made by encode_cursor, which must hold exactly the sort `keys` of its listing"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(position, dict) or set(position) != set(keys):
+            raise ValueError("invalid keys")
+        if not ObjectId.is_valid(position["_id"]):
+            raise ValueError("invalid _id")
+        # compared to stored values, a document here would be read as query operators
+        if not all(isinstance(position[key], (str, int, float)) for key in keys):
+            raise ValueError("invalid value")
+        return position
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def create_indexes() -> None:
+    """Create the indexes of MONGO_INDEXES, existing ones are left as they are"""
+    try:
+        for collection_name, indexes in MONGO_INDEXES.items():
+            await db[collection_name].create_indexes(indexes)
+    except Exception as error:
+        # the Mongo backed endpoints fail on their own, the rest of the API keeps working
+        logger.error(f"Error creating MongoDB indexes: {error}")
+
+async def latest_artifact(collection_name: str, chat_id: str) -> dict | None:
+    """Most recent Ideation or Scripts document of a chat, an index seek on chat_id + created_at"""
+    document = await read_db[collection_name].find_one(
+        {"chat_id": ObjectId(chat_id)},
+        sort=[("created_at", DESCENDING)]
+    )
+    if document is None:
+        return None
+
+    # Convert ObjectIds to string
+    for key in ("_id", "chat_id", "ideation_id"):
+        if key in document:
+            document[key] = str(document[key])
+    return document
+
+async def backfill_created_at() -> None:
+    """Set created_at on Ideation and Scripts documents written before it existed"""
+    backfill = [{"$set": {"created_at": {"$ifNull": [
+        # timestamp is in epoch seconds, $toDate expects milliseconds
+        {"$toDate": {"$multiply": ["$timestamp", 1000]}},
+        {"$toDate": "$_id"},
+    ]}}}]
+    try:
+        for collection_name in ("Ideation", "Scripts"):
+            result = await db[collection_name].update_many({"created_at": {"$exists": False}}, backfill)
+            if result.modified_count:
+                logger.info(f"Backfilled created_at on {result.modified_count} {collection_name} documents")
+    except Exception as error:
+        logger.error(f"Error backfilling created_at: {error}")
 
-        return paired_messages
+async def messages(session_id: str):
+    """Retrieve the human and ai messages of the session"""
+    try:
+        _, turns = await chat_history.since(session_id, 0)
+        return turns
 
     except Exception as error:
         logger.error(f"Error retrieving messages for session {session_id}: {error}")
@@ -584,4 +812,34 @@ async def update_final_script(script_id: str, new_final_script: str) -> None:
 
     except Exception as error:
         logger.error(f"Error updating final_script for script_id {script_id}: {error}")
-        raise HTTPException(status_code=500, detail="Error updating final_script")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Error updating final_script")
+
+async def get_chat_summary(session_id: str) -> str:
+    """Rolling summary of the session history.
+
+    The summary is stored with the number of messages it covers, only messages
+    appended after that high-water mark are folded in. An unchanged history
+    returns the stored summary without calling the LLM.
+    """
+    collection = db.HistorySummary
+    cached = await collection.find_one({"sessionId": session_id}) or {}
+    summary = cached.get("summary", "")
+    message_count = cached.get("message_count", 0)
+
+    count, new_messages = await chat_history.since(session_id, message_count)
+    if count < message_count:
+        # the history was cleared or replaced, start over
+        summary = ""
+        count, new_messages = await chat_history.since(session_id, 0)
+
+    if not new_messages:
+        return summary
+
+    summary = await update_chat_summary(summary, str(new_messages))
+
+    await collection.update_one(
+        {"sessionId": session_id},
+        {"$set": {"summary": summary, "message_count": count, "timestamp": time.time()}},
+        upsert=True
+    )
+    return summary
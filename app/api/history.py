@@ -0,0 +1,266 @@
+# Access to the chat histories in the Mongo `History` collection.
+#
+# A session starts in the legacy layout, one `History` document per sessionId
+# with every message in its `messages` array (the layout LangChain's
+# MongoDBChatMessageHistory writes). Once that array grows past
+# HISTORY_BUCKET_THRESHOLD messages, the oldest messages are moved, in chunks of
+# HISTORY_BUCKET_SIZE, into `HistoryBucket` documents and `archived_count` on
+# the head document counts how many were moved. New messages are still pushed
+# to the head document, so other writers of the legacy layout keep working.
+#
+# Message positions are absolute (archived + position in the head document),
+# so callers can use a message count as a marker and read only what came after
+# it. Reads slice the arrays and pair human/ai messages inside Mongo, only the
+# requested turns are sent over the wire.
+#
+# `WriteBatch` collects the history appends and artifact inserts of a request
+# and writes them with one `$push: {$each: [...]}` per session and one
+# `bulk_write` per collection, optionally inside a transaction.
+
+
+import logging
+from collections import defaultdict
+from typing import Any
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import InsertOne, ReturnDocument
+
+from app.core.config import get_settings
+
+logger = logging.getLogger("uvicorn")
+
+
+def history_message(content: str, msg_type: str) -> dict[str, Any]:
+    return {
+        "type": msg_type,
+        "data": {"content": content, "additional_kwargs": {}, "response_metadata": {}},
+    }
+
+
+def _or_empty(array: Any) -> dict[str, Any]:
+    return {"$ifNull": [array, []]}
+
+
+def _tail(array: Any, position: Any) -> dict[str, Any]:
+    """Elements of `array` from `position` on, `$slice` needs a positive length."""
+    return {
+        "$slice": [
+            array,
+            position,
+            {"$max": [{"$subtract": [{"$size": array}, position]}, 1]},
+        ]
+    }
+
+
+def _paired(array: Any) -> dict[str, Any]:
+    """{"human": content} or {"ai": content} per message, other message types are skipped."""
+    return {
+        "$map": {
+            "input": {
+                "$filter": {
+                    "input": array,
+                    "as": "message",
+                    "cond": {"$in": ["$$message.type", ["human", "ai"]]},
+                }
+            },
+            "as": "message",
+            "in": {
+                "$cond": [
+                    {"$eq": ["$$message.type", "human"]},
+                    {"human": "$$message.data.content"},
+                    {"ai": "$$message.data.content"},
+                ]
+            },
+        }
+    }
+
+
+class ChatHistory:
+    def __init__(self, db: Any) -> None:
+        self.db = db
+        self.heads = db.History
+        self.buckets = db.HistoryBucket
+
+    async def append(
+        self, session_id: str, messages: list[dict[str, Any]], session: Any = None
+    ) -> bool:
+        """Push messages to the session, returns False when the session does not exist.
+
+        Inside a transaction (`session`) an oversized head is left for the next
+        read to compact.
+        """
+        head = await self.heads.find_one_and_update(
+            {"sessionId": session_id},
+            {"$push": {"messages": {"$each": messages}}},
+            projection={"_id": 0, "size": {"$size": "$messages"}},
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+        if head is None:
+            return False
+        if session is None and head["size"] > get_settings().HISTORY_BUCKET_THRESHOLD:
+            await self.compact(session_id)
+        return True
+
+    async def since(
+        self, session_id: str, offset: int
+    ) -> tuple[int, list[dict[str, Any]]]:
+        """Message count of the session and the paired turns after the first `offset` messages."""
+        archived = {"$ifNull": ["$archived_count", 0]}
+        messages = _or_empty("$messages")
+        pipeline = [
+            {"$match": {"sessionId": session_id}},
+            {
+                "$project": {
+                    "_id": 0,
+                    "archived": archived,
+                    "size": {"$size": messages},
+                    "turns": _paired(
+                        _tail(
+                            messages, {"$max": [0, {"$subtract": [offset, archived]}]}
+                        )
+                    ),
+                }
+            },
+        ]
+        head = await anext(aiter(self.heads.aggregate(pipeline)), None)
+        if head is None:
+            return 0, []
+
+        turns = head["turns"]
+        if offset < head["archived"]:
+            # buckets archived after the head was read are covered by `turns`
+            turns = (
+                await self._archived_turns(session_id, offset, head["archived"]) + turns
+            )
+        if head["size"] > get_settings().HISTORY_BUCKET_THRESHOLD:
+            await self.compact(session_id)
+        return head["archived"] + head["size"], turns
+
+    async def compact(self, session_id: str) -> None:
+        """Move the oldest messages of an oversized head document into buckets."""
+        settings = get_settings()
+        while True:
+            pipeline = [
+                {"$match": {"sessionId": session_id}},
+                {
+                    "$project": {
+                        "_id": 0,
+                        "archived": {"$ifNull": ["$archived_count", 0]},
+                        "size": {"$size": _or_empty("$messages")},
+                        "oldest": {
+                            "$slice": [
+                                _or_empty("$messages"),
+                                settings.HISTORY_BUCKET_SIZE,
+                            ]
+                        },
+                    }
+                },
+            ]
+            head = await anext(aiter(self.heads.aggregate(pipeline)), None)
+            if head is None or head["size"] <= settings.HISTORY_BUCKET_THRESHOLD:
+                return
+
+            oldest = head["oldest"]
+            # idempotent, a retry after a failed trim finds the same bucket
+            await self.buckets.update_one(
+                {"sessionId": session_id, "start": head["archived"]},
+                {
+                    "$setOnInsert": {
+                        "end": head["archived"] + len(oldest),
+                        "messages": oldest,
+                    }
+                },
+                upsert=True,
+            )
+            # only trims when nothing was pushed meanwhile, otherwise read again
+            result = await self.heads.update_one(
+                {
+                    "sessionId": session_id,
+                    "messages": {"$size": head["size"]},
+                    "archived_count": {"$in": [head["archived"], None]},
+                },
+                {
+                    "$push": {
+                        "messages": {
+                            "$each": [],
+                            "$slice": -(head["size"] - len(oldest)),
+                        }
+                    },
+                    "$set": {"archived_count": head["archived"] + len(oldest)},
+                },
+            )
+            if result.modified_count:
+                logger.info(
+                    f"Moved {len(oldest)} messages of session {session_id} to a history bucket"
+                )
+
+    async def _archived_turns(
+        self, session_id: str, offset: int, archived: int
+    ) -> list[dict[str, Any]]:
+        pipeline = [
+            {
+                "$match": {
+                    "sessionId": session_id,
+                    "start": {"$lt": archived},
+                    "end": {"$gt": offset},
+                }
+            },
+            {"$sort": {"start": 1}},
+            {
+                "$project": {
+                    "_id": 0,
+                    "turns": _paired(
+                        _tail(
+                            "$messages",
+                            {"$max": [0, {"$subtract": [offset, "$start"]}]},
+                        )
+                    ),
+                }
+            },
+        ]
+        turns = []
+        async for bucket in self.buckets.aggregate(pipeline):
+            turns.extend(bucket["turns"])
+        return turns
+
+
+class WriteBatch:
+    def __init__(self, chat_history: ChatHistory) -> None:
+        self.chat_history = chat_history
+        self._messages: dict[str, list[dict[str, Any]]] = defaultdict(list)
+        self._inserts: dict[str, list[InsertOne[dict[str, Any]]]] = defaultdict(list)
+
+    def add_message(self, message: str, session_id: str, msg_type: str) -> None:
+        self._messages[session_id].append(history_message(message, msg_type))
+
+    def insert(self, collection_name: str, document: dict[str, Any]) -> ObjectId:
+        """Queue an insert, the returned _id is valid once the batch is flushed."""
+        document_id: ObjectId = document.setdefault("_id", ObjectId())
+        self._inserts[collection_name].append(InsertOne(document))
+        return document_id
+
+    async def flush(self, transaction: bool | None = None) -> None:
+        if transaction is None:
+            transaction = get_settings().MONGO_WRITE_TRANSACTIONS
+        if not transaction:
+            await self._write(None)
+        else:
+            # transactions need a replica set or sharded cluster
+            async with await self.chat_history.db.client.start_session() as session:
+                async with session.start_transaction():
+                    await self._write(session)
+        self._messages.clear()
+        self._inserts.clear()
+
+    async def _write(self, session: Any) -> None:
+        for session_id, messages in self._messages.items():
+            if not await self.chat_history.append(
+                session_id, messages, session=session
+            ):
+                raise HTTPException(status_code=404, detail="Session not found")
+        for collection_name, requests in self._inserts.items():
+            await self.chat_history.db[collection_name].bulk_write(
+                requests, ordered=True, session=session
+            )
@@ -0,0 +1,227 @@
+# Background jobs for the long running agent flows.
+#
+# Submitting a job stores it in Mongo and returns its id right away, the flow
+# itself runs as an asyncio task. A semaphore bounds how many LLM heavy jobs
+# run at once per process, the rest wait in "queued" state.
+#
+# Every workflow event and every status change is stored as a numbered event
+# document, which `stream_events` replays and follows for Server-Sent Events.
+# A stream ends after the final status event, right away when the client
+# resumes past it, and after `idle_timeout` without events, so a job whose
+# worker process died does not keep its streams open forever.
+# Events of a job are inserted one at a time in `seq` order, a reader resuming
+# after seq N must never find N + 1 stored before N.
+# Cancellation is stored on the job too, so a job can be cancelled from any
+# worker process: the owning process notices it on the next progress event.
+
+
+import asyncio
+import json
+import logging
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
+
+from bson import ObjectId
+from llama_index.core.workflow import Event
+
+logger = logging.getLogger("uvicorn")
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+JobRunner = Callable[[Callable[[Event], None]], Awaitable[dict[str, Any]]]
+
+
+class JobManager:
+    def __init__(
+        self,
+        jobs_collection: Any,
+        events_collection: Any,
+        concurrency: int,
+        poll_interval: float = 2.0,
+        idle_timeout: float = 900.0,
+    ) -> None:
+        self.jobs = jobs_collection
+        self.events = events_collection
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: dict[ObjectId, asyncio.Task[None]] = {}
+        self._seq: dict[ObjectId, int] = {}
+        # held from taking a seq until its event is inserted
+        self._record_locks: dict[ObjectId, asyncio.Lock] = {}
+        self._writes: dict[ObjectId, set[asyncio.Task[None]]] = {}
+        self._wakeups: dict[ObjectId, asyncio.Event] = {}
+
+    async def submit(
+        self, job_type: str, request: dict[str, Any], runner: JobRunner
+    ) -> str:
+        job_id = ObjectId()
+        await self.jobs.insert_one(
+            {
+                "_id": job_id,
+                "type": job_type,
+                "status": QUEUED,
+                "request": request,
+                "result": None,
+                "error": None,
+                "cancel_requested": False,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+            }
+        )
+        self._seq[job_id] = 0
+        self._record_locks[job_id] = asyncio.Lock()
+        self._writes[job_id] = set()
+        await self._record(job_id, {"status": QUEUED})
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id, runner))
+        return str(job_id)
+
+    async def get(self, job_id: str) -> dict[str, Any] | None:
+        job: dict[str, Any] | None = await self.jobs.find_one({"_id": ObjectId(job_id)})
+        if job is not None:
+            job["_id"] = str(job["_id"])
+        return job
+
+    async def cancel(self, job_id: str) -> bool:
+        """Request cancellation, returns False when the job is unknown or finished."""
+        object_id = ObjectId(job_id)
+        result = await self.jobs.update_one(
+            {"_id": object_id, "status": {"$nin": list(FINISHED_STATUSES)}},
+            {"$set": {"cancel_requested": True}},
+        )
+        if result.matched_count == 0:
+            return False
+        self._cancel_task(object_id)
+        return True
+
+    async def shutdown(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def stream_events(
+        self, job_id: str, last_event_id: int = 0
+    ) -> AsyncIterator[str]:
+        """Server-Sent Events of a job, replaying stored events after `last_event_id`."""
+        object_id = ObjectId(job_id)
+        idle_since = time.monotonic()
+        while True:
+            wakeup = self._wakeups.setdefault(object_id, asyncio.Event())
+            finished = False
+            received = False
+            async for event in self.events.find(
+                {"job_id": object_id, "seq": {"$gt": last_event_id}}
+            ).sort("seq", 1):
+                last_event_id = event["seq"]
+                data = {key: event[key] for key in ("seq", "timestamp", "data")}
+                yield f"id: {last_event_id}\nevent: progress\ndata: {json.dumps(data)}\n\n"
+                finished = event["data"].get("status") in FINISHED_STATUSES
+                received = True
+            if received:
+                idle_since = time.monotonic()
+            elif (
+                await self._finished_before(object_id)
+                or time.monotonic() - idle_since > self.idle_timeout
+            ):
+                finished = True
+            if finished:
+                self._wakeups.pop(object_id, None)
+                return
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+            except TimeoutError:
+                # the job may run in another worker process, poll Mongo
+                yield ": keep-alive\n\n"
+
+    async def _finished_before(self, job_id: ObjectId) -> bool:
+        """Whether the job is unknown, or finished and its final event is stored.
+
+        Called when no event follows the client's last one, a stored final
+        event was then already sent. The job is marked finished before its
+        final event is inserted, the stream waits for that event.
+        """
+        job = await self.jobs.find_one({"_id": job_id}, {"status": 1})
+        if job is None:
+            return True
+        if job["status"] not in FINISHED_STATUSES:
+            return False
+        final_event = await self.events.find_one(
+            {"job_id": job_id, "data.status": job["status"]}, {"_id": 1}
+        )
+        return final_event is not None
+
+    async def _run(self, job_id: ObjectId, runner: JobRunner) -> None:
+        try:
+            async with self._semaphore:
+                await self._set_status(job_id, RUNNING, started_at=time.time())
+                result = await runner(lambda event: self._progress(job_id, event))
+            await self._flush(job_id)
+            await self._set_status(
+                job_id, SUCCEEDED, result=result, finished_at=time.time()
+            )
+        except asyncio.CancelledError:
+            await self._flush(job_id)
+            await self._set_status(job_id, CANCELLED, finished_at=time.time())
+        except Exception as error:
+            logger.error(f"Job {job_id} failed: {error}")
+            await self._flush(job_id)
+            await self._set_status(
+                job_id, FAILED, error=str(error), finished_at=time.time()
+            )
+        finally:
+            self._tasks.pop(job_id, None)
+            self._seq.pop(job_id, None)
+            self._record_locks.pop(job_id, None)
+            self._writes.pop(job_id, None)
+
+    def _progress(self, job_id: ObjectId, event: Event) -> None:
+        """Workflow callback, runs synchronously inside `Workflow.send_event`."""
+        write = asyncio.create_task(
+            self._record(job_id, {"event": type(event).__name__})
+        )
+        self._writes[job_id].add(write)
+        write.add_done_callback(self._writes[job_id].discard)
+
+    async def _flush(self, job_id: ObjectId) -> None:
+        await asyncio.gather(*self._writes[job_id], return_exceptions=True)
+
+    async def _set_status(self, job_id: ObjectId, status: str, **fields: Any) -> None:
+        await self.jobs.update_one(
+            {"_id": job_id}, {"$set": {"status": status, **fields}}
+        )
+        await self._record(job_id, {"status": status})
+
+    async def _record(self, job_id: ObjectId, data: dict[str, Any]) -> None:
+        async with self._record_locks[job_id]:
+            self._seq[job_id] += 1
+            await self.events.insert_one(
+                {
+                    "job_id": job_id,
+                    "seq": self._seq[job_id],
+                    "timestamp": time.time(),
+                    "data": data,
+                }
+            )
+        if (wakeup := self._wakeups.pop(job_id, None)) is not None:
+            wakeup.set()
+        if "event" in data:
+            # cancellation requested through another worker process
+            job = await self.jobs.find_one(
+                {"_id": job_id, "cancel_requested": True}, {"_id": 1}
+            )
+            if job is not None:
+                self._cancel_task(job_id)
+
+    def _cancel_task(self, job_id: ObjectId) -> None:
+        task = self._tasks.get(job_id)
+        # a task that is already cancelling is writing its final status
+        if task is not None and not task.cancelling():
+            task.cancel()
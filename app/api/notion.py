@@ -1,10 +1,9 @@
 from langchain_community.document_loaders.notiondb import NotionDBLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import tiktoken
-from langchain_openai import OpenAIEmbeddings
 import logging
 import time
 from dotenv import load_dotenv
@@ -16,15 +15,28 @@ from uuid import uuid4
 from enum import Enum
 from datetime import datetime, timedelta
 import json
+from app.api import qdrant_bulk
+from app.api.embeddings import get_embedding_service, track_embedding_stats
+from app.core import database_session
 from app.core.config import get_settings
+from app.core.http_client import HTTP_CLIENT_CONFIGS, get_http_client
+from app.core.rate_limiter import get_rate_limiter, parse_retry_after
+from app.models import NotionPageFingerprint
 from langchain.indexes import SQLRecordManager, aindex
-from sqlalchemy.ext.asyncio import create_async_engine
-from qdrant_client import QdrantClient
-from sqlalchemy import create_engine
+from langchain.indexes._sql_record_manager import UpsertionRecord
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from sqlalchemy import create_engine, func, select, update
+from sqlalchemy.dialects import postgresql
 from langchain_qdrant import Qdrant
-from typing import Dict, Any, List, Generator, Tuple
-import concurrent.futures
-from requests.exceptions import HTTPError
+from collections.abc import AsyncIterator
+from typing import Any
+import asyncio
+import httpx
+from dataclasses import asdict, dataclass, field
+from contextlib import asynccontextmanager
+from functools import cache, lru_cache
+from notion_client import AsyncClient
+from notion_client.errors import APIResponseError
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -50,6 +62,7 @@ class CleanupMode(str, Enum):
     NONE = "None"
     INCREMENTAL = "Incremental"
     FULL = "Full"
+    REBUILD = "Rebuild"
 
 
 def generate_source_id(content, metadata):
@@ -134,323 +147,835 @@ def split_documents(docs):
 
     return split_docs
 
-def calculate_cost(docs):
-    logger.info("Calculating embeddings cost")
+# $0.130 per 1 million tokens
+EMBEDDING_COST_PER_TOKEN = 0.00000013
 
-    # Initialize tokenizer for a specific OpenAI model
-    encoder = tiktoken.encoding_for_model(EMBEDDING_MODEL)
 
-    # Sample documents
-    documents = []
+@cache
+def get_encoder() -> tiktoken.Encoding:
+    """Tokenizer of the embedding model, loaded once per process."""
+    return tiktoken.encoding_for_model(EMBEDDING_MODEL)
 
-    for doc in docs:
-        documents.append(doc.page_content)
 
-    def count_tokens(text, encoder):
-        tokens = encoder.encode(text)
-        return len(tokens)
+def count_tokens(texts: list[str]) -> list[int]:
+    """Token count of each text, encoded in parallel by tiktoken's threads.
 
-    def calculate_embedding_cost(total_tokens, cost_per_token):
-        return total_tokens * cost_per_token
+    Special tokens are counted as plain text, the embeddings API accepts them.
+    """
+    encoded = get_encoder().encode_ordinary_batch(
+        texts, num_threads=get_settings().TOKENIZER_THREADS
+    )
+    return [len(tokens) for tokens in encoded]
+
+
+def split_and_count(docs: list[LangChainDocument]) -> tuple[list[LangChainDocument], list[int]]:
+    """Split documents into chunks, with the token count of each chunk."""
+    split_docs = split_documents(docs)
+    return split_docs, count_tokens([doc.page_content for doc in split_docs])
+
+
+@dataclass
+class TokenStats:
+    """Token counts of the pages of a run, tallied as they are split."""
+    pages: int = 0
+    chunks: int = 0
+    tokens: int = 0
+    max_page_tokens: int = 0
+    max_page_id: str | None = None
+    max_chunk_tokens: int = 0
+
+    def add_page(self, page_id: str, chunk_tokens: list[int]) -> None:
+        page_tokens = sum(chunk_tokens)
+        self.pages += 1
+        self.chunks += len(chunk_tokens)
+        self.tokens += page_tokens
+        if page_tokens > self.max_page_tokens:
+            self.max_page_tokens = page_tokens
+            self.max_page_id = page_id
+        self.max_chunk_tokens = max(self.max_chunk_tokens, *chunk_tokens, 0)
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            **asdict(self),
+            "mean_page_tokens": self.tokens / self.pages if self.pages else 0.0,
+        }
+
+
+CLEANUP_MODES = {
+    "incremental": "incremental",
+    "full": "full",
+    # full cleanup into a shadow collection, see `_rebuild_collection`
+    "rebuild": "full",
+    "none": None,
+}
+
+
+def build_index_targets() -> tuple[Qdrant, SQLRecordManager]:
+    """Build the Qdrant vectorstore and the record manager used by `aindex`."""
+    embeddings = get_embedding_service()
+
+    settings = get_settings()
+    url = settings.QDRANT_URL
+    api_key = settings.QDRANT_API_KEY
+
+    client = QdrantClient(url=url, api_key=api_key, prefer_grpc=settings.QDRANT_PREFER_GRPC)
+    async_client = AsyncQdrantClient(url=url, api_key=api_key, prefer_grpc=settings.QDRANT_PREFER_GRPC)
+
+    collection_name = settings.QDRANT_COLLECTION_NAME
+
+    vectorstore = Qdrant(
+        collection_name=collection_name,
+        client=client,
+        async_client=async_client,
+        embeddings=embeddings,
+    )
 
-    # Calculate total tokens
-    total_tokens = sum(count_tokens(doc, encoder) for doc in documents)
-    total_vectors = len(documents)
+    namespace = "qdrant/my_docs"
 
-    # Pinecone cost parameters
-    storage_cost_per_vector = 0.000001  # Storage cost per vector
-    read_cost_per_vector = 0.000008  # Read cost per vector
-    write_cost_per_vector = 0.000002  # Write cost per vector
-    cost_per_token = 0.00000013  # $0.130 per 1 million tokens
+    # the application's connection pool, no engine of its own to leak
+    record_manager = SQLRecordManager(
+        namespace, engine=database_session.get_async_engine()
+    )
 
-    # Calculate costs
-    storage_cost = total_vectors * storage_cost_per_vector
-    read_cost = total_vectors * read_cost_per_vector
-    write_cost = total_vectors * write_cost_per_vector
-    
-    total_cost = storage_cost + read_cost + write_cost
-    total_embedding_cost = calculate_embedding_cost(total_tokens,
-                                                    cost_per_token)
+    return vectorstore, record_manager
+
+
+class IndexTargets:
+    """Vectorstore and record manager shared by every upsert, built once.
+
+    Built on first use, the record manager schema is created before they are
+    handed out. A failed build is retried by the next caller.
+    """
+
+    def __init__(self) -> None:
+        self._lock = asyncio.Lock()
+        self._targets: tuple[Qdrant, SQLRecordManager] | None = None
+
+    async def get(self) -> tuple[Qdrant, SQLRecordManager]:
+        async with self._lock:
+            if self._targets is None:
+                vectorstore, record_manager = build_index_targets()
+                await record_manager.acreate_schema()
+                self._targets = vectorstore, record_manager
+            return self._targets
+
+    async def close(self) -> None:
+        if self._targets is not None:
+            vectorstore, _ = self._targets
+            self._targets = None
+            vectorstore.client.close()
+            if vectorstore.async_client is not None:
+                await vectorstore.async_client.close()
+
+
+_INDEX_TARGETS = IndexTargets()
+
+
+class UpsertGate:
+    """Upserts of this process run together, a rebuild runs alone.
+
+    An upsert writing during a rebuild would update the collection being
+    replaced while keeping its records and fingerprints, its pages would
+    then be missing from the rebuilt collection. Upserts started during a
+    rebuild wait for it, a rebuild waits for the running upserts.
+    """
+
+    def __init__(self) -> None:
+        self._condition = asyncio.Condition()
+        self._upserts = 0
+        self._rebuilding = False
+
+    @asynccontextmanager
+    async def upsert(self) -> AsyncIterator[None]:
+        async with self._condition:
+            await self._condition.wait_for(lambda: not self._rebuilding)
+            self._upserts += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._upserts -= 1
+                self._condition.notify_all()
+
+    @asynccontextmanager
+    async def rebuild(self) -> AsyncIterator[None]:
+        if self._rebuilding:
+            raise HTTPException(status_code=409,
+                                detail="A rebuild is already running")
+        # set before waiting, upserts arriving now queue behind the rebuild
+        self._rebuilding = True
+        try:
+            async with self._condition:
+                await self._condition.wait_for(lambda: self._upserts == 0)
+            yield
+        finally:
+            async with self._condition:
+                self._rebuilding = False
+                self._condition.notify_all()
+
+
+_UPSERT_GATE = UpsertGate()
+
+
+async def get_index_targets() -> tuple[Qdrant, SQLRecordManager]:
+    return await _INDEX_TARGETS.get()
+
+
+async def open_index_targets() -> None:
+    try:
+        await get_index_targets()
+    except Exception as error:
+        # retried by the first upsert
+        logger.error(f"Error creating the record manager schema: {error}")
+
+
+async def close_index_targets() -> None:
+    await _INDEX_TARGETS.close()
 
-    return {
-        "total_embedding_cost" : total_embedding_cost
-    }
 
 async def cleanup_and_upsert_documents(docs, cleanup_mode):
     logger.info(
         f"Upserting documents to Qdrant with {cleanup_mode} cleanup mode")
-    start_time = time.time()
 
-    embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY,
-                                  model=EMBEDDING_MODEL)
+    mode = cleanup_mode.lower()
+    if mode not in CLEANUP_MODES:
+        raise Exception("Incorrect cleanup mode")
 
-    url = get_settings().QDRANT_URL
-    api_key = get_settings().QDRANT_API_KEY
+    vectorstore, record_manager = await get_index_targets()
 
-    client = QdrantClient(url=url, api_key=api_key)
-    
-    collection_name=get_settings().QDRANT_COLLECTION_NAME
+    return await aindex(
+        docs,
+        record_manager,
+        vectorstore,
+        cleanup=CLEANUP_MODES[mode],
+        source_id_key="id"
+    )
 
-    vectorstore = Qdrant(collection_name=collection_name, client=client, embeddings=embeddings)
+class _NotionPropertiesLoader(NotionDBLoader):
+    """NotionDBLoader that only parses page properties into metadata.
 
-    namespace = "qdrant/my_docs"
+    Page blocks are fetched asynchronously by `aload_page`, so the blocking
+    `_load_blocks` of the base loader is never reached.
+    """
 
-    engine = create_async_engine(get_settings().sqlalchemy_database_uri.render_as_string(hide_password=False))
+    def _load_blocks(self, block_id: str, num_tabs: int = 0) -> str:
+        return ""
 
-    record_manager = SQLRecordManager(
-        namespace, engine=engine
-    )
 
-    await record_manager.acreate_schema()
-    mode = cleanup_mode.lower() 
-    
-    result = {}
-
-    if mode == "incremental":
-        result = await aindex(
-            docs,
-            record_manager,
-            vectorstore,
-            cleanup="incremental",
-            source_id_key="id"
-        )
-    elif mode == "full":
-        result = await aindex(
-            docs,
-            record_manager,
-            vectorstore,
-            cleanup="full",
-            source_id_key="id"
+async def notion_request(request, **kwargs) -> Any:
+    """Call an async Notion client endpoint within the shared Notion budget.
+
+    Rate limited calls pause the whole budget for `Retry-After` seconds, so
+    every concurrent upsert backs off together, and are then retried.
+    """
+    limiter = get_rate_limiter("notion")
+    retries = 5
+    base_delay = 0.5
+
+    for attempt in range(retries):
+        await limiter.acquire()
+        try:
+            return await request(**kwargs)
+        except APIResponseError as e:
+            if e.status != status.HTTP_429_TOO_MANY_REQUESTS or attempt == retries - 1:
+                raise
+            retry_after = parse_retry_after(
+                e.headers.get("Retry-After"), base_delay * (2 ** attempt)
+            )
+            logger.warning(f"Rate limit exceeded. Retrying in {retry_after} seconds...")
+            limiter.penalize(retry_after)
+
+
+def get_notion_client() -> AsyncClient:
+    """Notion API client of the process, shared by the ingestion and the agent tools."""
+    return _notion_client(get_http_client("notion"))
+
+
+@lru_cache(maxsize=1)
+def _notion_client(http_client: httpx.AsyncClient) -> AsyncClient:
+    # AsyncClient sets base_url, headers and timeout on the httpx client it is
+    # given, so it is made once per shared client, not once per call. A new one
+    # is made when the shared client is recreated after `close_http_clients`.
+    notion_client = AsyncClient(auth=NOTION_TOKEN, client=http_client)
+    # keep the connect timeout of the shared client config
+    http_client.timeout = HTTP_CLIENT_CONFIGS["notion"].timeout
+    return notion_client
+
+
+async def aiter_notion_db_pages(
+    notion_client: AsyncClient,
+    database_id: str,
+    page_size: int = 100,
+) -> AsyncIterator[list[dict[str, Any]]]:
+    """Yield page summaries of a Notion database, one query response at a time."""
+    start_cursor = None
+
+    while True:
+        data = await notion_request(
+            notion_client.databases.query,
+            database_id=database_id,
+            page_size=page_size,
+            start_cursor=start_cursor,
         )
-    elif mode == "none":
-        result = await aindex(
-            docs,
-            record_manager,
-            vectorstore,
-            cleanup=None,
-            source_id_key="id"
+
+        yield data.get("results", [])
+
+        if not data.get("has_more"):
+            return
+        start_cursor = data.get("next_cursor")
+
+
+async def aload_blocks(notion_client: AsyncClient, block_id: str, num_tabs: int = 0) -> str:
+    """Async counterpart of `NotionDBLoader._load_blocks`."""
+    result_lines_arr: list[str] = []
+    start_cursor = None
+
+    while True:
+        data = await notion_request(
+            notion_client.blocks.children.list,
+            block_id=block_id,
+            start_cursor=start_cursor,
         )
-    else:
-        raise Exception("Incorrect cleanup mode")
-    
-    return result
-
-from threading import Lock
-
-class RateLimiter:
-    def __init__(self, rate_per_second):
-        self.rate_per_second = rate_per_second
-        self.max_tokens = rate_per_second
-        self.tokens = rate_per_second
-        self.last_check = time.time()
-        self.lock = Lock()
-
-    def _refill(self):
-        now = time.time()
-        elapsed = now - self.last_check
-        self.tokens += elapsed * self.rate_per_second
-        self.tokens = min(self.tokens, self.max_tokens)
-        self.last_check = now
-
-    def acquire(self):
-        with self.lock:
-            self._refill()
-            if self.tokens < 1:
-                return False
-            self.tokens -= 1
-            return True
-
-    def wait_for_token(self):
-        while not self.acquire():
-            time.sleep(0.1)  # Wait a short while before retrying
-
-rate_limiter = RateLimiter(rate_per_second=2)
-
-
-def process_chunk(chunk: List[Dict[str, Any]], loader: NotionDBLoader) -> List:
-    documents = []
-    def load_page_and_process(page_summary: Dict[str, Any]):
-        rate_limiter.wait_for_token()  # Ensure the request respects the rate limit
-        retries = 5
-        base_delay = 0.5
-        
-        for attempt in range(retries):
-            try:
-                document = loader.load_page(page_summary)  # Perform the API request
-                # if response.status_code == 429:  # Check if rate limit exceeded
-                name = document.metadata.get("name", "Unknown")
-                print(f"Processing document: {name[:50]}...")
-                return document
-
-            except HTTPError as e:
-                if e.response.status_code == 429:
-                    # If rate limit error and no Retry-After header, use exponential backoff
-                    # retry_after = base_delay * (2 ** attempt)
-                    # print(f"Rate limit exceeded. Retrying in {retry_after} seconds...")
-                    # time.sleep(retry_after)
-                    retry_after = e.response.headers.get('Retry-After')  # Get Retry-After header
-                    if retry_after:
-                        retry_after = int(float(retry_after))  # Convert to integer (seconds)
-                    else:
-                        retry_after = base_delay * (2 ** attempt)  # Fallback to exponential backoff if header missing
-
-                    print(f"Rate limit exceeded. Retrying in {retry_after} seconds...")
-                    time.sleep(retry_after)  # Wait for the specified duration
-                    continue
-                else:
-                    print(f"Error loading page {page_summary['id']}: {e}")
-                return None
-            except Exception as e:
-                print(f"Unexpected error: {e}")
-                return None
 
-    start_time = time.time()
+        for result in data["results"]:
+            result_obj = result[result["type"]]
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-        future_to_page_summary = {executor.submit(load_page_and_process, page): page for page in chunk}
-        
-        for future in concurrent.futures.as_completed(future_to_page_summary):
-            page = future_to_page_summary[future]
-            try:
-                result = future.result()
-                if result is not None:
-                    documents.append(result)
-            except Exception as e:
-                print(f"Error processing page {page['id']}: {e}")
+            if "rich_text" not in result_obj:
+                continue
 
-    print(f"Time taken to process chunk: {time.time() - start_time:.2f} seconds")
+            cur_result_text_arr: list[str] = []
 
-    split_docs = split_documents(documents)
+            for rich_text in result_obj["rich_text"]:
+                if "text" in rich_text:
+                    cur_result_text_arr.append(
+                        "\t" * num_tabs + rich_text["text"]["content"]
+                    )
 
-    return split_docs
+            if result["has_children"]:
+                children_text = await aload_blocks(
+                    notion_client, result["id"], num_tabs=num_tabs + 1
+                )
+                cur_result_text_arr.append(children_text)
+
+            result_lines_arr.append("\n".join(cur_result_text_arr))
+
+        if not data.get("has_more"):
+            break
+        start_cursor = data.get("next_cursor")
+
+    return "\n".join(result_lines_arr)
+
+
+async def aload_page(
+    notion_client: AsyncClient,
+    properties_loader: _NotionPropertiesLoader,
+    page_summary: dict[str, Any],
+) -> LangChainDocument | None:
+    """Load a single database page, returning None when it cannot be fetched."""
+    try:
+        document = properties_loader.load_page(page_summary)
+        document.page_content = await aload_blocks(notion_client, page_summary["id"])
+    except APIResponseError as e:
+        logger.error(f"Error loading page {page_summary['id']}: {e}")
+        return None
+
+    name = document.metadata.get("name") or "Unknown"
+    logger.debug(f"Processing document: {name[:50]}...")
+    return document
+
+
+def page_fingerprint(page_summary: dict[str, Any]) -> str:
+    """Fingerprint of a database page and of the settings its vectors depend on."""
+    settings = get_settings()
+    unique_string = "|".join(
+        [
+            page_summary["id"],
+            page_summary["last_edited_time"],
+            str(settings.CHUNK_SIZE),
+            str(settings.CHUNK_OVERLAP),
+            settings.EMBEDDING_MODEL,
+            settings.QDRANT_COLLECTION_NAME,
+        ]
+    )
+    return hashlib.sha256(unique_string.encode("utf-8")).hexdigest()
 
-def load_notion_db_in_chunks(
-    integration_token: str,
-    database_id: str,
-    doc_type: str,
-    chunk_size: int = 10,
-) -> Generator[List[Dict[str, Any]], None, None]:
-    loader = NotionDBLoader(
+
+async def get_page_fingerprints(page_ids: list[str]) -> dict[str, str]:
+    async with database_session.get_async_session() as session:
+        rows = await session.execute(
+            select(NotionPageFingerprint.page_id, NotionPageFingerprint.fingerprint)
+            .where(NotionPageFingerprint.page_id.in_(page_ids))
+        )
+        return {page_id: fingerprint for page_id, fingerprint in rows}
+
+
+async def save_page_fingerprints(fingerprints: list[dict[str, str]]) -> None:
+    if not fingerprints:
+        return
+
+    stmt = postgresql.insert(NotionPageFingerprint).values(fingerprints)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[NotionPageFingerprint.page_id],
+        set_={
+            "database_id": stmt.excluded.database_id,
+            "last_edited_time": stmt.excluded.last_edited_time,
+            "fingerprint": stmt.excluded.fingerprint,
+            "update_time": func.now(),
+        },
+    )
+    async with database_session.get_async_session() as session:
+        await session.execute(stmt)
+        await session.commit()
+
+
+@dataclass
+class PageDocs:
+    """Split documents of one page, with the fingerprint to save once indexed."""
+    docs: list[LangChainDocument]
+    fingerprint: dict[str, str] | None = None
+
+
+@dataclass
+class IngestionRun:
+    """State shared by the stages of a single `process_notion_data` call."""
+    notion_id: str
+    mode: str
+    vectorstore: Qdrant
+    record_manager: SQLRecordManager
+    doc_queue: asyncio.Queue
+    index_start_dt: float = 0
+    totals: dict[str, Any] = field(default_factory=lambda: {
+        "num_added": 0,
+        "num_updated": 0,
+        "num_skipped": 0,
+        "num_deleted": 0,
+    })
+    total_vectors: int = 0
+    token_stats: TokenStats = field(default_factory=TokenStats)
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+
+# pages refreshed per UPDATE, keeps the IN list well under the bind parameter limit
+KEEP_PAGES_BATCH_SIZE = 1000
+
+
+async def _keep_unchanged_pages(run: IngestionRun, page_ids: list[str]) -> None:
+    """Refresh record manager entries of skipped pages so full cleanup keeps them.
+
+    One UPDATE per batch of pages on the record manager's table, which lives in
+    the application database, instead of listing and updating keys page by page.
+    """
+    if not page_ids:
+        return
+
+    record_manager = run.record_manager
+    # server time, like the record manager's own writes
+    update_time = await record_manager.aget_time()
+    async with database_session.get_async_session() as session:
+        for start in range(0, len(page_ids), KEEP_PAGES_BATCH_SIZE):
+            await session.execute(
+                update(UpsertionRecord)
+                .where(
+                    UpsertionRecord.namespace == record_manager.namespace,
+                    UpsertionRecord.group_id.in_(
+                        page_ids[start:start + KEEP_PAGES_BATCH_SIZE]
+                    ),
+                )
+                .values(updated_at=update_time)
+            )
+        await session.commit()
+
+
+async def _changed_pages(
+    run: IngestionRun, page_summaries: list[dict[str, Any]]
+) -> list[tuple[dict[str, Any], dict[str, str]]]:
+    """Drop pages whose fingerprint is unchanged since they were last indexed."""
+    known = await get_page_fingerprints([page["id"] for page in page_summaries])
+
+    changed = []
+    unchanged_ids = []
+    for page_summary in page_summaries:
+        fingerprint = page_fingerprint(page_summary)
+        # a rebuilt collection starts empty, it needs every page
+        if known.get(page_summary["id"]) == fingerprint and run.mode != "rebuild":
+            unchanged_ids.append(page_summary["id"])
+            continue
+        changed.append((page_summary, {
+            "page_id": page_summary["id"],
+            "database_id": run.notion_id,
+            "last_edited_time": page_summary["last_edited_time"],
+            "fingerprint": fingerprint,
+        }))
+
+    run.cache_hits += len(unchanged_ids)
+    run.cache_misses += len(changed)
+    if run.mode == "full":
+        await _keep_unchanged_pages(run, unchanged_ids)
+
+    return changed
+
+
+async def _produce_database_docs(run: IngestionRun) -> None:
+    """Page through the database and feed split pages into the doc queue.
+
+    Page summaries go through a bounded queue to a fixed number of fetch
+    workers, so only `NOTION_QUEUE_SIZE` pages are ever held in memory.
+    Pages whose fingerprint did not change are skipped before any block fetch.
+    """
+    settings = get_settings()
+    page_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.NOTION_QUEUE_SIZE)
+    properties_loader = _NotionPropertiesLoader(
         integration_token=NOTION_TOKEN,
-        database_id=database_id,
-        request_timeout_sec=90,
+        database_id=run.notion_id,
     )
 
-    NOTION_BASE_URL = "https://api.notion.com/v1"
-    DATABASE_URL = NOTION_BASE_URL + f"/databases/{database_id}/query"
-    
-    def page_generator():
-        query_dict = {"page_size": chunk_size}
-        retries = 5
-        base_delay = 0.5
-        
-        while True:
-            for attempt in range(retries):
-                try:
-                    data = loader._request(
-                        DATABASE_URL,
-                        method="POST",
-                        query_dict=query_dict,
-                    )
-                    
-                    if hasattr(data, 'status_code') and data.status_code == 429:
-                        retry_after = data.headers.get('Retry-After')
-                        if retry_after:
-                            retry_after = int(float(retry_after))  # Convert to integer (seconds)
-                        else:
-                            retry_after = base_delay * (2 ** attempt)  # Fallback to exponential backoff
-                        
-                        print(f"Rate limit exceeded. Retrying in {retry_after} seconds...")
-                        time.sleep(retry_after)
-                        break  # Retry after waiting
-                                            
-                    yield from data.get("results", [])
-                    if not data.get("has_more"):
+    notion_client = get_notion_client()
+
+    async def fetch_worker() -> None:
+        while (item := await page_queue.get()) is not None:
+            page_summary, fingerprint = item
+            document = await aload_page(notion_client, properties_loader, page_summary)
+            if document is not None:
+                await run.doc_queue.put(
+                    await _split_page(run, page_summary["id"], [document], fingerprint)
+                )
+
+    async with asyncio.TaskGroup() as tg:
+        workers = [
+            tg.create_task(fetch_worker())
+            for _ in range(settings.NOTION_FETCH_CONCURRENCY)
+        ]
+        async for page_summaries in aiter_notion_db_pages(notion_client, run.notion_id):
+            for item in await _changed_pages(run, page_summaries):
+                await page_queue.put(item)
+        for _ in workers:
+            await page_queue.put(None)
+
+    await run.doc_queue.put(None)
+
+
+async def _produce_page_docs(run: IngestionRun) -> None:
+    documents = await asyncio.to_thread(load_documents_from_notion_page, run.notion_id)
+    await run.doc_queue.put(await _split_page(run, run.notion_id, documents))
+    await run.doc_queue.put(None)
+
+
+async def _split_page(
+    run: IngestionRun,
+    page_id: str,
+    documents: list[LangChainDocument],
+    fingerprint: dict[str, str] | None = None,
+) -> PageDocs:
+    """Split a page and add its tokens to the run, off the event loop."""
+    split_docs, chunk_tokens = await asyncio.to_thread(split_and_count, documents)
+    run.token_stats.add_page(page_id, chunk_tokens)
+    return PageDocs(split_docs, fingerprint)
+
+
+async def _index_stage(run: IngestionRun, cleanup: str | None) -> None:
+    """Embed and upsert split pages in batches as they arrive.
+
+    Batches always hold whole pages: with incremental cleanup `aindex` removes
+    chunks of a source that were not part of the same call. Page fingerprints
+    are saved only after their batch is indexed, so failed pages are retried.
+    """
+    batch_size = get_settings().UPSERT_BATCH_SIZE
+    batch: list[LangChainDocument] = []
+    fingerprints: list[dict[str, str]] = []
+
+    async def flush() -> None:
+        if batch:
+            result = await aindex(
+                batch,
+                run.record_manager,
+                run.vectorstore,
+                cleanup=cleanup,
+                source_id_key="id",
+                batch_size=batch_size,
+            )
+            for key, value in result.items():
+                run.totals[key] += value
+            run.total_vectors += len(batch)
+            logger.info(f"Upserted batch of {len(batch)} documents ({run.total_vectors} so far)")
+        await save_page_fingerprints(fingerprints)
+
+    while (page_docs := await run.doc_queue.get()) is not None:
+        batch.extend(page_docs.docs)
+        if page_docs.fingerprint is not None:
+            fingerprints.append(page_docs.fingerprint)
+        if len(batch) >= batch_size:
+            await flush()
+            batch = []
+            fingerprints = []
+
+    await flush()
+
+
+@dataclass
+class BulkLoad:
+    """Points stored by `_bulk_index_stage`, for `_commit_bulk_load`."""
+    stats: qdrant_bulk.BulkUploadStats
+    # record ids and source ids of each batch
+    indexed: list[tuple[list[str], list[str]]]
+    fingerprints: list[dict[str, str]]
+
+
+async def _bulk_index_stage(run: IngestionRun) -> BulkLoad:
+    """Backfill counterpart of `_index_stage`, through the Qdrant bulk loader.
+
+    Batches skip chunks the record manager already has, except in a rebuild,
+    and stream the points of the others into one parallel upload, with
+    indexing paused until it is done. Points of a failed load are deleted.
+    """
+    batch_size = get_settings().UPSERT_BATCH_SIZE
+    vectorstore = run.vectorstore
+    batch: list[LangChainDocument] = []
+    fingerprints: list[dict[str, str]] = []
+    indexed: list[tuple[list[str], list[str]]] = []
+    added_uids: list[str] = []
+
+    try:
+        async with qdrant_bulk.deferred_indexing(vectorstore.async_client, vectorstore.collection_name):
+            async with qdrant_bulk.PointStream(vectorstore.client, vectorstore.collection_name) as stream:
+
+                async def flush() -> None:
+                    if not batch:
                         return
-                    query_dict["start_cursor"] = data.get("next_cursor")
-                    break  # Exit retry loop on success
-                except HTTPError as e:
-                    if e.response.status_code == 429:
-                        # If rate limit error and no Retry-After header, use exponential backoff
-                        # retry_after = base_delay * (2 ** attempt)
-                        # print(f"Rate limit exceeded. Retrying in {retry_after} seconds...")
-                        # time.sleep(retry_after)
-                        retry_after = e.response.headers.get('Retry-After')  # Get Retry-After header
-                        if retry_after:
-                            retry_after = int(float(retry_after))  # Convert to integer (seconds)
-                        else:
-                            retry_after = base_delay * (2 ** attempt)  # Fallback to exponential backoff if header missing
-
-                        print(f"Rate limit exceeded. Retrying in {retry_after} seconds...")
-                        time.sleep(retry_after)  # Wait for the specified duration
-                        continue
+                    docs, uids, source_ids = qdrant_bulk.hash_documents(batch, "id")
+                    if run.mode == "rebuild":
+                        exists = [False] * len(uids)
                     else:
-                        print(f"Error loading page {page_summary['id']}: {e}")
-                    return None
-                except Exception as e:
-                    if attempt == retries - 1:
-                        # Log and handle error if max retries reached
-                        print(f"Error in API request: {e}")
-                        raise  # Reraise the exception after retries
-                    else:
-                        print(f"Retrying due to error: {e}")
-
-    chunk = []
-    for page in page_generator():
-        chunk.append(page)
-        if len(chunk) == chunk_size:
-            yield chunk
-            chunk = []
+                        exists = await run.record_manager.aexists(uids)
+                    new = [(uid, doc) for uid, doc, known in zip(uids, docs, exists) if not known]
+                    vectors = await vectorstore.embeddings.aembed_documents(
+                        [doc.page_content for _, doc in new]
+                    )
+                    await stream.send([
+                        qdrant_bulk.to_point(vectorstore, uid, doc, vector)
+                        for (uid, doc), vector in zip(new, vectors)
+                    ])
+                    indexed.append((uids, source_ids))
+                    added_uids.extend(uid for uid, _ in new)
+                    run.totals["num_added"] += len(new)
+                    run.totals["num_skipped"] += len(batch) - len(new)
+                    run.total_vectors += len(batch)
+
+                while (page_docs := await run.doc_queue.get()) is not None:
+                    batch.extend(page_docs.docs)
+                    if page_docs.fingerprint is not None:
+                        fingerprints.append(page_docs.fingerprint)
+                    if len(batch) >= batch_size:
+                        await flush()
+                        batch = []
+
+                await flush()
+    except BaseException:
+        if added_uids:
+            try:
+                await vectorstore.adelete(added_uids)
+            except Exception as error:
+                logger.error(f"Error deleting {len(added_uids)} points of a failed backfill: {error}")
+        raise
 
-    if chunk:  # Yield any remaining pages
-        yield chunk
+    return BulkLoad(stream.stats, indexed, fingerprints)
 
-async def process_notion_data(database_id: str, doc_type: str, cleanup_mode:str):
-    logger.info("Upserting notion documents")
-    start_time = time.time()
 
-    loader = NotionDBLoader(
-        integration_token=NOTION_TOKEN,
-        database_id=database_id,
-        request_timeout_sec=60,
+async def _commit_bulk_load(run: IngestionRun, load: BulkLoad, cleanup: str | None) -> None:
+    """Record the stored points like `aindex` would, then save the page fingerprints."""
+    for uids, source_ids in load.indexed:
+        await run.record_manager.aupdate(
+            uids, group_ids=source_ids, time_at_least=run.index_start_dt
+        )
+        if cleanup == "incremental":
+            # chunks of these pages that are not part of this load, like `aindex`
+            stale = await run.record_manager.alist_keys(
+                group_ids=list(set(source_ids)), before=run.index_start_dt
+            )
+            if stale:
+                await run.vectorstore.adelete(stale)
+                await run.record_manager.adelete_keys(stale)
+                run.totals["num_deleted"] += len(stale)
+    await save_page_fingerprints(load.fingerprints)
+
+
+async def _run_stages(run: IngestionRun, producer, index_stage) -> Any:
+    """Run the producer and the index stage together, returns the index stage result."""
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(producer(run))
+            index_task = tg.create_task(index_stage)
+    except ExceptionGroup as eg:
+        raise eg.exceptions[0]
+    return index_task.result()
+
+
+async def _rebuild_collection(run: IngestionRun, producer) -> tuple[BulkLoad, str, str | None]:
+    """Bulk load everything into a shadow collection and switch the alias to it.
+
+    Returns the load, the new collection and the one the alias pointed to.
+
+    Readers keep querying the live collection until the shadow one holds every
+    point and is indexed. A rebuild failing before the switch drops the shadow
+    collection and leaves the live one as it was. A failed switch keeps it.
+    """
+    live = run.vectorstore
+    client = live.async_client
+    alias = live.collection_name
+    shadow = await qdrant_bulk.create_shadow_collection(client, alias)
+    run.vectorstore = Qdrant(
+        collection_name=shadow,
+        client=live.client,
+        async_client=client,
+        embeddings=live.embeddings,
     )
 
-    def process_chunk_wrapper(chunk: List[Dict[str, Any]]):
+    try:
+        load = await _run_stages(run, producer, _bulk_index_stage(run))
+        expected = len({uid for uids, _ in load.indexed for uid in uids})
+        count = (await client.count(shadow, exact=True)).count
+        if count != expected:
+            raise Exception(f"Collection {shadow} has {count} points instead of {expected}")
+        await qdrant_bulk.wait_until_indexed(client, shadow)
+    except BaseException:
         try:
-            return process_chunk(chunk, loader)
-        except Exception as e:
-            logger.error(f"Error processing chunk: {e}")
-            return []
-    
-    total_docs = []
-    chunk_size = 10  # Number of pages per chunk
-    
-    if doc_type == "database":
-        chunks = load_notion_db_in_chunks(NOTION_TOKEN, database_id, doc_type, chunk_size=chunk_size)
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-            future_to_chunk = {executor.submit(process_chunk_wrapper, chunk): chunk for chunk in chunks}
-            
-            for future in concurrent.futures.as_completed(future_to_chunk):
-                try:
-                    split_docs = future.result()
-                    total_docs.extend(split_docs)
-                    logger.info(f"Chunk processed with {len(split_docs)} documents split.")
-                except Exception as e:
-                    logger.error(f"Error during chunk processing: {e}")
+            await client.delete_collection(shadow)
+        except Exception as error:
+            logger.error(f"Error dropping collection {shadow} of a failed rebuild: {error}")
+        raise
+    finally:
+        run.vectorstore = live
+
+    # the first switch deletes the plain live collection before creating the
+    # alias, when it fails the shadow collection is the only copy left
+    previous = await qdrant_bulk.switch_alias(client, alias, shadow)
+    return load, shadow, previous
+
+
+async def _full_cleanup(
+    vectorstore: Qdrant | None,
+    record_manager: SQLRecordManager,
+    index_start_dt: float,
+    cleanup_batch_size: int = 1_000,
+) -> int:
+    """Delete every record not touched since `index_start_dt`, like `aindex(cleanup="full")`.
+
+    Without a vectorstore only the records are deleted.
+    """
+    num_deleted = 0
+    while uids_to_delete := await record_manager.alist_keys(
+        before=index_start_dt, limit=cleanup_batch_size
+    ):
+        if vectorstore is not None:
+            await vectorstore.adelete(uids_to_delete)
+        await record_manager.adelete_keys(uids_to_delete)
+        num_deleted += len(uids_to_delete)
+    return num_deleted
+
+
+async def process_notion_data(database_id: str, doc_type: str, cleanup_mode:str, backfill: bool = False):
+    """Stream a Notion database or page into Qdrant.
+
+    Pages are fetched, split, embedded and upserted concurrently through
+    bounded queues, so vectors land in Qdrant while later pages are still
+    downloading and memory depends on the queue depth, not the database size.
+    With `backfill` the vectors go through the bulk loader instead of `aindex`,
+    for large loads. The "rebuild" cleanup mode is a full cleanup that bulk
+    loads a new collection and switches the QDRANT_COLLECTION_NAME alias to it,
+    queries never see a partly rebuilt collection. Other upserts wait while
+    a rebuild runs.
+    """
+    logger.info("Upserting notion documents")
+
+    mode = cleanup_mode.lower()
+    if mode not in CLEANUP_MODES:
+        raise Exception("Incorrect cleanup mode")
 
+    if doc_type == "database":
+        producer = _produce_database_docs
     elif doc_type == "page":
-        total_docs = split_documents(load_documents_from_notion_page(database_id))
+        producer = _produce_page_docs
     else:
         raise HTTPException(status_code=400,
                             detail="Invalid document type")
 
-    cost_info = calculate_cost(total_docs)
-    logger.info(f"Total Embedding Cost: {cost_info}")
+    if mode == "rebuild":
+        async with _UPSERT_GATE.rebuild():
+            return await _process_notion_data(database_id, producer, mode, backfill=True)
+    async with _UPSERT_GATE.upsert():
+        return await _process_notion_data(database_id, producer, mode, backfill)
+
 
-    vectordb_result = await cleanup_and_upsert_documents(total_docs, cleanup_mode)
+async def _process_notion_data(database_id: str, producer, mode: str, backfill: bool):
+    """`process_notion_data` once its arguments are checked."""
+    start_time = time.time()
+
+    vectorstore, record_manager = await get_index_targets()
+    index_start_dt = await record_manager.aget_time()
+    embedding_stats = track_embedding_stats()
+
+    run = IngestionRun(
+        notion_id=database_id,
+        mode=mode,
+        vectorstore=vectorstore,
+        record_manager=record_manager,
+        doc_queue=asyncio.Queue(maxsize=get_settings().NOTION_QUEUE_SIZE),
+        index_start_dt=index_start_dt,
+    )
+    # Full cleanup is applied once at the end, per batch only stale chunks of
+    # the pages in that batch may be removed. A rebuilt collection has none.
+    if mode == "rebuild":
+        batch_cleanup = None
+    else:
+        batch_cleanup = "incremental" if mode == "full" else CLEANUP_MODES[mode]
+
+    bulk_load = None
+    rebuilt_collection = None
+    previous_collection = None
+    if mode == "rebuild":
+        bulk_load, rebuilt_collection, previous_collection = await _rebuild_collection(run, producer)
+    elif backfill:
+        bulk_load = await _run_stages(run, producer, _bulk_index_stage(run))
+    else:
+        await _run_stages(run, producer, _index_stage(run, batch_cleanup))
+
+    if bulk_load is not None:
+        await _commit_bulk_load(run, bulk_load, batch_cleanup)
+
+    if mode == "full":
+        run.totals["num_deleted"] += await _full_cleanup(vectorstore, record_manager, index_start_dt)
+    elif mode == "rebuild":
+        # the points of these records are not in the new collection
+        run.totals["num_deleted"] += await _full_cleanup(None, record_manager, index_start_dt)
+
+    dropped_collection = None
+    if previous_collection is not None:
+        # only the collection this rebuild replaced, others may still be loading
+        try:
+            await vectorstore.async_client.delete_collection(previous_collection)
+            dropped_collection = previous_collection
+            logger.info(f"Dropped collection {previous_collection}")
+        except Exception as error:
+            logger.error(f"Error dropping collection {previous_collection}: {error}")
+
+    total_embedding_cost = run.token_stats.tokens * EMBEDDING_COST_PER_TOKEN
+    logger.info(f"Total Embedding Cost: {total_embedding_cost} ({run.token_stats.tokens} tokens)")
+    logger.info(f"Page cache: {run.cache_hits} hits, {run.cache_misses} misses")
+    logger.info(f"Embedding cache: {embedding_stats.cache_hits} hits, {embedding_stats.embedded} embedded")
 
     process_time = time.time() - start_time
-    logger.info(f"Total documents: {len(total_docs)} - Duration: {process_time:.4f} seconds")
+    logger.info(f"Total documents: {run.total_vectors} - Duration: {process_time:.4f} seconds")
 
-    return {"Embedding_cost" : cost_info["total_embedding_cost"], "Qdrant_result": vectordb_result, "total_vectors": len(total_docs)}
+    return {
+        "Embedding_cost" : total_embedding_cost,
+        "Tokens": run.token_stats.summary(),
+        "Qdrant_result": run.totals,
+        "total_vectors": run.total_vectors,
+        "Page_cache": {"hits": run.cache_hits, "misses": run.cache_misses},
+        "Embedding_cache": asdict(embedding_stats),
+        "Bulk_upload": asdict(bulk_load.stats) if bulk_load is not None else None,
+        "Rebuild": {
+            "collection": rebuilt_collection,
+            "dropped_collection": dropped_collection,
+        } if rebuilt_collection is not None else None,
+    }
@@ -0,0 +1,332 @@
+# Bulk loading of the ingestion vectors into Qdrant, for large backfills.
+#
+# `aindex` adds vectors through `Qdrant.aadd_documents`, one small request at a
+# time while the collection indexes every segment as it fills up. A backfill
+# instead streams its points into a single `upload_points` call running in a
+# thread, which spreads them over QDRANT_UPLOAD_PARALLEL worker processes in
+# requests of QDRANT_UPLOAD_BATCH_SIZE points. HNSW indexing of the collection
+# is paused for the load (`indexing_threshold=0`) and built once at the end.
+#
+# Points carry the payload and ids `Qdrant` and `aindex` would give them, so
+# the vectorstore, the record manager and later incremental runs see no
+# difference with an `aindex` load.
+#
+# A full rebuild loads into a new shadow collection with the live collection's
+# configuration while readers keep querying the live one. QDRANT_COLLECTION_NAME
+# is an alias, switched to the shadow collection in one request once its point
+# count checks out and its index is built, the collection it pointed to before
+# is dropped afterwards.
+#
+# One-time migration: a deployment with a plain collection named
+# QDRANT_COLLECTION_NAME turns it into the alias on its first rebuild. An alias
+# cannot take the name of an existing collection, so the plain collection is
+# deleted first and queries fail until the alias is created, a request later
+# (retried, the shadow collection holds every point). Run that first rebuild
+# when failing queries are acceptable, later rebuilds have no such gap.
+#
+# https://qdrant.tech/documentation/tutorials/bulk-upload/
+# https://qdrant.tech/documentation/concepts/collections/#collection-aliases
+
+
+import asyncio
+import logging
+import queue
+import time
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import Any
+
+from langchain_core.documents import Document
+from langchain_core.indexing.api import _HashedDocument
+from langchain_qdrant import Qdrant
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http import models
+
+from app.core.config import get_settings
+
+logger = logging.getLogger("uvicorn")
+
+# collection name -> (backfills in progress, indexing_threshold to restore)
+_PAUSED_INDEXING: dict[str, tuple[int, int | None]] = {}
+
+
+@dataclass
+class BulkUploadStats:
+    points: int = 0
+    seconds: float = 0.0
+    points_per_second: float = 0.0
+
+
+def hash_documents(
+    docs: list[Document], source_id_key: str
+) -> tuple[list[Document], list[str], list[str]]:
+    """Documents without duplicates, with the record ids and source ids `aindex` uses.
+
+    `_HashedDocument` is the hashing `aindex` derives its record ids from.
+    """
+    seen: set[str] = set()
+    unique_docs: list[Document] = []
+    uids: list[str] = []
+    source_ids: list[str] = []
+    for doc in docs:
+        hashed = _HashedDocument.from_document(doc)
+        if hashed.uid in seen:
+            continue
+        seen.add(hashed.uid)
+        unique_docs.append(doc)
+        uids.append(hashed.uid)
+        source_ids.append(doc.metadata[source_id_key])
+    return unique_docs, uids, source_ids
+
+
+def to_point(
+    vectorstore: Qdrant, uid: str, doc: Document, vector: list[float]
+) -> models.PointStruct:
+    """Point of a document, as `Qdrant.aadd_documents` would store it."""
+    return models.PointStruct(
+        id=uid,
+        vector={vectorstore.vector_name: vector}
+        if vectorstore.vector_name is not None
+        else vector,
+        payload={
+            vectorstore.content_payload_key: doc.page_content,
+            vectorstore.metadata_payload_key: doc.metadata,
+        },
+    )
+
+
+@asynccontextmanager
+async def deferred_indexing(
+    client: AsyncQdrantClient, collection_name: str
+) -> AsyncIterator[None]:
+    """Pause HNSW indexing of the collection, restore its threshold on exit.
+
+    The threshold read when the pause starts is restored as it was, the
+    default only replaces a missing one. Concurrent backfills of a collection
+    in this process share the pause, the last one to finish restores the
+    threshold. The count is per process: a backfill started by another worker
+    during the pause would read and later restore the paused 0.
+    """
+    count, threshold = _PAUSED_INDEXING.get(collection_name, (0, None))
+    if count == 0:
+        info = await client.get_collection(collection_name)
+        threshold = info.config.optimizer_config.indexing_threshold
+        await client.update_collection(
+            collection_name,
+            optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0),
+        )
+    _PAUSED_INDEXING[collection_name] = (count + 1, threshold)
+    try:
+        yield
+    finally:
+        count, threshold = _PAUSED_INDEXING.pop(collection_name)
+        if count > 1:
+            _PAUSED_INDEXING[collection_name] = (count - 1, threshold)
+        else:
+            await client.update_collection(
+                collection_name,
+                optimizers_config=models.OptimizersConfigDiff(
+                    indexing_threshold=threshold
+                    if threshold is not None
+                    else get_settings().QDRANT_INDEXING_THRESHOLD
+                ),
+            )
+
+
+class PointStream:
+    """Points sent to a single `upload_points` call for the whole load.
+
+    The upload runs in a thread and pulls lists of points from a bounded
+    queue, `send` waits while QDRANT_UPLOAD_MAX_PENDING lists are queued.
+    Points are only known to be stored once the stream is closed without error.
+    """
+
+    def __init__(self, client: QdrantClient, collection_name: str) -> None:
+        settings = get_settings()
+        self.client = client
+        self.collection_name = collection_name
+        self.batch_size = settings.QDRANT_UPLOAD_BATCH_SIZE
+        self.parallel = settings.QDRANT_UPLOAD_PARALLEL
+        self.stats = BulkUploadStats()
+        self._queue: queue.Queue[list[models.PointStruct] | None] = queue.Queue(
+            maxsize=settings.QDRANT_UPLOAD_MAX_PENDING
+        )
+        self._upload: asyncio.Future[None] | None = None
+        self._start = 0.0
+
+    async def __aenter__(self) -> "PointStream":
+        self._start = time.perf_counter()
+        self._upload = asyncio.ensure_future(asyncio.to_thread(self._run))
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        assert self._upload is not None
+        if exc_type is not None:
+            # stop the upload, points still queued are dropped
+            self._drain()
+            self._queue.put_nowait(None)
+            await asyncio.wait({self._upload})
+            return
+        await self._put(None)
+        await self._upload
+        self.stats.seconds = time.perf_counter() - self._start
+        if self.stats.seconds:
+            self.stats.points_per_second = self.stats.points / self.stats.seconds
+        logger.info(
+            f"Uploaded {self.stats.points} points to {self.collection_name} "
+            f"- {self.stats.points_per_second:.1f} points/s"
+        )
+
+    async def send(self, points: list[models.PointStruct]) -> None:
+        if points:
+            await self._put(points)
+            self.stats.points += len(points)
+
+    def _run(self) -> None:
+        self.client.upload_points(
+            self.collection_name,
+            self._points(),
+            batch_size=self.batch_size,
+            parallel=self.parallel,
+            wait=True,
+        )
+
+    def _points(self) -> Iterator[models.PointStruct]:
+        for points in iter(self._queue.get, None):
+            yield from points
+
+    async def _put(self, item: list[models.PointStruct] | None) -> None:
+        assert self._upload is not None
+        put = asyncio.ensure_future(asyncio.to_thread(self._queue.put, item))
+        await asyncio.wait({put, self._upload}, return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            # the upload stopped, free the blocked put and raise the upload error
+            self._drain()
+            await put
+            await self._upload
+            raise RuntimeError(
+                f"Upload to {self.collection_name} stopped before the end of the stream"
+            )
+        await put
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+
+def shadow_collection_name(alias: str) -> str:
+    return f"{alias}__{datetime.now(UTC):%Y%m%d%H%M%S%f}"
+
+
+async def alias_target(client: AsyncQdrantClient, alias: str) -> str | None:
+    """Collection the alias points to, None when there is no such alias."""
+    response = await client.get_aliases()
+    for description in response.aliases:
+        if description.alias_name == alias:
+            return description.collection_name
+    return None
+
+
+async def create_shadow_collection(client: AsyncQdrantClient, alias: str) -> str:
+    """Empty collection configured like the one `alias` names today."""
+    info = await client.get_collection(alias)
+    name = shadow_collection_name(alias)
+    await client.create_collection(
+        name,
+        vectors_config=info.config.params.vectors or {},
+        sparse_vectors_config=info.config.params.sparse_vectors,
+        shard_number=info.config.params.shard_number,
+        replication_factor=info.config.params.replication_factor,
+        write_consistency_factor=info.config.params.write_consistency_factor,
+        on_disk_payload=info.config.params.on_disk_payload,
+        hnsw_config=models.HnswConfigDiff(**info.config.hnsw_config.model_dump()),
+        optimizers_config=models.OptimizersConfigDiff(
+            **info.config.optimizer_config.model_dump()
+        ),
+        quantization_config=info.config.quantization_config,
+    )
+    for field_name, field_schema in info.payload_schema.items():
+        await client.create_payload_index(
+            name, field_name, field_schema=field_schema.data_type
+        )
+    logger.info(f"Created shadow collection {name} for {alias}")
+    return name
+
+
+async def wait_until_indexed(client: AsyncQdrantClient, collection_name: str) -> None:
+    """Wait for the optimizers to finish, so the collection is served from its index."""
+    settings = get_settings()
+    deadline = time.monotonic() + settings.QDRANT_REBUILD_INDEX_TIMEOUT_SECS
+    while (
+        await client.get_collection(collection_name)
+    ).status != models.CollectionStatus.GREEN:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Collection {collection_name} is still being indexed")
+        await asyncio.sleep(1)
+
+
+async def switch_alias(
+    client: AsyncQdrantClient, alias: str, collection_name: str
+) -> str | None:
+    """Point `alias` at `collection_name`, returns the collection it pointed to."""
+    previous = await alias_target(client, alias)
+    if previous is None and await client.collection_exists(alias):
+        await _replace_collection_by_alias(client, alias, collection_name)
+        return None
+    operations: list[models.AliasOperations] = [
+        models.CreateAliasOperation(
+            create_alias=models.CreateAlias(
+                collection_name=collection_name, alias_name=alias
+            )
+        )
+    ]
+    if previous is not None:
+        operations.insert(
+            0,
+            models.DeleteAliasOperation(
+                delete_alias=models.DeleteAlias(alias_name=alias)
+            ),
+        )
+    # both operations are applied together, readers never miss the alias
+    await client.update_collection_aliases(change_aliases_operations=operations)
+    logger.info(f"Alias {alias} now points to {collection_name}")
+    return previous
+
+
+async def _replace_collection_by_alias(
+    client: AsyncQdrantClient, alias: str, collection_name: str, attempts: int = 5
+) -> None:
+    """Delete the plain collection `alias` and create the alias in its place.
+
+    Queries of `alias` fail between the two requests. `collection_name` holds
+    every point, so the alias creation is retried rather than undone.
+    """
+    logger.warning(f"Replacing collection {alias} by an alias of the same name")
+    await client.delete_collection(alias)
+    operations: list[models.AliasOperations] = [
+        models.CreateAliasOperation(
+            create_alias=models.CreateAlias(
+                collection_name=collection_name, alias_name=alias
+            )
+        )
+    ]
+    for attempt in range(1, attempts + 1):
+        try:
+            await client.update_collection_aliases(change_aliases_operations=operations)
+        except Exception as error:
+            if attempt == attempts:
+                logger.error(
+                    f"Collection {alias} was deleted but its alias to {collection_name} "
+                    f"could not be created, create it by hand: {error}"
+                )
+                raise
+            logger.warning(f"Creating alias {alias} failed, retrying: {error}")
+            await asyncio.sleep(2**attempt)
+        else:
+            break
+    logger.info(f"Alias {alias} now points to {collection_name}")
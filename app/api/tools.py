@@ -1,10 +1,10 @@
-import requests
+import httpx
 import json
 import asyncio
-import aiohttp
-import time
+from urllib.parse import quote
 from app.core.config import get_settings
-from notion_client import Client
+from app.core.http_client import get_http_client
+from app.core.rate_limiter import get_rate_limiter, parse_retry_after
 import markdown2
 import math
 import re
@@ -15,7 +15,7 @@ yt_api_key = get_settings().YT_API_KEY
 rapidapi_key = get_settings().RAPID_API_KEY
 serpapi_key = get_settings().SERP_API_KEY
 
-def perplexity_ai_search(query:str):
+async def perplexity_ai_search(query:str):
     headers = {
         'Content-Type': 'application/json',
         'Authorization': f'Bearer {get_settings().PERPLEXITY_API_KEY}'
@@ -30,64 +30,67 @@ def perplexity_ai_search(query:str):
     }
     
     try:
-        response = requests.post("https://api.perplexity.ai/chat/completions", headers=headers, json=body)
+        response = await get_http_client("perplexity").post("https://api.perplexity.ai/chat/completions", headers=headers, json=body)
         response.raise_for_status()  # Raise an HTTPError for bad responses
         # json_data = response.json()  # Parse the JSON response
         # print(json.dumps(json_data, indent=2))  # Print formatted JSON
         return response.text
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f'Error making request: {e}')
         return None
     except json.JSONDecodeError as e:
         print(f'Error parsing JSON: {e}')
         return None
 
-def youtube_search(region_code: str, lang:str, keywords:str):
+async def youtube_search(region_code: str, lang:str, keywords:str):
     url = f"https://www.googleapis.com/youtube/v3/search?part=snippet&regionCode={region_code}&relevanceLanguage={lang}&q={keywords}&maxResults=15&type=video&key={yt_api_key}"
     headers = {
         'Content-Type': 'application/json'
     }
     
     try:
-        response = requests.get(url, headers=headers)
+        await get_rate_limiter("youtube").acquire()
+        response = await get_http_client("youtube").get(url, headers=headers)
         response.raise_for_status()  # Will raise an HTTPError for bad responses (4xx and 5xx)
         data = response.json()
         return data
-    except requests.RequestException as error:
+    except httpx.HTTPError as error:
         print(f"An error occurred: {error}")
         return ''
 
 
-def channel_details_tool(channel_id: str):
+async def channel_details_tool(channel_id: str):
     url = f'https://www.googleapis.com/youtube/v3/channels?part=statistics&id={channel_id}&key={yt_api_key}'
     headers = {
         'Content-Type': 'application/json'
     }
     try:
-        response = requests.get(url, headers=headers)
+        await get_rate_limiter("youtube").acquire()
+        response = await get_http_client("youtube").get(url, headers=headers)
         response.raise_for_status()  # Raise an HTTPError for bad responses
         data = response.json()
         return data
-    except requests.RequestException as error:
+    except httpx.HTTPError as error:
         print(error)
         return ''
 
-def youtube_video_details(video_id:str):
+async def youtube_video_details(video_id:str):
     url = f"https://www.googleapis.com/youtube/v3/videos?part=snippet,statistics&id={video_id}&key={yt_api_key}"
     headers = {
         'Content-Type': 'application/json'
     }
     
     try:
-        response = requests.get(url, headers=headers)
+        await get_rate_limiter("youtube").acquire()
+        response = await get_http_client("youtube").get(url, headers=headers)
         response.raise_for_status()  # Will raise an HTTPError for bad responses
         data = response.json()
         return data
-    except requests.RequestException as error:
+    except httpx.HTTPError as error:
         print(f"Error: {error}")
         return ''
 
-def transcribe_video(video_id: str):
+async def transcribe_video(video_id: str):
     url = f'https://youtube-transcriptor.p.rapidapi.com/transcript?video_id={video_id}'
     headers = {
         'x-rapidapi-key': rapidapi_key,
@@ -95,16 +98,17 @@ def transcribe_video(video_id: str):
     }
 
     try:
-        response = requests.get(url, headers=headers)
+        await get_rate_limiter("rapidapi").acquire()
+        response = await get_http_client("rapidapi").get(url, headers=headers)
         response.raise_for_status()  # Will raise an HTTPError for bad responses
         result = response.text
         print(result)
         return result
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(e)
         return ''
 
-def google_promise(keyword: str, location: str, lang: str):
+async def google_promise(keyword: str, location: str, lang: str):
     keysuggest_url = f'https://google-keyword-insight1.p.rapidapi.com/keysuggest/?keyword={keyword}&location={location}&lang={lang}&min_search_vol=5000'
     globalkey_url = f'https://google-keyword-insight1.p.rapidapi.com/globalkey/?keyword={keyword}&lang={lang}&min_search_vol=5000'
 
@@ -115,23 +119,27 @@ def google_promise(keyword: str, location: str, lang: str):
 
     try:
         # Fetch data from both URLs concurrently
-        with requests.Session() as session:
-            keysuggest_response = session.get(keysuggest_url, headers=headers)
-            globalkey_response = session.get(globalkey_url, headers=headers)
+        async def fetch(url):
+            await get_rate_limiter("rapidapi").acquire()
+            return await get_http_client("rapidapi").get(url, headers=headers)
 
-            keysuggest_data = keysuggest_response.text
-            globalkey_data = globalkey_response.text
+        keysuggest_response, globalkey_response = await asyncio.gather(
+            fetch(keysuggest_url), fetch(globalkey_url)
+        )
+
+        keysuggest_data = keysuggest_response.text
+        globalkey_data = globalkey_response.text
 
         print('Keysuggest Data:', keysuggest_data)
         print('Globalkey Data:', globalkey_data)
 
         return {'keysuggest_data': keysuggest_data, 'globalkey_data': globalkey_data}
 
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"An error occurred: {e}")
         return {'keysuggest_data': '', 'globalkey_data': ''}
 
-def Med_Articles_PMC(query: str):
+async def Med_Articles_PMC(query: str):
     cleaned_query = query.strip()
     page_size = 25  # Number of results per page
     page = 1
@@ -142,11 +150,12 @@ def Med_Articles_PMC(query: str):
     try:
         while True:
             europe_pmc_url = (f"https://www.ebi.ac.uk/europepmc/webservices/rest/search?"
-                              f"query={requests.utils.quote(cleaned_query)}&format=json&pageSize={page_size}&page={page}")
+                              f"query={quote(cleaned_query)}&format=json&pageSize={page_size}&page={page}")
             print(f"Searching Europe PMC for query: {cleaned_query}, page: {page}")
-            response = requests.get(europe_pmc_url)
+            await get_rate_limiter("europepmc").acquire()
+            response = await get_http_client("europepmc").get(europe_pmc_url)
 
-            if not response.ok:
+            if not response.is_success:
                 response_text = response.text
                 raise Exception(f"Europe PMC request failed with status {response.status_code}: {response_text}")
 
@@ -184,23 +193,27 @@ async def delay(ms):
     await asyncio.sleep(ms / 1000.0)
 
 async def search_papers(query):
-    url = f'https://api.semanticscholar.org/graph/v1/paper/search?query={aiohttp.web.Request.query_string}'
+    url = 'https://api.semanticscholar.org/graph/v1/paper/search'
     headers = {
         'Content-Type': 'application/json'
     }
     
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers) as response:
-            if response.status != 200:
-                print(f'Error searching papers: HTTP error! status: {response.status}')
-                return []
-            
-            data = await response.json()
-            if 'data' not in data:
-                print('Error searching papers: No data found in the response')
-                return []
-            
-            return [paper['paperId'] for paper in data['data']]
+    await get_rate_limiter("semanticscholar").acquire()
+    response = await get_http_client("semanticscholar").get(url, headers=headers, params={'query': query})
+    if response.status_code == 429:
+        get_rate_limiter("semanticscholar").penalize(
+            parse_retry_after(response.headers.get('Retry-After'), 1.0)
+        )
+    if response.status_code != 200:
+        print(f'Error searching papers: HTTP error! status: {response.status_code}')
+        return []
+    
+    data = response.json()
+    if 'data' not in data:
+        print('Error searching papers: No data found in the response')
+        return []
+    
+    return [paper['paperId'] for paper in data['data']]
 
 async def get_paper_details(paper_ids):
     url = 'https://api.semanticscholar.org/graph/v1/paper/batch?fields=title,tldr,openAccessPdf,abstract,year'
@@ -211,18 +224,22 @@ async def get_paper_details(paper_ids):
         'ids': paper_ids
     }
     
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=payload) as response:
-            if response.status != 200:
-                print(f'Error getting paper details: HTTP error! status: {response.status}')
-                return []
-            
-            data = await response.json()
-            if not isinstance(data, list):
-                print('Error getting paper details: Invalid data format received from the API')
-                return []
-            
-            return data
+    await get_rate_limiter("semanticscholar").acquire()
+    response = await get_http_client("semanticscholar").post(url, headers=headers, json=payload)
+    if response.status_code == 429:
+        get_rate_limiter("semanticscholar").penalize(
+            parse_retry_after(response.headers.get('Retry-After'), 1.0)
+        )
+    if response.status_code != 200:
+        print(f'Error getting paper details: HTTP error! status: {response.status_code}')
+        return []
+    
+    data = response.json()
+    if not isinstance(data, list):
+        print('Error getting paper details: Invalid data format received from the API')
+        return []
+    
+    return data
 
 async def Semantic_Scholar_Tool(query: str):
     print('Query:', query)
@@ -244,27 +261,30 @@ def extract_keywords(query):
     return ' '.join(filtered_words)
 
 # Function to handle HTTP requests with retries and exponential backoff
-def fetch_with_retry(url, retries=3, backoff=3.0):
+async def fetch_with_retry(url, retries=3, backoff=3.0, limiter="ncbi"):
     headers = {'Accept': 'application/json'}
+    rate_limiter = get_rate_limiter(limiter)
     for i in range(retries):
         try:
-            response = requests.get(url, headers=headers)
-            if response.ok:
+            await rate_limiter.acquire()
+            response = await get_http_client(limiter).get(url, headers=headers)
+            if response.is_success:
                 return response
             elif response.status_code == 429:
-                print(f'Rate limit exceeded. Retrying in {int(backoff * 1000)}ms...')
-                time.sleep(backoff)
+                retry_after = parse_retry_after(response.headers.get('Retry-After'), backoff)
+                print(f'Rate limit exceeded. Retrying in {int(retry_after * 1000)}ms...')
+                rate_limiter.penalize(retry_after)
                 backoff *= 2  # Exponential backoff
             else:
                 response.raise_for_status()
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             print(f'Error: {e}')
             if i == retries - 1:
                 raise
     raise RuntimeError('Max retries exceeded')
 
 # Function to search for PubMed articles
-def PubMed_Tool(query: str):
+async def PubMed_Tool(query: str):
     cleaned_query = extract_keywords(query.strip())
     page_size = 25  # Number of results per page
     page = 0
@@ -275,11 +295,11 @@ def PubMed_Tool(query: str):
     try:
         while True:
             pubmed_url = (
-                f'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi?db=pubmed&term={requests.utils.quote(cleaned_query)}'
+                f'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi?db=pubmed&term={quote(cleaned_query)}'
                 f'&retmode=json&retmax={page_size}&retstart={page * page_size}'
             )
             print(f'Searching PubMed for query: {cleaned_query}, page: {page}')
-            pubmed_response = fetch_with_retry(pubmed_url)
+            pubmed_response = await fetch_with_retry(pubmed_url)
             pubmed_data = pubmed_response.json()
             print(f'PubMed response for page {page}: {json.dumps(pubmed_data, indent=2)}')
 
@@ -291,7 +311,7 @@ def PubMed_Tool(query: str):
                 details_url = (
                     f'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi?db=pubmed&id={ids}&retmode=json'
                 )
-                details_response = fetch_with_retry(details_url)
+                details_response = await fetch_with_retry(details_url)
                 details_data = details_response.json()
                 total_results.extend(details_data['result'])
                 print(f'Accumulated results count: {len(total_results)}')
@@ -315,7 +335,7 @@ def PubMed_Tool(query: str):
         return json.dumps({'status': 'error', 'reason': str(e)}, indent=2)
 
 
-def Google_Scholar_Tool(query: str, num_results=10):
+async def Google_Scholar_Tool(query: str, num_results=10):
     
     endpoint = "https://serpapi.com/search"
     params = {
@@ -326,7 +346,8 @@ def Google_Scholar_Tool(query: str, num_results=10):
     }
     
     try:
-        response = requests.get(endpoint, params=params)
+        await get_rate_limiter("serpapi").acquire()
+        response = await get_http_client("serpapi").get(endpoint, params=params)
         response.raise_for_status()  # Raise an HTTPError for bad responses
         result = response.json()
         
@@ -349,7 +370,7 @@ def Google_Scholar_Tool(query: str, num_results=10):
         return []
 
 
-def avatar_information(query:str):
+async def avatar_information(query:str):
     API_URL = get_settings().QDRANT_FLOWISE_URL
     input = {
         "question": query,
@@ -364,10 +385,10 @@ def avatar_information(query:str):
         }
     }
 
-    response = requests.post(API_URL, json=input)
+    response = await get_http_client("flowise").post(API_URL, json=input)
     return response.json()
 
-def ultimatebrain_information(query:str):
+async def ultimatebrain_information(query:str):
     API_URL = get_settings().QDRANT_FLOWISE_URL
     input = {
         "question": query,
@@ -382,10 +403,10 @@ def ultimatebrain_information(query:str):
         }
     }
 
-    response = requests.post(API_URL, json=input)
+    response = await get_http_client("flowise").post(API_URL, json=input)
     return response.json()
 
-def sugarbrain_information(query:str):
+async def sugarbrain_information(query:str):
     API_URL = get_settings().QDRANT_FLOWISE_URL
     input = {
         "question": query,
@@ -400,7 +421,7 @@ def sugarbrain_information(query:str):
         }
     }
 
-    response = requests.post(API_URL, json=input)
+    response = await get_http_client("flowise").post(API_URL, json=input)
     return response.json()
 
 
@@ -601,18 +622,16 @@ def markdown_to_notion_blocks(markdown_content):
 
 #     return blocks
 
-def store_markdown_in_notion_research(token, database_id, markdown_content, page_title, doi_options):
+async def store_markdown_in_notion_research(database_id, markdown_content, page_title, doi_options):
     """
     Store markdown content as a page in the Notion database with batch handling for API limits.
     
     Parameters:
-    - token: Notion API token.
     - database_id: The ID of the target Notion database.
     - markdown_content: Markdown content to store in the page.
     - page_title: Title of the page.
     """
-    # Initialize Notion client
-    notion = Client(auth=token)
+    notion_client = notion.get_notion_client()
 
     # Convert markdown content to Notion blocks
     blocks = markdown_to_notion_blocks(markdown_content)
@@ -643,7 +662,8 @@ def store_markdown_in_notion_research(token, database_id, markdown_content, page
     num_batches = math.ceil(len(blocks) / batch_size)
 
     # Create the page with the first batch
-    response = notion.pages.create(
+    await get_rate_limiter("notion").acquire()
+    response = await notion_client.pages.create(
         **page_properties,
         children=blocks[:batch_size]
     )
@@ -652,25 +672,24 @@ def store_markdown_in_notion_research(token, database_id, markdown_content, page
     if num_batches > 1:
         page_id = response['id']
         for i in range(1, num_batches):
-            notion.blocks.children.append(
+            await get_rate_limiter("notion").acquire()
+            await notion_client.blocks.children.append(
                 block_id=page_id,
                 children=blocks[i*batch_size:(i+1)*batch_size]
             )
 
     return response
 
-def store_markdown_in_notion(token, database_id, markdown_content, page_title):
+async def store_markdown_in_notion(database_id, markdown_content, page_title):
     """
     Store markdown content as a page in the Notion database with batch handling for API limits.
     
     Parameters:
-    - token: Notion API token.
     - database_id: The ID of the target Notion database.
     - markdown_content: Markdown content to store in the page.
     - page_title: Title of the page.
     """
-    # Initialize Notion client
-    notion = Client(auth=token)
+    notion_client = notion.get_notion_client()
 
     # Convert markdown content to Notion blocks
     blocks = markdown_to_notion_blocks(markdown_content)
@@ -695,7 +714,8 @@ def store_markdown_in_notion(token, database_id, markdown_content, page_title):
     num_batches = math.ceil(len(blocks) / batch_size)
 
     # Create the page with the first batch
-    response = notion.pages.create(
+    await get_rate_limiter("notion").acquire()
+    response = await notion_client.pages.create(
         **page_properties,
         children=blocks[:batch_size]
     )
@@ -704,35 +724,35 @@ def store_markdown_in_notion(token, database_id, markdown_content, page_title):
     if num_batches > 1:
         page_id = response['id']
         for i in range(1, num_batches):
-            notion.blocks.children.append(
+            await get_rate_limiter("notion").acquire()
+            await notion_client.blocks.children.append(
                 block_id=page_id,
                 children=blocks[i*batch_size:(i+1)*batch_size]
             )
 
     return response
 
-def save_in_notion(content:str, 
+async def save_in_notion(content:str, 
     title:str , doi: str):
-    token = get_settings().NOTION_TOKEN  # Your Notion integration token
     database_id = get_settings().NOTION_DATABASE_ID_RESEARCH
       # Split the DOIs by comma and strip any whitespace
     doi_list = [doi.strip() for doi in doi.split(",") if doi.strip()]
     
     # Prepare DOI options for Notion
     doi_options = [{"name": doi} for doi in doi_list]
-    response = store_markdown_in_notion_research(token, database_id, content, title, doi_options)
+    response = await store_markdown_in_notion_research(database_id, content, title, doi_options)
 
     if response:
         return response
     else:
         return "Failed to upsert"
 
-def search_notion_pages(query: str):
-    token = get_settings().NOTION_TOKEN  # Your Notion integration token
-    notion = Client(auth=token)
+async def search_notion_pages(query: str):
+    notion_client = notion.get_notion_client()
 
     # Construct the search request
-    response = notion.search(query=query)
+    await get_rate_limiter("notion").acquire()
+    response = await notion_client.search(query=query)
 
     # Filter results to get only pages
     pages = [result for result in response.get('results', []) if result['object'] == 'page']
@@ -762,11 +782,10 @@ def search_notion_pages(query: str):
 #     else:
 #         return "Failed to upsert"
 
-def save_outputs_in_notion(content:str, title:str):
-    token = get_settings().NOTION_TOKEN  # Your Notion integration token
+async def save_outputs_in_notion(content:str, title:str):
     database_id = get_settings().NOTION_DATABASE_ID_OUTPUTS
 
-    response = store_markdown_in_notion(token, database_id, content, title)
+    response = await store_markdown_in_notion(database_id, content, title)
 
     if response:
         return response
@@ -816,7 +835,7 @@ async def upsert_to_qdrant(page_id:str):
     
 #     return data
 
-def extract_notion_page_content(page_url: str):
+async def extract_notion_page_content(page_url: str):
     """
     Extract content from a Notion page given its URL.
 
@@ -844,7 +863,8 @@ def extract_notion_page_content(page_url: str):
     }
 
     # Make the API request
-    response = requests.get(url, headers=headers)
+    await get_rate_limiter("notion").acquire()
+    response = await get_http_client("notion").get(url, headers=headers)
 
     if response.status_code != 200:
         return f"Error fetching page content: {response.status_code} - {response.text}"
@@ -0,0 +1,76 @@
+# Verify latency and throughput of the password hash settings.
+#
+#   python -m app.benchmarks.password_hash [--verifications 20] [--concurrency 32]
+#
+# Latency is one verification at a time on this thread, throughput runs
+# `--concurrency` verifications at once through the password thread pool,
+# the way concurrent logins do. Use it to pick password_scheme and its cost
+# settings, see app.core.security.password.
+
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.core.security.password import (
+    BcryptScheme,
+    PasswordScheme,
+    ScryptScheme,
+    averify_password,
+    shutdown_password_executor,
+)
+
+SCHEMES: tuple[PasswordScheme, ...] = (
+    BcryptScheme(rounds=10),
+    BcryptScheme(rounds=11),
+    BcryptScheme(rounds=12),
+    BcryptScheme(rounds=13),
+    ScryptScheme(ln=14, r=8, p=1),
+    ScryptScheme(ln=15, r=8, p=1),
+    ScryptScheme(ln=16, r=8, p=1),
+)
+
+
+def measure_latency(
+    scheme: PasswordScheme, hashed_password: str, verifications: int
+) -> list[float]:
+    latencies = []
+    for _ in range(verifications):
+        start = time.perf_counter()
+        scheme.verify("benchmark password", hashed_password)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def measure_throughput(hashed_password: str, verifications: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            averify_password("benchmark password", hashed_password)
+            for _ in range(verifications)
+        )
+    )
+    return verifications / (time.perf_counter() - start)
+
+
+async def main(verifications: int, concurrency: int) -> None:
+    print(f"{'scheme':>32} {'p50 ms':>8} {'p95 ms':>8} {'verify/s':>9}")
+    for scheme in SCHEMES:
+        hashed_password = scheme.hash("benchmark password")
+        latencies = sorted(measure_latency(scheme, hashed_password, verifications))
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        throughput = await measure_throughput(hashed_password, concurrency)
+        print(
+            f"{scheme!r:>32} {statistics.median(latencies) * 1000:8.1f} "
+            f"{p95 * 1000:8.1f} {throughput:9.1f}"
+        )
+    shutdown_password_executor()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--verifications", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=32)
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.verifications, arguments.concurrency))
@@ -16,6 +16,7 @@
 
 from functools import lru_cache
 from pathlib import Path
+from typing import Literal
 
 from pydantic import AnyHttpUrl, BaseModel, SecretStr, computed_field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -29,7 +30,22 @@ class Security(BaseModel):
     jwt_secret_key: SecretStr
     jwt_access_token_expire_secs: int = 24 * 3600  # 1d
     refresh_token_expire_secs: int = 28 * 24 * 3600  # 28d
+    # expired refresh tokens are deleted, see app.core.security.refresh_token
+    refresh_token_reaper_interval_secs: int = 3600
+    refresh_token_reaper_batch_size: int = 1000
+    # verified access tokens kept by verify_jwt_token, see app.core.security.jwt
+    jwt_verified_cache_size: int = 10_000
+    # new hashes use password_scheme, older ones are re-hashed on login,
+    # see app.core.security.password
+    password_scheme: Literal["bcrypt", "scrypt"] = "bcrypt"
     password_bcrypt_rounds: int = 12
+    password_scrypt_ln: int = 15
+    password_scrypt_r: int = 8
+    password_scrypt_p: int = 1
+    # bcrypt thread pool, defaults to one thread per core, see app.core.security.password
+    password_hash_workers: int | None = None
+    # running and queued hashes, more are rejected with 503
+    password_hash_max_pending: int = 64
     allowed_hosts: list[str] = ["localhost", "127.0.0.1"]
     backend_cors_origins: list[AnyHttpUrl] = []
 
@@ -53,6 +69,17 @@ class Settings(BaseSettings):
     QDRANT_API_KEY: str
     QDRANT_URL: str
     QDRANT_COLLECTION_NAME: str
+    # gRPC is faster for bulk upserts, needs the Qdrant gRPC port (6334) reachable
+    QDRANT_PREFER_GRPC: bool = False
+    # points per request, upload worker processes and point lists queued for
+    # them in backfills, see app.api.qdrant_bulk
+    QDRANT_UPLOAD_BATCH_SIZE: int = 256
+    QDRANT_UPLOAD_PARALLEL: int = 4
+    QDRANT_UPLOAD_MAX_PENDING: int = 8
+    # restored after a backfill when the collection had no threshold of its own
+    QDRANT_INDEXING_THRESHOLD: int = 20_000
+    # how long a rebuilt collection may take to index before the alias switch
+    QDRANT_REBUILD_INDEX_TIMEOUT_SECS: int = 1800
     RESEARCH_LLM_NAME: str
     PERPLEXITY_API_KEY: str
     YT_API_KEY: str
@@ -63,6 +90,56 @@ class Settings(BaseSettings):
     EXA_API_KEY:str
     NOTION_DATABASE_ID_OUTPUTS:str
     MONGODB_URL:str
+    NOTION_FETCH_CONCURRENCY: int = 3
+    NOTION_QUEUE_SIZE: int = 20
+    UPSERT_BATCH_SIZE: int = 100
+    # threads tiktoken encodes the chunks of a page with, see app.api.notion.count_tokens
+    TOKENIZER_THREADS: int = 4
+    # texts per embeddings API request (OpenAI accepts up to 2048) and requests
+    # in flight per process, see app.api.embeddings
+    EMBEDDING_BATCH_SIZE: int = 512
+    EMBEDDING_CONCURRENCY: int = 4
+    # requests per second for each external API, see app.core.rate_limiter
+    RATE_LIMITS: dict[str, float] = {
+        "notion": 2.0,
+        "youtube": 10.0,
+        "rapidapi": 5.0,
+        "serpapi": 5.0,
+        "europepmc": 10.0,
+        "ncbi": 3.0,
+        "semanticscholar": 1.0,
+    }
+    # "serial" or "parallel", see app.api.agents.IDEATION_FLOWS
+    IDEATION_TOPOLOGY: str = "serial"
+    # agent flows running at once per process, see app.api.jobs
+    AGENT_JOB_CONCURRENCY: int = 2
+    AGENT_JOB_EVENTS_POLL_INTERVAL: float = 2.0
+    # job event streams without a new event for this long are closed
+    AGENT_JOB_EVENTS_IDLE_TIMEOUT: float = 900.0
+    # default and max number of documents per page of the Mongo list endpoints
+    MONGO_PAGE_SIZE: int = 100
+    MONGO_MAX_PAGE_SIZE: int = 1000
+    # History documents with more messages are split into buckets, see app.api.history
+    HISTORY_BUCKET_THRESHOLD: int = 400
+    HISTORY_BUCKET_SIZE: int = 200
+    # write the batched history appends and artifact inserts in one transaction,
+    # needs a replica set
+    MONGO_WRITE_TRANSACTIONS: bool = False
+    # Motor client, see app.core.mongo
+    MONGO_DATABASE: str = "DoctorAI"
+    MONGO_MAX_POOL_SIZE: int = 50
+    MONGO_MIN_POOL_SIZE: int = 5
+    MONGO_MAX_IDLE_TIME_MS: int = 300_000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5_000
+    MONGO_CONNECT_TIMEOUT_MS: int = 5_000
+    # in order of preference, the ones without their module installed are skipped
+    MONGO_COMPRESSORS: list[str] = ["zstd", "snappy", "zlib"]
+    # authenticated users cached by get_current_user, see app.core.user_cache
+    USER_CACHE_MAX_SIZE: int = 10_000
+    USER_CACHE_TTL_SECONDS: float = 30.0
+    # optional shared tier, e.g. redis://localhost:6379/0, needs the redis package
+    USER_CACHE_REDIS_URL: str | None = None
+    USER_CACHE_SHARED_TTL_SECONDS: int = 300
 
     @computed_field  # type: ignore[misc]
     @property
@@ -34,3 +34,8 @@ _ASYNC_SESSIONMAKER = async_sessionmaker(_ASYNC_ENGINE, expire_on_commit=False)
 
 def get_async_session() -> AsyncSession:  # pragma: no cover
     return _ASYNC_SESSIONMAKER()
+
+
+def get_async_engine() -> AsyncEngine:
+    """The application's engine, for libraries that manage their own sessions."""
+    return _ASYNC_ENGINE
@@ -0,0 +1,72 @@
+# Application scoped HTTP clients for the external integrations.
+#
+# Every integration gets one long-lived httpx.AsyncClient. httpx keeps a
+# keep-alive connection pool per host inside each client, so agent tool loops
+# that call the same few hosts reuse TCP+TLS connections instead of doing a
+# handshake per call. HTTP/2 is negotiated (ALPN) where the service supports it.
+#
+# Clients are opened and closed with the FastAPI lifespan, see `app.main`.
+#
+# https://www.python-httpx.org/advanced/resource-limits/
+
+
+from dataclasses import dataclass, field
+
+import httpx
+
+
+@dataclass(frozen=True)
+class HttpClientConfig:
+    timeout: httpx.Timeout
+    http2: bool = True
+    limits: httpx.Limits = field(
+        default_factory=lambda: httpx.Limits(
+            max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0
+        )
+    )
+
+
+HTTP_CLIENT_CONFIGS: dict[str, HttpClientConfig] = {
+    # LLM backed search, answers take long to generate
+    "perplexity": HttpClientConfig(timeout=httpx.Timeout(120.0, connect=5.0)),
+    "youtube": HttpClientConfig(timeout=httpx.Timeout(15.0, connect=5.0)),
+    # transcriptions of long videos are slow
+    "rapidapi": HttpClientConfig(timeout=httpx.Timeout(60.0, connect=5.0)),
+    "serpapi": HttpClientConfig(timeout=httpx.Timeout(30.0, connect=5.0)),
+    "europepmc": HttpClientConfig(
+        timeout=httpx.Timeout(30.0, connect=5.0), http2=False
+    ),
+    "ncbi": HttpClientConfig(timeout=httpx.Timeout(30.0, connect=5.0), http2=False),
+    "semanticscholar": HttpClientConfig(timeout=httpx.Timeout(30.0, connect=5.0)),
+    # Flowise runs a retrieval + LLM chain per prediction
+    "flowise": HttpClientConfig(timeout=httpx.Timeout(120.0, connect=5.0)),
+    "notion": HttpClientConfig(timeout=httpx.Timeout(60.0, connect=5.0)),
+}
+
+_CLIENTS: dict[str, httpx.AsyncClient] = {}
+
+
+def new_http_client(config: HttpClientConfig) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=config.http2,
+        timeout=config.timeout,
+        limits=config.limits,
+    )
+
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    client = _CLIENTS.get(name)
+    if client is None or client.is_closed:
+        client = _CLIENTS[name] = new_http_client(HTTP_CLIENT_CONFIGS[name])
+    return client
+
+
+def open_http_clients() -> None:
+    for name in HTTP_CLIENT_CONFIGS:
+        get_http_client(name)
+
+
+async def close_http_clients() -> None:
+    while _CLIENTS:
+        _, client = _CLIENTS.popitem()
+        await client.aclose()
@@ -0,0 +1,86 @@
+# Motor client for the MongoDB database, shared by every module using Mongo.
+#
+# One client per process, it holds the connection pool. Motor connects lazily,
+# `open_mongo_client` runs in the FastAPI lifespan (see `app.main`) and connects
+# at startup, so the first request of a cold worker does not pay for server
+# discovery and the handshakes. MONGO_MIN_POOL_SIZE connections are kept open
+# for bursts, MONGO_MAX_POOL_SIZE bounds them, requests over it wait for a free
+# connection instead of opening more.
+#
+# Read-only endpoints use `get_read_database`, which reads from a secondary when
+# the deployment has one. Secondaries may lag behind, reads that must see the
+# request's own writes use `get_database`.
+#
+# https://pymongo.readthedocs.io/en/stable/faq.html#how-does-connection-pooling-work-in-pymongo
+# https://www.mongodb.com/docs/manual/reference/connection-string/#compression-options
+
+
+import importlib.util
+import logging
+from functools import lru_cache
+from typing import Any
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ReadPreference
+
+from app.core.config import get_settings
+
+logger = logging.getLogger("uvicorn")
+
+# module pymongo needs for each wire compressor
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+MongoClient = AsyncIOMotorClient[dict[str, Any]]
+MongoDatabase = AsyncIOMotorDatabase[dict[str, Any]]
+
+
+def available_compressors(compressors: list[str]) -> list[str]:
+    """Compressors whose module is installed, the server picks the first it supports."""
+    return [
+        compressor
+        for compressor in compressors
+        if importlib.util.find_spec(COMPRESSOR_MODULES[compressor]) is not None
+    ]
+
+
+def new_mongo_client(url: str) -> MongoClient:
+    settings = get_settings()
+    return MongoClient(
+        url,
+        maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=settings.MONGO_CONNECT_TIMEOUT_MS,
+        # none installed leaves the connections uncompressed
+        compressors=available_compressors(settings.MONGO_COMPRESSORS),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_mongo_client() -> MongoClient:
+    return new_mongo_client(get_settings().MONGODB_URL)
+
+
+def get_database() -> MongoDatabase:
+    return get_mongo_client()[get_settings().MONGO_DATABASE]
+
+
+def get_read_database() -> MongoDatabase:
+    return get_mongo_client().get_database(
+        get_settings().MONGO_DATABASE,
+        read_preference=ReadPreference.SECONDARY_PREFERRED,
+    )
+
+
+async def open_mongo_client() -> None:
+    try:
+        await get_mongo_client().admin.command("ping")
+    except Exception as error:
+        logger.error(f"Error connecting to MongoDB: {error}")
+
+
+def close_mongo_client() -> None:
+    # the client reconnects if it is used again after this
+    if get_mongo_client.cache_info().currsize:
+        get_mongo_client().close()
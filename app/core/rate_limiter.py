@@ -0,0 +1,138 @@
+# Token bucket rate limiters shared by every outgoing API integration.
+#
+# Each external API gets one named bucket per process, so concurrent jobs
+# draw from the same quota. Acquiring reserves a token up front (the bucket may
+# go into debt) and then sleeps exactly until the reservation is due, which
+# keeps waiters in FIFO order without polling. A 429 with `Retry-After`
+# pauses the whole bucket via `penalize`.
+#
+# Budgets are configured with the RATE_LIMITS setting, see `app.core.config`.
+
+
+import asyncio
+import threading
+import time
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+from app.core.config import get_settings
+
+WAIT_HISTOGRAM_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class TokenBucket:
+    def __init__(
+        self, name: str, rate_per_second: float, capacity: float | None = None
+    ) -> None:
+        self.name = name
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_second)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._acquired = 0
+        self._wait_seconds_total = 0.0
+        self._wait_histogram = [0] * (len(WAIT_HISTOGRAM_BUCKETS) + 1)
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate_per_second)
+        self._updated = now
+
+    def _reserve(self, tokens: float) -> float:
+        """Take tokens, possibly into debt, and return the monotonic time they are due."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= tokens
+            due = now
+            if self._tokens < 0:
+                due += -self._tokens / self.rate_per_second
+            return max(due, self._blocked_until)
+
+    def _refund(self, tokens: float) -> None:
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def _record_wait(self, waited: float) -> None:
+        with self._lock:
+            self._acquired += 1
+            self._wait_seconds_total += waited
+            for i, bound in enumerate(WAIT_HISTOGRAM_BUCKETS):
+                if waited <= bound:
+                    self._wait_histogram[i] += 1
+                    break
+            else:
+                self._wait_histogram[-1] += 1
+
+    async def acquire(self, tokens: float = 1) -> None:
+        start = time.monotonic()
+        due = self._reserve(tokens)
+        try:
+            # re-check after waking up, the bucket may have been penalized meanwhile
+            while (delay := max(due, self._blocked_until) - time.monotonic()) > 0:
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self._refund(tokens)
+            raise
+        self._record_wait(time.monotonic() - start)
+
+    def penalize(self, retry_after: float) -> None:
+        """Pause the bucket after the API answered with 429 / Retry-After."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            histogram = {
+                f"le_{bound}": count
+                for bound, count in zip(WAIT_HISTOGRAM_BUCKETS, self._wait_histogram)
+            }
+            histogram["le_inf"] = self._wait_histogram[-1]
+            return {
+                "name": self.name,
+                "rate_per_second": self.rate_per_second,
+                "capacity": self.capacity,
+                "tokens": self._tokens,
+                "blocked_for": max(0.0, self._blocked_until - now),
+                "acquired": self._acquired,
+                "wait_seconds_total": self._wait_seconds_total,
+                "wait_histogram": histogram,
+            }
+
+
+_LIMITERS: dict[str, TokenBucket] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(name: str) -> TokenBucket:
+    with _LIMITERS_LOCK:
+        if name not in _LIMITERS:
+            _LIMITERS[name] = TokenBucket(name, get_settings().RATE_LIMITS[name])
+        return _LIMITERS[name]
+
+
+def rate_limiter_stats() -> list[dict[str, Any]]:
+    return [get_rate_limiter(name).stats() for name in get_settings().RATE_LIMITS]
+
+
+def parse_retry_after(value: str | None, default: float) -> float:
+    """Seconds to wait from a `Retry-After` header (delta-seconds or HTTP-date)."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    return max(0.0, (retry_at - datetime.now(UTC)).total_seconds())
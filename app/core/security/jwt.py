@@ -1,8 +1,11 @@
+import hashlib
 import time
+from collections import OrderedDict
+from functools import lru_cache
 
 import jwt
 from fastapi import HTTPException, status
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, SecretStr
 
 from app.core.config import get_settings
 
@@ -12,6 +15,9 @@ JWT_ALGORITHM = "HS256"
 # Payload follows RFC 7519
 # https://www.rfc-editor.org/rfc/rfc7519#section-4.1
 class JWTTokenPayload(BaseModel):
+    # verified payloads are cached and shared between requests
+    model_config = ConfigDict(frozen=True)
+
     iss: str
     sub: str
     exp: int
@@ -43,7 +49,66 @@ def create_jwt_token(user_id: str) -> JWTToken:
     return JWTToken(payload=token_payload, access_token=access_token)
 
 
+class VerifiedTokenCache:
+    """Payloads of tokens that passed verification, keyed by the token's sha256.
+
+    Bound to the key material it was verified with, `verify_jwt_token` starts
+    a new cache when the secret key or issuer setting changes.
+    """
+
+    def __init__(self, secret_key: SecretStr, issuer: str, max_size: int) -> None:
+        self.secret_key = secret_key
+        self.issuer = issuer
+        self.key = secret_key.get_secret_value().encode()
+        self.max_size = max_size
+        self._payloads: OrderedDict[bytes, JWTTokenPayload] = OrderedDict()
+
+    def get(self, digest: bytes) -> JWTTokenPayload | None:
+        payload = self._payloads.get(digest)
+        if payload is None:
+            return None
+        # same checks as jwt.decode, anything else goes through a full decode
+        now = time.time()
+        if not payload.iat <= now < payload.exp:
+            del self._payloads[digest]
+            return None
+        self._payloads.move_to_end(digest)
+        return payload
+
+    def set(self, digest: bytes, payload: JWTTokenPayload) -> None:
+        self._payloads[digest] = payload
+        while len(self._payloads) > self.max_size:
+            self._payloads.popitem(last=False)
+
+
+def get_verified_token_cache() -> VerifiedTokenCache:
+    security = get_settings().security
+    return _verified_token_cache(
+        security.jwt_secret_key,
+        security.jwt_issuer,
+        security.jwt_verified_cache_size,
+    )
+
+
+# a new cache, empty, when any of the settings it depends on changes
+@lru_cache(maxsize=1)
+def _verified_token_cache(
+    secret_key: SecretStr, issuer: str, max_size: int
+) -> VerifiedTokenCache:
+    return VerifiedTokenCache(secret_key, issuer, max_size)
+
+
 def verify_jwt_token(token: str) -> JWTTokenPayload:
+    cache = get_verified_token_cache()
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = cache.get(digest)
+    if payload is None:
+        payload = decode_jwt_token(token, cache.key, cache.issuer)
+        cache.set(digest, payload)
+    return payload
+
+
+def decode_jwt_token(token: str, key: bytes, issuer: str) -> JWTTokenPayload:
     # Pay attention to verify_signature passed explicite, even if it is the default.
     # Verification is based on expected payload fields like "exp", "iat" etc.
     # so if you rename for example "exp" to "my_custom_exp", this is gonna break,
@@ -55,10 +120,10 @@ def verify_jwt_token(token: str) -> JWTTokenPayload:
     try:
         raw_payload = jwt.decode(
             token,
-            get_settings().security.jwt_secret_key.get_secret_value(),
+            key,
             algorithms=[JWT_ALGORITHM],
             options={"verify_signature": True},
-            issuer=get_settings().security.jwt_issuer,
+            issuer=issuer,
         )
     except jwt.InvalidTokenError as e:
         raise HTTPException(
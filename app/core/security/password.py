@@ -1,19 +1,241 @@
+# Password hashing with more than one scheme.
+#
+# A stored hash names its scheme and cost parameters, `verify_password` checks
+# it with those. New hashes use the scheme configured in the security settings
+# (password_scheme, password_bcrypt_rounds, password_scrypt_*), and
+# `verify_and_update_password` re-hashes a password on successful login when
+# its stored hash was made with other settings. Changing the settings moves
+# users over one login at a time, `python -m app.benchmarks.password_hash`
+# measures what the settings cost.
+#
+# A bcrypt hash takes ~250ms of CPU with the default 12 rounds. The async
+# variants run hashing on a dedicated thread pool, bcrypt and hashlib.scrypt
+# release the GIL, so the event loop keeps serving other requests and the pool
+# runs one hash per core in parallel. Calls over the pending limit are
+# rejected with 503 instead of queueing up behind each other.
+
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import cache, lru_cache
+from typing import Any, TypeVar
+
 import bcrypt
+from fastapi import HTTPException, status
 
 from app.core.config import get_settings
 
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class BcryptScheme:
+    rounds: int
+
+    PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+    @classmethod
+    def from_hash(cls, hashed_password: str) -> "BcryptScheme":
+        # $2b$12$<22 chars salt><31 chars hash>
+        return cls(rounds=int(hashed_password.split("$")[2]))
+
+    def hash(self, password: str) -> str:
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(self.rounds)).decode()
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+@dataclass(frozen=True)
+class ScryptScheme:
+    # n = 2**ln, memory used is about 128 * r * n bytes
+    ln: int
+    r: int
+    p: int
+
+    PREFIXES = ("$scrypt$",)
+
+    @classmethod
+    def from_hash(cls, hashed_password: str) -> "ScryptScheme":
+        # $scrypt$ln=15,r=8,p=1$<salt>$<hash>
+        parameters = dict(
+            parameter.split("=")
+            for parameter in hashed_password.split("$")[2].split(",")
+        )
+        return cls(
+            ln=int(parameters["ln"]), r=int(parameters["r"]), p=int(parameters["p"])
+        )
+
+    def hash(self, password: str) -> str:
+        salt = secrets.token_bytes(16)
+        return (
+            f"$scrypt$ln={self.ln},r={self.r},p={self.p}"
+            f"${_b64encode(salt)}${_b64encode(self._derive(password, salt))}"
+        )
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        _, _, _, salt, derived = hashed_password.split("$")
+        return hmac.compare_digest(
+            self._derive(password, _b64decode(salt)), _b64decode(derived)
+        )
+
+    def _derive(self, password: str, salt: bytes) -> bytes:
+        return hashlib.scrypt(
+            password.encode(),
+            salt=salt,
+            n=2**self.ln,
+            r=self.r,
+            p=self.p,
+            maxmem=256 * self.r * 2**self.ln,
+            dklen=32,
+        )
+
+
+PasswordScheme = BcryptScheme | ScryptScheme
+
+PASSWORD_SCHEMES: tuple[type[PasswordScheme], ...] = (BcryptScheme, ScryptScheme)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def current_password_scheme() -> PasswordScheme:
+    security = get_settings().security
+    if security.password_scheme == "scrypt":
+        return ScryptScheme(
+            ln=security.password_scrypt_ln,
+            r=security.password_scrypt_r,
+            p=security.password_scrypt_p,
+        )
+    return BcryptScheme(rounds=security.password_bcrypt_rounds)
+
+
+def identify_password_scheme(hashed_password: str) -> PasswordScheme:
+    """Scheme and cost parameters a stored hash was made with."""
+    for scheme in PASSWORD_SCHEMES:
+        if hashed_password.startswith(scheme.PREFIXES):
+            return scheme.from_hash(hashed_password)
+    raise ValueError("Unknown password hash format")
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(
-        plain_password.encode("utf-8"), hashed_password.encode("utf-8")
+    return identify_password_scheme(hashed_password).verify(
+        plain_password, hashed_password
     )
 
 
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(
-        password.encode(),
-        bcrypt.gensalt(get_settings().security.password_bcrypt_rounds),
-    ).decode()
+    return current_password_scheme().hash(password)
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    return identify_password_scheme(hashed_password) != current_password_scheme()
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """Verify the password, with a new hash when the stored one uses other settings."""
+    if not verify_password(plain_password, hashed_password):
+        return False, None
+    if password_needs_rehash(hashed_password):
+        return True, get_password_hash(plain_password)
+    return True, None
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    return await run_in_password_executor(
+        verify_password, plain_password, hashed_password
+    )
+
+
+async def aget_password_hash(password: str) -> str:
+    return await run_in_password_executor(get_password_hash, password)
+
+
+async def averify_dummy_password(plain_password: str) -> bool:
+    """Check against the dummy hash, hashed on the pool the first time."""
+    return await run_in_password_executor(verify_dummy_password, plain_password)
+
+
+async def averify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    return await run_in_password_executor(
+        verify_and_update_password, plain_password, hashed_password
+    )
+
+
+def get_dummy_password_hash() -> str:
+    """Hash checked when the user does not exist, so the response takes as long."""
+    return _dummy_password_hash(current_password_scheme())
+
+
+def verify_dummy_password(plain_password: str) -> bool:
+    return verify_password(plain_password, get_dummy_password_hash())
+
+
+@cache
+def _dummy_password_hash(scheme: PasswordScheme) -> str:
+    return scheme.hash("")
+
+
+def __getattr__(name: str) -> Any:
+    # DUMMY_PASSWORD used to be hashed at import time
+    if name == "DUMMY_PASSWORD":
+        return get_dummy_password_hash()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@lru_cache(maxsize=1)
+def get_password_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=get_settings().security.password_hash_workers
+        or os.cpu_count()
+        or 1,
+        thread_name_prefix="password-hash",
+    )
+
+
+@dataclass
+class PendingCount:
+    """Password checks submitted to the pool and not finished yet."""
+
+    value: int = 0
+
+
+_PENDING = PendingCount()
+
+
+async def run_in_password_executor(function: Callable[..., T], *args: Any) -> T:
+    if _PENDING.value >= get_settings().security.password_hash_max_pending:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password checks in progress, retry later",
+            headers={"Retry-After": "1"},
+        )
+    _PENDING.value += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            get_password_executor(), function, *args
+        )
+    finally:
+        _PENDING.value -= 1
 
 
-DUMMY_PASSWORD = get_password_hash("")
+def shutdown_password_executor() -> None:
+    if get_password_executor.cache_info().currsize:
+        get_password_executor().shutdown(wait=False, cancel_futures=True)
+        get_password_executor.cache_clear()
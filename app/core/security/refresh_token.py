@@ -0,0 +1,73 @@
+# Refresh tokens are stored as the sha256 of the token. The token is 32 random
+# bytes, a salt or slow hash adds nothing, and a fixed 32 byte key keeps the
+# unique index small. A leaked table does not leak usable tokens.
+#
+# Expired rows are never needed again, the reaper deletes them in small
+# batches so the table and its indexes only hold live tokens. Every worker
+# runs it, SKIP LOCKED keeps them from waiting on each other's batches.
+
+
+import asyncio
+import hashlib
+import logging
+import secrets
+import time
+
+from sqlalchemy import delete, select
+
+from app.core import database_session
+from app.core.config import get_settings
+from app.models import RefreshToken
+
+logger = logging.getLogger("uvicorn")
+
+
+def hash_refresh_token(refresh_token: str) -> bytes:
+    return hashlib.sha256(refresh_token.encode()).digest()
+
+
+def new_refresh_token(user_id: str) -> tuple[str, RefreshToken]:
+    """Token to send to the client and the row to store for it."""
+    refresh_token = secrets.token_urlsafe(32)
+    return refresh_token, RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(refresh_token),
+        exp=int(time.time() + get_settings().security.refresh_token_expire_secs),
+    )
+
+
+async def delete_expired_refresh_tokens(batch_size: int) -> int:
+    deleted = 0
+    while True:
+        expired = (
+            select(RefreshToken.id)
+            .where(RefreshToken.exp < int(time.time()))
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        async with database_session.get_async_session() as session:
+            result = await session.execute(
+                delete(RefreshToken).where(
+                    RefreshToken.id.in_(expired.scalar_subquery())
+                )
+            )
+            await session.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+        # short transactions, let other queries in between batches
+        await asyncio.sleep(0)
+
+
+async def run_refresh_token_reaper() -> None:
+    security = get_settings().security
+    while True:
+        try:
+            deleted = await delete_expired_refresh_tokens(
+                security.refresh_token_reaper_batch_size
+            )
+            if deleted:
+                logger.info(f"Deleted {deleted} expired refresh tokens")
+        except Exception as error:
+            logger.error(f"Error deleting expired refresh tokens: {error}")
+        await asyncio.sleep(security.refresh_token_reaper_interval_secs)
@@ -0,0 +1,246 @@
+# Cache of the authenticated users, so `get_current_user` does not query
+# Postgres on every request.
+#
+# A per-process TTL+LRU dict sits in front of an optional shared tier, Redis or
+# anything answering its get/set/delete commands (USER_CACHE_REDIS_URL). A local
+# hit needs no I/O, a shared hit one round trip, only when both miss a database
+# session is opened. Entries are the CACHED_COLUMNS of the user as a plain dict
+# and every hit builds a new detached `User`, requests never share an ORM
+# instance. The password hash is not one of them, it never leaves Postgres.
+#
+# Password reset and user delete call `invalidate`, which drops the user from
+# the shared tier and the local tier of this process. Other processes keep
+# their local entry for at most USER_CACHE_TTL_SECONDS, which bounds how long
+# they may still accept a removed user.
+
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from functools import lru_cache
+from typing import Any, Protocol
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.core.config import get_settings
+from app.models import User
+
+logger = logging.getLogger("uvicorn")
+
+# what the authenticated endpoints read from the current user
+CACHED_COLUMNS = ("user_id", "email")
+
+UserLoader = Callable[[str], Awaitable[User | None]]
+
+
+class SharedCache(Protocol):
+    async def get(self, key: str) -> str | bytes | None: ...
+
+    async def set(self, key: str, value: str, ex: int) -> Any: ...
+
+    async def delete(self, key: str) -> Any: ...
+
+
+class InMemorySharedCache:
+    """Local stand-in for Redis, for tests and single process setups."""
+
+    def __init__(self) -> None:
+        self._values: dict[str, tuple[str, float]] = {}
+
+    async def get(self, key: str) -> str | None:
+        value, expires_at = self._values.get(key, (None, 0.0))
+        return value if expires_at > time.monotonic() else None
+
+    async def set(self, key: str, value: str, ex: int) -> None:
+        self._values[key] = (value, time.monotonic() + ex)
+
+    async def delete(self, key: str) -> None:
+        self._values.pop(key, None)
+
+
+def user_to_row(user: User) -> dict[str, Any]:
+    return {column: getattr(user, column) for column in CACHED_COLUMNS}
+
+
+def row_to_user(row: dict[str, Any]) -> User:
+    # only the cached columns are loaded, an update writes the ones set on it
+    user = User(**row)
+    # persistent identity without a session, like a user loaded and expunged
+    make_transient_to_detached(user)
+    return user
+
+
+def encode_row(row: dict[str, Any]) -> str:
+    return json.dumps(row)
+
+
+def decode_row(value: str | bytes) -> dict[str, Any]:
+    row: dict[str, Any] = json.loads(value)
+    return row
+
+
+class UserCache:
+    def __init__(
+        self,
+        max_size: int,
+        ttl_seconds: float,
+        shared: SharedCache | None = None,
+        shared_ttl_seconds: int = 300,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self.shared_ttl_seconds = shared_ttl_seconds
+        self._entries: OrderedDict[str, tuple[dict[str, Any], float]] = OrderedDict()
+        # bumped by `invalidate`, loads that started before are not cached
+        self._generation = 0
+        self._local_hits = 0
+        self._shared_hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._load_seconds_total = 0.0
+        self._shared_seconds_total = 0.0
+
+    async def get_user(self, user_id: str, load: UserLoader) -> User | None:
+        row = self._get_local(user_id)
+        if row is not None:
+            self._local_hits += 1
+            return row_to_user(row)
+
+        generation = self._generation
+        if self.shared is not None:
+            row = await self._get_shared(user_id)
+            if row is not None:
+                self._shared_hits += 1
+                if generation == self._generation:
+                    self._set_local(user_id, row)
+                return row_to_user(row)
+
+        start = time.perf_counter()
+        user = await load(user_id)
+        self._misses += 1
+        self._load_seconds_total += time.perf_counter() - start
+        if user is not None and generation == self._generation:
+            row = user_to_row(user)
+            self._set_local(user_id, row)
+            await self._set_shared(user_id, row)
+        return user
+
+    async def invalidate(self, user_id: str) -> None:
+        self._generation += 1
+        self._invalidations += 1
+        self._entries.pop(user_id, None)
+        if self.shared is not None:
+            try:
+                await self.shared.delete(self._shared_key(user_id))
+            except Exception as error:
+                logger.error(
+                    f"Error invalidating user {user_id} in the shared cache: {error}"
+                )
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self._local_hits + self._shared_hits + self._misses
+        mean_load_seconds = (
+            self._load_seconds_total / self._misses if self._misses else 0.0
+        )
+        mean_shared_seconds = (
+            self._shared_seconds_total / (self._shared_hits + self._misses)
+            if self.shared is not None and self._shared_hits + self._misses
+            else 0.0
+        )
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "shared": self.shared is not None,
+            "local_hits": self._local_hits,
+            "shared_hits": self._shared_hits,
+            "misses": self._misses,
+            "invalidations": self._invalidations,
+            "hit_rate": (self._local_hits + self._shared_hits) / lookups
+            if lookups
+            else 0.0,
+            "mean_load_seconds": mean_load_seconds,
+            # estimated from the mean database load time of the misses
+            "latency_saved_seconds": self._local_hits * mean_load_seconds
+            + self._shared_hits * max(0.0, mean_load_seconds - mean_shared_seconds),
+        }
+
+    def _get_local(self, user_id: str) -> dict[str, Any] | None:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        row, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return row
+
+    def _set_local(self, user_id: str, row: dict[str, Any]) -> None:
+        self._entries[user_id] = (row, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def _get_shared(self, user_id: str) -> dict[str, Any] | None:
+        assert self.shared is not None
+        start = time.perf_counter()
+        try:
+            value = await self.shared.get(self._shared_key(user_id))
+        except Exception as error:
+            # the shared tier is an optimization, fall back to the database
+            logger.error(f"Error reading user {user_id} from the shared cache: {error}")
+            return None
+        finally:
+            self._shared_seconds_total += time.perf_counter() - start
+        return decode_row(value) if value is not None else None
+
+    async def _set_shared(self, user_id: str, row: dict[str, Any]) -> None:
+        if self.shared is None:
+            return
+        try:
+            await self.shared.set(
+                self._shared_key(user_id), encode_row(row), ex=self.shared_ttl_seconds
+            )
+        except Exception as error:
+            logger.error(f"Error writing user {user_id} to the shared cache: {error}")
+
+    @staticmethod
+    def _shared_key(user_id: str) -> str:
+        return f"user:{user_id}"
+
+
+def new_shared_cache(url: str) -> SharedCache:
+    # optional dependency, only needed with USER_CACHE_REDIS_URL
+    import redis.asyncio
+
+    shared: SharedCache = redis.asyncio.Redis.from_url(url)
+    return shared
+
+
+@lru_cache(maxsize=1)
+def get_user_cache() -> UserCache:
+    settings = get_settings()
+    shared = None
+    if settings.USER_CACHE_REDIS_URL:
+        shared = new_shared_cache(settings.USER_CACHE_REDIS_URL)
+    return UserCache(
+        max_size=settings.USER_CACHE_MAX_SIZE,
+        ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+        shared=shared,
+        shared_ttl_seconds=settings.USER_CACHE_SHARED_TTL_SECONDS,
+    )
+
+
+async def close_user_cache() -> None:
+    if not get_user_cache.cache_info().currsize:
+        return
+    shared = get_user_cache().shared
+    get_user_cache.cache_clear()
+    # the Redis client holds a connection pool, InMemorySharedCache nothing
+    aclose = getattr(shared, "aclose", None)
+    if aclose is not None:
+        await aclose()
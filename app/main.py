@@ -1,9 +1,39 @@
+import asyncio
+import contextlib
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
+from app.api import notion
 from app.api.api_router import api_router
+from app.api.endpoints import users
+from app.core import http_client, mongo, user_cache
 from app.core.config import get_settings
+from app.core.security import password, refresh_token
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    http_client.open_http_clients()
+    await mongo.open_mongo_client()
+    await users.create_indexes()
+    await users.backfill_created_at()
+    await notion.open_index_targets()
+    refresh_token_reaper = asyncio.create_task(refresh_token.run_refresh_token_reaper())
+    yield
+    refresh_token_reaper.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await refresh_token_reaper
+    await users.job_manager.shutdown()
+    await http_client.close_http_clients()
+    await notion.close_index_targets()
+    mongo.close_mongo_client()
+    await user_cache.close_user_cache()
+    password.shutdown_password_executor()
+
 
 app = FastAPI(
     title="Doctor AI",
@@ -11,6 +41,7 @@ app = FastAPI(
     description="https://github.com/rafsaf/minimal-fastapi-postgres-template",
     openapi_url="/openapi.json",
     docs_url="/",
+    lifespan=lifespan,
 )
 
 
@@ -16,7 +16,18 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, String, Uuid, func
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    DateTime,
+    ForeignKey,
+    Index,
+    LargeBinary,
+    String,
+    Uuid,
+    func,
+    text,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -44,25 +55,50 @@ class User(Base):
 
 class RefreshToken(Base):
     __tablename__ = "refresh_token"
+    __table_args__ = (
+        # live tokens of a user, revoked on password reset
+        Index(
+            "ix_refresh_token_user_id_unused",
+            "user_id",
+            postgresql_where=text("NOT used"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
-    refresh_token: Mapped[str] = mapped_column(
-        String(512), nullable=False, unique=True, index=True
+    # sha256 of the token, see app.core.security.refresh_token
+    token_hash: Mapped[bytes] = mapped_column(
+        LargeBinary(32), nullable=False, unique=True, index=True
     )
     used: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
-    exp: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    # expired rows are deleted by the reaper
+    exp: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
     user_id: Mapped[str] = mapped_column(
         ForeignKey("user_account.user_id", ondelete="CASCADE"),
     )
     user: Mapped["User"] = relationship(back_populates="refresh_tokens")
 
+
+class NotionPageFingerprint(Base):
+    __tablename__ = "notion_page_fingerprint"
+
+    page_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    database_id: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    last_edited_time: Mapped[str] = mapped_column(String(32), nullable=False)
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)
+
+
+class EmbeddingCacheEntry(Base):
+    __tablename__ = "embedding_cache"
+
+    # sha256 of the embedding model and the text, see app.api.embeddings
+    key: Mapped[bytes] = mapped_column(LargeBinary(32), primary_key=True)
+    # float32 array
+    vector: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
 class AgentResponses(Base):
     __tablename__ = "agent_response"
 
     id: Mapped[str] = mapped_column(
         Uuid(as_uuid=False), primary_key=True, default=lambda _: str(uuid.uuid4())
     )
-
-    
-
-
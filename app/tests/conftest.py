@@ -11,7 +11,7 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
 )
 
-from app.core import database_session
+from app.core import database_session, user_cache
 from app.core.config import get_settings
 from app.core.security.jwt import create_jwt_token
 from app.core.security.password import get_password_hash
@@ -77,6 +77,14 @@ async def fixture_clean_get_settings_between_tests() -> AsyncGenerator[None, Non
     get_settings.cache_clear()
 
 
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def fixture_clean_user_cache_between_tests() -> AsyncGenerator[None, None]:
+    yield
+
+    # tests delete users behind the cache's back
+    await user_cache.close_user_cache()
+
+
 @pytest_asyncio.fixture(name="default_hashed_password", scope="session")
 async def fixture_default_hashed_password() -> str:
     return get_password_hash(default_user_password)
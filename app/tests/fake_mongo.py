@@ -0,0 +1,278 @@
+from collections.abc import Callable
+from copy import deepcopy
+from types import SimpleNamespace
+from typing import Any
+
+Document = dict[str, Any]
+
+
+def _get(value: Any, path: list[str]) -> Any:
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _slice(array: list[Any], *args: int) -> list[Any]:
+    if len(args) == 1:
+        (n,) = args
+        return array[:n] if n >= 0 else array[max(0, len(array) + n) :]
+    position, n = args
+    start = position if position >= 0 else max(0, len(array) + position)
+    return array[start : start + n]
+
+
+def _map(args: Document, document: Document, variables: Document) -> list[Any]:
+    return [
+        evaluate(args["in"], document, {**variables, args.get("as", "this"): item})
+        for item in evaluate(args["input"], document, variables)
+    ]
+
+
+def _filter(args: Document, document: Document, variables: Document) -> list[Any]:
+    return [
+        item
+        for item in evaluate(args["input"], document, variables)
+        if evaluate(args["cond"], document, {**variables, args.get("as", "this"): item})
+    ]
+
+
+def _cond(args: Any, document: Document, variables: Document) -> Any:
+    if isinstance(args, dict):
+        args = [args["if"], args["then"], args["else"]]
+    condition, then, otherwise = args
+    if evaluate(condition, document, variables):
+        return evaluate(then, document, variables)
+    return evaluate(otherwise, document, variables)
+
+
+def _size(array: Any) -> int:
+    if not isinstance(array, list):
+        raise TypeError("The argument to $size must be an array")
+    return len(array)
+
+
+# operators taking their evaluated arguments
+_OPERATORS: dict[str, Callable[..., Any]] = {
+    "$ifNull": lambda value, default: default if value is None else value,
+    "$size": _size,
+    "$slice": _slice,
+    "$max": lambda *values: max(v for v in values if v is not None),
+    "$subtract": lambda a, b: a - b,
+    "$eq": lambda a, b: a == b,
+    "$in": lambda value, array: value in array,
+}
+# operators evaluating their arguments themselves
+_SCOPED_OPERATORS: dict[str, Callable[[Any, Document, Document], Any]] = {
+    "$map": _map,
+    "$filter": _filter,
+    "$cond": _cond,
+}
+
+
+def _evaluate_operator(
+    operator: str, args: Any, document: Document, variables: Document
+) -> Any:
+    if operator in _SCOPED_OPERATORS:
+        return _SCOPED_OPERATORS[operator](args, document, variables)
+    values = evaluate(args, document, variables)
+    return _OPERATORS[operator](*(values if isinstance(args, list) else [values]))
+
+
+def evaluate(
+    expression: Any, document: Document, variables: Document | None = None
+) -> Any:
+    """Value of an aggregation expression, for the operators the app uses."""
+    variables = variables or {}
+    if isinstance(expression, str) and expression.startswith("$$"):
+        name, *path = expression[2:].split(".")
+        return _get(variables[name], path)
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _get(document, expression[1:].split("."))
+    if isinstance(expression, list):
+        return [evaluate(item, document, variables) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    if len(expression) == 1 and next(iter(expression)).startswith("$"):
+        ((operator, args),) = expression.items()
+        return _evaluate_operator(operator, args, document, variables)
+    return {
+        key: evaluate(value, document, variables) for key, value in expression.items()
+    }
+
+
+def _satisfies(value: Any, condition: Any) -> bool:
+    if not isinstance(condition, dict):
+        return bool(value == condition)
+    checks: dict[str, Callable[[Any], bool]] = {
+        "$nin": lambda operand: value not in operand,
+        "$in": lambda operand: value in operand,
+        "$gt": lambda operand: value is not None and value > operand,
+        "$lt": lambda operand: value is not None and value < operand,
+        "$size": lambda operand: isinstance(value, list) and len(value) == operand,
+    }
+    return all(checks[operator](operand) for operator, operand in condition.items())
+
+
+def matches(document: Document, query: Document) -> bool:
+    return all(
+        any(matches(document, alternative) for alternative in condition)
+        if key == "$or"
+        else _satisfies(_get(document, key.split(".")), condition)
+        for key, condition in query.items()
+    )
+
+
+def project(document: Document, projection: Document | None) -> Document:
+    if not projection:
+        return document
+    projected = {} if projection.get("_id", 1) == 0 else {"_id": document.get("_id")}
+    for key, spec in projection.items():
+        if key == "_id":
+            continue
+        if spec in (1, True):
+            if key in document:
+                projected[key] = document[key]
+        else:
+            projected[key] = evaluate(spec, document)
+    return projected
+
+
+def apply_update(document: Document, update: Document, inserted: bool = False) -> None:
+    document.update(update.get("$set", {}))
+    if inserted:
+        document.update(update.get("$setOnInsert", {}))
+    for field, value in update.get("$push", {}).items():
+        spec = (
+            value
+            if isinstance(value, dict) and "$each" in value
+            else {"$each": [value]}
+        )
+        array = document.get(field, []) + list(spec["$each"])
+        if "$slice" in spec:
+            array = _slice(array, spec["$slice"]) if spec["$slice"] else []
+        document[field] = array
+
+
+class Cursor:
+    def __init__(self, documents: list[Document]) -> None:
+        self.documents = documents
+
+    def sort(self, key: str | list[tuple[str, int]], direction: int = 1) -> "Cursor":
+        keys = [(key, direction)] if isinstance(key, str) else key
+        for name, order in reversed(keys):
+            self.documents.sort(key=lambda document: document[name], reverse=order < 0)
+        return self
+
+    def limit(self, limit: int) -> "Cursor":
+        self.documents = self.documents[:limit]
+        return self
+
+    async def to_list(self, length: int | None = None) -> list[Document]:
+        return self.documents[:length]
+
+    def __aiter__(self) -> "Cursor":
+        self._position = 0
+        return self
+
+    async def __anext__(self) -> Document:
+        if self._position >= len(self.documents):
+            raise StopAsyncIteration
+        self._position += 1
+        return self.documents[self._position - 1]
+
+
+class Collection:
+    """Just enough of a Motor collection for unit tests without a Mongo server."""
+
+    def __init__(self) -> None:
+        self.documents: list[Document] = []
+        # client session of every find_one_and_update and bulk_write
+        self.sessions: list[Any] = []
+
+    async def insert_one(self, document: Document) -> None:
+        self.documents.append(dict(document))
+
+    async def update_one(
+        self,
+        query: Document,
+        update: Document,
+        upsert: bool = False,
+        session: Any = None,
+    ) -> SimpleNamespace:
+        for document in self.documents:
+            if matches(document, query):
+                before = deepcopy(document)
+                apply_update(document, update)
+                return SimpleNamespace(
+                    matched_count=1, modified_count=int(document != before)
+                )
+        if upsert:
+            document = {
+                key: value
+                for key, value in query.items()
+                if not key.startswith("$") and not isinstance(value, dict)
+            }
+            apply_update(document, update, inserted=True)
+            self.documents.append(document)
+        return SimpleNamespace(matched_count=0, modified_count=0)
+
+    async def find_one_and_update(
+        self,
+        query: Document,
+        update: Document,
+        projection: Document | None = None,
+        return_document: bool = False,
+        session: Any = None,
+    ) -> Document | None:
+        self.sessions.append(session)
+        for document in self.documents:
+            if matches(document, query):
+                before = deepcopy(document)
+                apply_update(document, update)
+                return project(
+                    deepcopy(document if return_document else before), projection
+                )
+        return None
+
+    async def find_one(
+        self,
+        query: Document,
+        projection: Document | None = None,
+        sort: list[tuple[str, int]] | None = None,
+    ) -> Document | None:
+        documents = self.find(query)
+        for key, direction in reversed(sort or []):
+            documents.sort(key, direction)
+        return next((dict(d) for d in documents.documents), None)
+
+    async def bulk_write(
+        self, requests: list[Any], ordered: bool = True, session: Any = None
+    ) -> None:
+        self.sessions.append(session)
+        for request in requests:
+            await self.insert_one(request._doc)
+
+    def find(self, query: Document, projection: Document | None = None) -> Cursor:
+        return Cursor(
+            [
+                project(deepcopy(d), projection)
+                for d in self.documents
+                if matches(d, query)
+            ]
+        )
+
+    def aggregate(self, pipeline: list[Document]) -> Cursor:
+        documents = deepcopy(self.documents)
+        for stage in pipeline:
+            ((name, spec),) = stage.items()
+            if name == "$match":
+                documents = [d for d in documents if matches(d, spec)]
+            elif name == "$sort":
+                documents = Cursor(documents).sort(list(spec.items())).documents
+            elif name == "$project":
+                documents = [project(d, spec) for d in documents]
+            else:
+                raise NotImplementedError(name)
+        return Cursor(documents)
@@ -0,0 +1,184 @@
+import asyncio
+import json
+from collections.abc import Callable
+from typing import Any
+
+from bson import ObjectId
+from llama_index.core.workflow import Event
+
+from app.api import jobs
+from app.tests.fake_mongo import Collection
+
+
+class StepDone(Event):
+    pass
+
+
+def new_job_manager(concurrency: int = 1) -> jobs.JobManager:
+    return jobs.JobManager(Collection(), Collection(), concurrency, poll_interval=0.05)
+
+
+async def wait_for_status(
+    manager: jobs.JobManager, job_id: str, status: str
+) -> dict[str, Any]:
+    for _ in range(100):
+        job = await manager.get(job_id)
+        if job is not None and job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} never reached {status}")
+
+
+async def test_job_runs_in_background_and_stores_result() -> None:
+    manager = new_job_manager()
+
+    async def runner(progress: Callable[[Event], None]) -> dict[str, Any]:
+        await asyncio.sleep(0.05)
+        progress(StepDone())
+        return {"script": "done"}
+
+    job_id = await manager.submit("test", {}, runner)
+
+    await wait_for_status(manager, job_id, jobs.QUEUED)
+    job = await wait_for_status(manager, job_id, jobs.SUCCEEDED)
+    assert job["result"] == {"script": "done"}
+
+    stream = [message async for message in manager.stream_events(job_id)]
+    assert [json.loads(message.split("data: ")[1])["data"] for message in stream] == [
+        {"status": "queued"},
+        {"status": "running"},
+        {"event": "StepDone"},
+        {"status": "succeeded"},
+    ]
+
+
+async def test_job_concurrency_is_bounded() -> None:
+    concurrency = 2
+    manager = new_job_manager(concurrency)
+    running = 0
+    peak = 0
+
+    async def runner(progress: Callable[[Event], None]) -> dict[str, Any]:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return {}
+
+    job_ids = [await manager.submit("test", {}, runner) for _ in range(6)]
+    for job_id in job_ids:
+        await wait_for_status(manager, job_id, jobs.SUCCEEDED)
+
+    assert peak == concurrency
+
+
+async def test_job_can_be_cancelled() -> None:
+    manager = new_job_manager()
+
+    async def runner(progress: Callable[[Event], None]) -> dict[str, Any]:
+        await asyncio.sleep(10)
+        return {}
+
+    job_id = await manager.submit("test", {}, runner)
+    await wait_for_status(manager, job_id, jobs.RUNNING)
+
+    assert await manager.cancel(job_id)
+    await wait_for_status(manager, job_id, jobs.CANCELLED)
+    assert not await manager.cancel(job_id)
+
+
+async def test_stream_events_resumes_after_last_event_id() -> None:
+    manager = new_job_manager()
+
+    async def runner(progress: Callable[[Event], None]) -> dict[str, Any]:
+        return {}
+
+    job_id = await manager.submit("test", {}, runner)
+    await wait_for_status(manager, job_id, jobs.SUCCEEDED)
+
+    stream = [message async for message in manager.stream_events(job_id, 2)]
+    assert len(stream) == 1
+    assert stream[0].startswith("id: 3\n")
+
+
+async def test_stream_events_ends_when_resumed_after_the_final_event() -> None:
+    manager = new_job_manager()
+
+    async def runner(progress: Callable[[Event], None]) -> dict[str, Any]:
+        return {}
+
+    job_id = await manager.submit("test", {}, runner)
+    await wait_for_status(manager, job_id, jobs.SUCCEEDED)
+    final_seq = len(manager.events.documents)
+
+    stream = manager.stream_events(job_id, final_seq)
+    # ends without polling
+    assert await asyncio.wait_for(anext(stream, None), manager.poll_interval) is None
+
+
+async def test_stream_events_of_an_unknown_job_ends() -> None:
+    manager = new_job_manager()
+
+    assert [message async for message in manager.stream_events(str(ObjectId()))] == []
+
+
+async def test_stream_events_of_an_orphaned_job_ends_after_the_idle_timeout() -> None:
+    manager = jobs.JobManager(
+        Collection(), Collection(), 1, poll_interval=0.01, idle_timeout=0.05
+    )
+    job_id = ObjectId()
+    # running in a worker process that died
+    await manager.jobs.insert_one({"_id": job_id, "status": jobs.RUNNING})
+    await manager.events.insert_one(
+        {"job_id": job_id, "seq": 1, "timestamp": 0.0, "data": {"status": "running"}}
+    )
+
+    stream = [message async for message in manager.stream_events(str(job_id))]
+
+    assert stream[0].startswith("id: 1\n")
+    assert set(stream[1:]) == {": keep-alive\n\n"}
+
+
+class SlowFirstInsertCollection(Collection):
+    """Events collection whose first progress insert takes longer than the next ones."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.delays = {"First": 0.05}
+
+    async def insert_one(self, document: dict[str, Any]) -> None:
+        event = document["data"].get("event")
+        await asyncio.sleep(self.delays.pop(event, 0))
+        await super().insert_one(document)
+
+
+class First(Event):
+    pass
+
+
+class Second(Event):
+    pass
+
+
+async def test_events_are_stored_in_seq_order_when_inserts_are_slow() -> None:
+    events = SlowFirstInsertCollection()
+    manager = jobs.JobManager(Collection(), events, 1, poll_interval=0.05)
+
+    async def runner(progress: Callable[[Event], None]) -> dict[str, Any]:
+        progress(First())
+        progress(Second())
+        return {}
+
+    job_id = await manager.submit("test", {}, runner)
+    await wait_for_status(manager, job_id, jobs.SUCCEEDED)
+
+    stored = [(d["seq"], d["data"]) for d in events.documents]
+    assert stored == sorted(stored, key=lambda event: event[0])
+    assert [data.get("event") for _, data in stored] == [
+        None,
+        None,
+        "First",
+        "Second",
+        None,
+    ]
@@ -0,0 +1,86 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.api.endpoints import users
+
+
+@pytest.fixture(autouse=True)
+def fake_llm_and_mongo(monkeypatch: pytest.MonkeyPatch) -> list[tuple]:
+    calls: list[tuple] = []
+
+    async def get_chat_summary(session_id: str) -> str:
+        return "summary"
+
+    async def astream_modify_script(script: str, input: str, chat_history):
+        for token in ["short", "er"]:
+            yield token
+
+    async def astream_final_new_script(initial_script, modification_prompt, modified_script):
+        calls.append(("final_script_input", modified_script))
+        for token in ["final ", "script"]:
+            yield token
+
+    async def update_final_script(script_id: str, new_final_script: str) -> None:
+        calls.append(("update_final_script", script_id, new_final_script))
+
+    async def append(session_id: str, messages: list[dict], session=None) -> bool:
+        calls.append(("append", session_id, [m["data"]["content"] for m in messages]))
+        return True
+
+    for name, fake in {
+        "get_chat_summary": get_chat_summary,
+        "astream_modify_script": astream_modify_script,
+        "astream_final_new_script": astream_final_new_script,
+        "update_final_script": update_final_script,
+        "chat_history": SimpleNamespace(append=append),
+    }.items():
+        monkeypatch.setattr(users, name, fake)
+    return calls
+
+
+async def test_modify_script_stream_sends_tokens_then_persists(
+    fake_llm_and_mongo: list[tuple],
+) -> None:
+    request = {
+        "script": "script",
+        "modification_prompt": "make it shorter",
+        "script_id": "s1",
+        "chat_id": "c1",
+    }
+
+    lines = []
+    async for line in users.stream_script_modification(request):
+        lines.append(json.loads(line))
+        if len(lines) == 1:
+            # first token arrives before anything is written to Mongo
+            assert fake_llm_and_mongo == []
+
+    assert [line["delta"] for line in lines[:-1]] == ["short", "er", "final ", "script"]
+    assert lines[-1]["type"] == "done"
+    assert lines[-1]["script"] == "shorter"
+    assert fake_llm_and_mongo == [
+        ("final_script_input", "shorter"),
+        ("update_final_script", "s1", "final script"),
+        (
+            "append",
+            "c1",
+            ["make it shorter", "Script modification agent's response: shorter"],
+        ),
+    ]
+
+
+async def test_modify_script_stream_reports_errors_in_stream(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def get_chat_summary(session_id: str) -> str:
+        raise users.HTTPException(status_code=500, detail="Error retrieving messages")
+
+    monkeypatch.setattr(users, "get_chat_summary", get_chat_summary)
+
+    lines = [json.loads(line) async for line in users.stream_script_modification({})]
+
+    assert lines == [
+        {"type": "error", "success": False, "detail": "Error retrieving messages"}
+    ]
@@ -0,0 +1,121 @@
+import asyncio
+import json
+from collections.abc import Sequence
+from typing import Any
+
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, MessageRole
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.tools import FunctionTool
+from llama_index.llms.openai import OpenAI  # type: ignore[import-untyped]
+from openai.types.chat.chat_completion_message_tool_call import (
+    ChatCompletionMessageToolCall,
+    Function,
+)
+
+from app.api import agents
+
+# each tool waits for the other one, awaited one by one the first would time out
+OVERLAP_TIMEOUT = 1.0
+
+
+def tool_call(
+    call_id: str, name: str, **arguments: Any
+) -> ChatCompletionMessageToolCall:
+    return ChatCompletionMessageToolCall(
+        id=call_id,
+        type="function",
+        function=Function(name=name, arguments=json.dumps(arguments)),
+    )
+
+
+class FakeOpenAI(OpenAI):  # type: ignore[misc]
+    """Answers with the queued messages instead of calling the API."""
+
+    _responses: list[ChatMessage] = PrivateAttr()
+
+    def __init__(self, responses: list[ChatMessage]) -> None:
+        super().__init__(model="gpt-4o", api_key="test")
+        self._responses = responses
+
+    async def achat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponse:
+        return ChatResponse(message=self._responses.pop(0))
+
+
+def assistant(
+    content: str = "", tool_calls: list[ChatCompletionMessageToolCall] | None = None
+) -> ChatMessage:
+    return ChatMessage(
+        role=MessageRole.ASSISTANT,
+        content=content,
+        additional_kwargs={"tool_calls": tool_calls} if tool_calls else {},
+    )
+
+
+async def test_tool_calls_of_one_turn_run_concurrently() -> None:
+    started: list[str] = []
+    both_started = asyncio.Event()
+
+    async def lookup(query: str) -> str:
+        """Look something up."""
+        started.append(query)
+        if len(started) == len(calls):
+            both_started.set()
+        await asyncio.wait_for(both_started.wait(), OVERLAP_TIMEOUT)
+        return f"result for {query}"
+
+    calls = [
+        tool_call("call_1", "lookup", query="first"),
+        tool_call("call_2", "lookup", query="second"),
+    ]
+    llm = FakeOpenAI([assistant(tool_calls=calls), assistant("done")])
+    agent = agents.build_agent(
+        [FunctionTool.from_defaults(lookup, async_fn=lookup, name="lookup")],
+        "system",
+        llm,
+    )
+
+    response = await agent.achat("look up both")
+
+    assert str(response) == "done"
+    assert sorted(started) == ["first", "second"]
+    # results are kept in the order the calls finish, the ids match them up
+    assert sorted(source.content for source in response.sources) == [
+        "result for first",
+        "result for second",
+    ]
+    tool_messages = sorted(
+        (message.additional_kwargs["tool_call_id"], message.content)
+        for message in agent.memory.get_all()
+        if message.role == MessageRole.TOOL
+    )
+    assert tool_messages == [
+        ("call_1", "result for first"),
+        ("call_2", "result for second"),
+    ]
+
+
+async def test_a_single_return_direct_call_ends_the_task() -> None:
+    async def answer(question: str) -> str:
+        """Answer directly."""
+        return f"answer to {question}"
+
+    responses = [assistant(tool_calls=[tool_call("call_1", "answer", question="q")])]
+    llm = FakeOpenAI(responses)
+    agent = agents.build_agent(
+        [
+            FunctionTool.from_defaults(
+                answer, async_fn=answer, name="answer", return_direct=True
+            )
+        ],
+        "system",
+        llm,
+    )
+
+    response = await agent.achat("answer q")
+
+    # the tool output is the response, the LLM is not asked again
+    assert str(response) == "answer to q"
+    assert responses == []
+    assert agent.memory.get_all()[-1].content == "answer to q"
@@ -0,0 +1,107 @@
+import asyncio
+import random
+
+import pytest
+
+from app.api import agents, prompts, tools
+
+CONCURRENT_RUNS = 25
+
+
+class FakeAgent:
+    # ("start" | "end", system prompt) of every call, when set
+    calls: list[tuple[str, str]] | None = None
+
+    def __init__(self, system_prompt: str) -> None:
+        self.system_prompt = system_prompt
+
+    async def achat(self, input: str) -> str:
+        if self.calls is not None:
+            self.calls.append(("start", self.system_prompt))
+        # random latency interleaves the steps of all concurrent runs
+        await asyncio.sleep(random.uniform(0, 0.02))
+        if self.calls is not None:
+            self.calls.append(("end", self.system_prompt))
+        if self.system_prompt in (
+            prompts.MR_BEAST_EVALUATOR,
+            prompts.GEORGE_BLACKMAN_EVALUATOR,
+        ):
+            return "Total MB Score: 9/10"
+        return input
+
+
+@pytest.fixture(autouse=True)
+def fake_agents(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def save_outputs_in_notion(content: str, title: str) -> None:
+        return None
+
+    monkeypatch.setattr(
+        agents,
+        "build_agent",
+        lambda tool_list, system_prompt, llm: FakeAgent(system_prompt),
+    )
+    monkeypatch.setattr(tools, "save_outputs_in_notion", save_outputs_in_notion)
+
+
+def other_topics(run: int) -> list[str]:
+    return [f"<topic-{i}>" for i in range(CONCURRENT_RUNS) if i != run]
+
+
+@pytest.mark.parametrize("topology", ["serial", "parallel"])
+async def test_ideation_flows_run_isolated(topology: str) -> None:
+    results = await asyncio.gather(
+        *(
+            agents.IDEATION_FLOWS[topology](timeout=30).run(
+                input=f"<topic-{i}>", chat_history=f"<history-{i}>"
+            )
+            for i in range(CONCURRENT_RUNS)
+        )
+    )
+
+    for i, result in enumerate(results):
+        assert f"<topic-{i}>" in result
+        assert f"<history-{i}>" in result
+        assert not any(topic in result for topic in other_topics(i))
+
+
+async def test_parallel_ideation_runs_branches_concurrently(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    calls: list[tuple[str, str]] = []
+    monkeypatch.setattr(FakeAgent, "calls", calls)
+    branches = {
+        prompts.Target_Audience_Trend_Alchemist_Prompt,
+        prompts.SEO_Platform_Strategist_Prompt,
+        prompts.Avatar_Profiler_Prompt,
+    }
+
+    result = await agents.ParallelIdeationFlow(timeout=30).run(
+        input="<topic-0>", chat_history="<history-0>"
+    )
+
+    # all three branches start before any of them ends, run one by one they
+    # would alternate, then the content strategist runs on their outputs
+    first = calls[: len(branches)]
+    assert [event for event, _ in first] == ["start"] * len(branches)
+    assert {prompt for _, prompt in first} == branches
+    assert "keyword research" in result
+    assert "profile of our target audience" in result
+
+
+async def test_scripting_flows_run_isolated() -> None:
+    reports = await asyncio.gather(
+        *(
+            agents.ScriptingFlow(timeout=30).run(
+                ideation=f"<topic-{i}>",
+                research=f"<research-{i}>",
+                chat_history=f"<history-{i}>",
+            )
+            for i in range(CONCURRENT_RUNS)
+        )
+    )
+
+    for i, report in enumerate(reports):
+        assert report["ideation_output"] == f"<topic-{i}>"
+        assert report["research_output"] == f"<research-{i}>"
+        assert f"<topic-{i}>" in report["Final_Script"]
+        assert not any(topic in report["Final_Script"] for topic in other_topics(i))
@@ -1,25 +1,41 @@
 import time
+from collections.abc import AsyncGenerator
 
-from fastapi import status
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI, status
 from freezegun import freeze_time
-from httpx import AsyncClient
+from httpx import ASGITransport, AsyncClient
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api import api_messages
+from app.api.endpoints import auth
 from app.core.config import get_settings
 from app.core.security.jwt import verify_jwt_token
-from app.main import app
+from app.core.security.password import verify_password
+from app.core.security.refresh_token import hash_refresh_token
 from app.models import RefreshToken, User
 from app.tests.conftest import default_user_password
 
+# the auth routes are not mounted in app.main, the login is served on its own
+auth_app = FastAPI()
+auth_app.include_router(auth.router, prefix="/auth")
+
+
+@pytest_asyncio.fixture(name="client", scope="function")
+async def fixture_client(session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
+    transport = ASGITransport(app=auth_app)
+    async with AsyncClient(transport=transport, base_url="http://test") as aclient:
+        yield aclient
+
 
 async def test_login_access_token_has_response_status_code(
     client: AsyncClient,
     default_user: User,
 ) -> None:
     response = await client.post(
-        app.url_path_for("login_access_token"),
+        auth_app.url_path_for("login_access_token"),
         data={
             "username": default_user.email,
             "password": default_user_password,
@@ -35,7 +51,7 @@ async def test_login_access_token_jwt_has_valid_token_type(
     default_user: User,
 ) -> None:
     response = await client.post(
-        app.url_path_for("login_access_token"),
+        auth_app.url_path_for("login_access_token"),
         data={
             "username": default_user.email,
             "password": default_user_password,
@@ -53,7 +69,7 @@ async def test_login_access_token_jwt_has_valid_expire_time(
     default_user: User,
 ) -> None:
     response = await client.post(
-        app.url_path_for("login_access_token"),
+        auth_app.url_path_for("login_access_token"),
         data={
             "username": default_user.email,
             "password": default_user_password,
@@ -75,7 +91,7 @@ async def test_login_access_token_returns_valid_jwt_access_token(
     default_user: User,
 ) -> None:
     response = await client.post(
-        app.url_path_for("login_access_token"),
+        auth_app.url_path_for("login_access_token"),
         data={
             "username": default_user.email,
             "password": default_user_password,
@@ -97,7 +113,7 @@ async def test_login_access_token_refresh_token_has_valid_expire_time(
     default_user: User,
 ) -> None:
     response = await client.post(
-        app.url_path_for("login_access_token"),
+        auth_app.url_path_for("login_access_token"),
         data={
             "username": default_user.email,
             "password": default_user_password,
@@ -119,7 +135,7 @@ async def test_login_access_token_refresh_token_exists_in_db(
     session: AsyncSession,
 ) -> None:
     response = await client.post(
-        app.url_path_for("login_access_token"),
+        auth_app.url_path_for("login_access_token"),
         data={
             "username": default_user.email,
             "password": default_user_password,
@@ -130,7 +146,9 @@ async def test_login_access_token_refresh_token_exists_in_db(
     token = response.json()
 
     token_db_count = await session.scalar(
-        select(func.count()).where(RefreshToken.refresh_token == token["refresh_token"])
+        select(func.count()).where(
+            RefreshToken.token_hash == hash_refresh_token(token["refresh_token"])
+        )
     )
     assert token_db_count == 1
 
@@ -141,7 +159,7 @@ async def test_login_access_token_refresh_token_in_db_has_valid_fields(
     session: AsyncSession,
 ) -> None:
     response = await client.post(
-        app.url_path_for("login_access_token"),
+        auth_app.url_path_for("login_access_token"),
         data={
             "username": default_user.email,
             "password": default_user_password,
@@ -151,7 +169,9 @@ async def test_login_access_token_refresh_token_in_db_has_valid_fields(
 
     token = response.json()
     result = await session.scalars(
-        select(RefreshToken).where(RefreshToken.refresh_token == token["refresh_token"])
+        select(RefreshToken).where(
+            RefreshToken.token_hash == hash_refresh_token(token["refresh_token"])
+        )
     )
     refresh_token = result.one()
 
@@ -164,7 +184,7 @@ async def test_auth_access_token_fail_for_not_existing_user_with_message(
     client: AsyncClient,
 ) -> None:
     response = await client.post(
-        app.url_path_for("login_access_token"),
+        auth_app.url_path_for("login_access_token"),
         data={
             "username": "non-existing",
             "password": "bla",
@@ -181,7 +201,7 @@ async def test_auth_access_token_fail_for_invalid_password_with_message(
     default_user: User,
 ) -> None:
     response = await client.post(
-        app.url_path_for("login_access_token"),
+        auth_app.url_path_for("login_access_token"),
         data={
             "username": default_user.email,
             "password": "invalid",
@@ -191,3 +211,30 @@ async def test_auth_access_token_fail_for_invalid_password_with_message(
 
     assert response.status_code == status.HTTP_400_BAD_REQUEST
     assert response.json() == {"detail": api_messages.PASSWORD_INVALID}
+
+
+async def test_login_access_token_rehashes_password_made_with_older_settings(
+    client: AsyncClient,
+    default_user: User,
+    session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().security, "password_scheme", "scrypt")
+    monkeypatch.setattr(get_settings().security, "password_scrypt_ln", 10)
+
+    response = await client.post(
+        auth_app.url_path_for("login_access_token"),
+        data={
+            "username": default_user.email,
+            "password": default_user_password,
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    user = await session.scalar(
+        select(User).where(User.user_id == default_user.user_id)
+    )
+    assert user is not None
+    assert user.hashed_password.startswith("$scrypt$ln=10,")
+    assert verify_password(default_user_password, user.hashed_password)
@@ -0,0 +1,43 @@
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.security.refresh_token import (
+    delete_expired_refresh_tokens,
+    hash_refresh_token,
+)
+from app.models import RefreshToken, User
+
+
+async def test_expired_refresh_tokens_are_deleted_in_batches(
+    default_user: User,
+    session: AsyncSession,
+) -> None:
+    now = int(time.time())
+    tokens = [
+        ("expired", now - 10, False),
+        ("expired used", now - 10, True),
+        ("expired long ago", now - 10_000, True),
+        ("live", now + 1000, False),
+        ("live used", now + 1000, True),
+    ]
+    for name, exp, used in tokens:
+        session.add(
+            RefreshToken(
+                user_id=default_user.user_id,
+                token_hash=hash_refresh_token(name),
+                exp=exp,
+                used=used,
+            )
+        )
+    await session.commit()
+
+    deleted = await delete_expired_refresh_tokens(batch_size=2)
+
+    remaining = await session.scalars(select(RefreshToken.token_hash))
+    assert deleted == len([exp for _, exp, _ in tokens if exp < now])
+    assert set(remaining) == {
+        hash_refresh_token("live"),
+        hash_refresh_token("live used"),
+    }
@@ -0,0 +1,39 @@
+from app.api import notion
+from app.core import http_client
+
+
+async def test_http_client_is_reused_per_integration() -> None:
+    client = http_client.get_http_client("youtube")
+
+    assert http_client.get_http_client("youtube") is client
+    assert http_client.get_http_client("ncbi") is not client
+
+    await http_client.close_http_clients()
+
+
+async def test_http_client_is_recreated_after_close() -> None:
+    client = http_client.get_http_client("youtube")
+
+    await http_client.close_http_clients()
+
+    assert client.is_closed
+    assert http_client.get_http_client("youtube") is not client
+
+    await http_client.close_http_clients()
+
+
+async def test_notion_client_is_shared_and_keeps_the_client_config() -> None:
+    notion_client = notion.get_notion_client()
+    shared = http_client.get_http_client("notion")
+
+    assert notion.get_notion_client() is notion_client
+    assert notion_client.client is shared
+    assert shared.base_url == "https://api.notion.com/v1/"
+    assert shared.timeout == http_client.HTTP_CLIENT_CONFIGS["notion"].timeout
+
+    await http_client.close_http_clients()
+
+    assert notion.get_notion_client() is not notion_client
+    assert notion.get_notion_client().client is http_client.get_http_client("notion")
+
+    await http_client.close_http_clients()
@@ -82,3 +82,33 @@ def test_jwt_error_with_invalid_secret_key() -> None:
         jwt.verify_jwt_token(token=token.access_token)
 
     assert e.value.detail == "Token invalid: Signature verification failed"
+
+
+def test_jwt_verified_token_is_decoded_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    token = jwt.create_jwt_token("test_user_id")
+    decoded: list[str] = []
+    decode = jwt.decode_jwt_token
+
+    def counting_decode(token: str, key: bytes, issuer: str) -> jwt.JWTTokenPayload:
+        decoded.append(token)
+        return decode(token, key, issuer)
+
+    monkeypatch.setattr(jwt, "decode_jwt_token", counting_decode)
+
+    first = jwt.verify_jwt_token(token=token.access_token)
+    second = jwt.verify_jwt_token(token=token.access_token)
+
+    assert first == second == token.payload
+    assert decoded == [token.access_token]
+
+
+def test_jwt_verified_token_error_after_exp_time() -> None:
+    user_id = "test_user_id"
+    with freeze_time("2024-01-01"):
+        token = jwt.create_jwt_token(user_id)
+        jwt.verify_jwt_token(token=token.access_token)
+    with freeze_time("2024-02-01"):
+        with pytest.raises(HTTPException) as e:
+            jwt.verify_jwt_token(token=token.access_token)
+
+        assert e.value.detail == "Token invalid: Signature has expired"
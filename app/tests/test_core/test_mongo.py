@@ -0,0 +1,27 @@
+import pytest
+from pymongo import ReadPreference
+
+from app.core import mongo
+
+
+def test_mongo_client_is_shared() -> None:
+    client = mongo.get_mongo_client()
+
+    assert mongo.get_mongo_client() is client
+    assert mongo.get_database().client is client
+    assert mongo.get_read_database().client is client
+
+
+def test_read_database_prefers_secondaries() -> None:
+    assert mongo.get_database().read_preference == ReadPreference.PRIMARY
+    assert (
+        mongo.get_read_database().read_preference == ReadPreference.SECONDARY_PREFERRED
+    )
+
+
+def test_compressors_without_their_module_are_skipped(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setitem(mongo.COMPRESSOR_MODULES, "snappy", "not_installed_snappy")
+
+    assert mongo.available_compressors(["snappy", "zlib"]) == ["zlib"]
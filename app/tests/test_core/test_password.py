@@ -1,3 +1,10 @@
+import threading
+
+import pytest
+from fastapi import HTTPException, status
+
+from app.core.config import get_settings
+from app.core.security import password
 from app.core.security.password import get_password_hash, verify_password
 
 
@@ -9,3 +16,95 @@ def test_hashed_password_is_verified() -> None:
 def test_invalid_password_is_not_verified() -> None:
     pwd_hash = get_password_hash("my_password")
     assert not verify_password("my_password_invalid", pwd_hash)
+
+
+async def test_hashed_password_is_verified_in_executor() -> None:
+    pwd_hash = await password.aget_password_hash("my_password")
+
+    assert await password.averify_password("my_password", pwd_hash)
+    assert not await password.averify_password("my_password_invalid", pwd_hash)
+
+
+async def test_password_check_over_pending_limit_is_rejected(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().security, "password_hash_max_pending", 0)
+
+    with pytest.raises(HTTPException) as e:
+        await password.averify_password("my_password", get_password_hash("x"))
+
+    assert e.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+def test_dummy_password_is_hashed_on_first_use() -> None:
+    password._dummy_password_hash.cache_clear()
+
+    assert password.DUMMY_PASSWORD == password.get_dummy_password_hash()
+    assert verify_password("", password.DUMMY_PASSWORD)
+
+
+async def test_dummy_password_is_hashed_on_the_pool(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    threads: list[str] = []
+
+    def dummy_password_hash(scheme: password.PasswordScheme) -> str:
+        threads.append(threading.current_thread().name)
+        return scheme.hash("")
+
+    monkeypatch.setattr(password, "_dummy_password_hash", dummy_password_hash)
+
+    assert await password.averify_dummy_password("")
+    assert not await password.averify_dummy_password("my_password")
+    assert all(name.startswith("password-hash") for name in threads)
+    assert threads
+
+
+@pytest.fixture
+def scrypt_settings(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(get_settings().security, "password_scheme", "scrypt")
+    monkeypatch.setattr(get_settings().security, "password_scrypt_ln", 10)
+
+
+def test_scrypt_hashed_password_is_verified(scrypt_settings: None) -> None:
+    pwd_hash = get_password_hash("my_password")
+
+    assert pwd_hash.startswith("$scrypt$ln=10,r=8,p=1$")
+    assert verify_password("my_password", pwd_hash)
+    assert not verify_password("my_password_invalid", pwd_hash)
+
+
+def test_password_scheme_is_identified_from_hash(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().security, "password_bcrypt_rounds", 4)
+
+    assert password.identify_password_scheme(
+        get_password_hash("my_password")
+    ) == password.BcryptScheme(rounds=4)
+    with pytest.raises(ValueError):
+        password.identify_password_scheme("plain text")
+
+
+def test_password_is_rehashed_when_settings_change(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().security, "password_bcrypt_rounds", 4)
+    bcrypt_hash = get_password_hash("my_password")
+
+    assert password.verify_and_update_password("my_password", bcrypt_hash) == (
+        True,
+        None,
+    )
+
+    monkeypatch.setattr(get_settings().security, "password_scheme", "scrypt")
+    monkeypatch.setattr(get_settings().security, "password_scrypt_ln", 10)
+    verified, new_hash = password.verify_and_update_password("my_password", bcrypt_hash)
+
+    assert verified
+    assert new_hash is not None and new_hash.startswith("$scrypt$")
+    assert verify_password("my_password", new_hash)
+    assert password.verify_and_update_password("my_password_invalid", bcrypt_hash) == (
+        False,
+        None,
+    )
@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+from fastapi import status
+from httpx import AsyncClient
+
+from app.core.rate_limiter import TokenBucket, parse_retry_after
+from app.main import app
+
+# early wake ups of asyncio.sleep and timer resolution
+TIMER_SLACK = 0.01
+
+
+async def test_rate_limiter_allows_burst_up_to_capacity() -> None:
+    rate = 5
+    limiter = TokenBucket("test", rate_per_second=rate)
+
+    start = time.monotonic()
+    for _ in range(rate):
+        await limiter.acquire()
+
+    # well under the wait for one more token
+    assert time.monotonic() - start < 1 / rate / 4
+
+
+async def test_rate_limiter_waits_for_next_token() -> None:
+    rate = 20
+    limiter = TokenBucket("test", rate_per_second=rate, capacity=1)
+
+    start = time.monotonic()
+    await asyncio.gather(*(limiter.acquire() for _ in range(3)))
+
+    # first token is immediate, then 2 tokens at 20/s
+    assert time.monotonic() - start >= 2 / rate - TIMER_SLACK
+
+
+async def test_rate_limiter_penalize_pauses_bucket() -> None:
+    penalty = 0.1
+    limiter = TokenBucket("test", rate_per_second=100)
+    limiter.penalize(penalty)
+
+    start = time.monotonic()
+    await limiter.acquire()
+
+    assert time.monotonic() - start >= penalty - TIMER_SLACK
+
+
+async def test_rate_limiter_cancelled_waiter_refunds_token() -> None:
+    limiter = TokenBucket("test", rate_per_second=1, capacity=1)
+    await limiter.acquire()
+
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0.01)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+
+    # the waiter took the bucket a token into debt, the refund pays it back
+    assert limiter.stats()["tokens"] >= 0
+
+
+async def test_rate_limiter_stats_record_waits() -> None:
+    limiter = TokenBucket("test", rate_per_second=10)
+    await limiter.acquire()
+
+    stats = limiter.stats()
+    assert stats["acquired"] == 1
+    assert stats["wait_histogram"]["le_0.01"] == 1
+
+
+def test_parse_retry_after() -> None:
+    retry_after = 3.0
+    assert parse_retry_after(f"{retry_after:.0f}", 1.0) == retry_after
+    assert parse_retry_after(None, 1.0) == 1.0
+    assert parse_retry_after("not a date", 1.0) == 1.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT", 1.0) == 0.0
+
+
+async def test_rate_limits_need_an_authenticated_user(
+    client: AsyncClient, default_user_headers: dict[str, str]
+) -> None:
+    url = app.url_path_for("get_rate_limits")
+
+    response = await client.get(url)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    response = await client.get(url, headers=default_user_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["success"] is True
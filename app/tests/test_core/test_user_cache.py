@@ -0,0 +1,135 @@
+import asyncio
+
+from fastapi import status
+from httpx import AsyncClient
+
+from app.core.user_cache import InMemorySharedCache, UserCache
+from app.main import app
+from app.models import User
+
+
+class Loader:
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+
+    async def __call__(self, user_id: str) -> User | None:
+        self.calls.append(user_id)
+        if user_id == "removed":
+            return None
+        return User(
+            user_id=user_id, email=f"{user_id}@example.com", hashed_password="hash"
+        )
+
+
+async def test_user_is_loaded_once_then_served_from_cache() -> None:
+    cache = UserCache(max_size=10, ttl_seconds=60)
+    load = Loader()
+
+    first = await cache.get_user("u1", load)
+    second = await cache.get_user("u1", load)
+
+    assert load.calls == ["u1"]
+    assert second is not None
+    assert second.email == "u1@example.com"
+    # every hit gets its own instance
+    assert second is not first
+    stats = cache.stats()
+    assert (stats["local_hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+async def test_removed_user_is_not_cached() -> None:
+    cache = UserCache(max_size=10, ttl_seconds=60)
+    load = Loader()
+
+    assert await cache.get_user("removed", load) is None
+    assert await cache.get_user("removed", load) is None
+    assert load.calls == ["removed", "removed"]
+
+
+async def test_least_recently_used_user_is_evicted() -> None:
+    cache = UserCache(max_size=2, ttl_seconds=60)
+    load = Loader()
+
+    for user_id in ["u1", "u2", "u1", "u3", "u1", "u2"]:
+        await cache.get_user(user_id, load)
+
+    assert load.calls == ["u1", "u2", "u3", "u2"]
+
+
+async def test_expired_user_is_loaded_again() -> None:
+    cache = UserCache(max_size=10, ttl_seconds=0.01)
+    load = Loader()
+
+    await cache.get_user("u1", load)
+    await asyncio.sleep(0.02)
+    await cache.get_user("u1", load)
+
+    assert load.calls == ["u1", "u1"]
+
+
+async def test_shared_tier_serves_other_processes() -> None:
+    shared = InMemorySharedCache()
+    worker_1 = UserCache(max_size=10, ttl_seconds=60, shared=shared)
+    worker_2 = UserCache(max_size=10, ttl_seconds=60, shared=shared)
+    load = Loader()
+
+    await worker_1.get_user("u1", load)
+    user = await worker_2.get_user("u1", load)
+
+    assert load.calls == ["u1"]
+    assert user is not None
+    assert user.user_id == "u1"
+    assert worker_2.stats()["shared_hits"] == 1
+
+
+async def test_password_hash_is_not_cached() -> None:
+    shared = InMemorySharedCache()
+    cache = UserCache(max_size=10, ttl_seconds=60, shared=shared)
+    load = Loader()
+
+    await cache.get_user("u1", load)
+    user = await cache.get_user("u1", load)
+
+    assert "hash" not in str(await shared.get("user:u1"))
+    assert user is not None
+    assert (user.user_id, user.email) == ("u1", "u1@example.com")
+    assert "hashed_password" not in user.__dict__
+
+
+async def test_invalidate_clears_both_tiers() -> None:
+    cache = UserCache(max_size=10, ttl_seconds=60, shared=InMemorySharedCache())
+    load = Loader()
+
+    await cache.get_user("u1", load)
+    await cache.invalidate("u1")
+    await cache.get_user("u1", load)
+
+    assert load.calls == ["u1", "u1"]
+    assert cache.stats()["invalidations"] == 1
+
+
+async def test_load_racing_an_invalidation_is_not_cached() -> None:
+    cache = UserCache(max_size=10, ttl_seconds=60)
+    load = Loader()
+
+    async def slow_load(user_id: str) -> User | None:
+        await asyncio.sleep(0.01)
+        return await load(user_id)
+
+    await asyncio.gather(cache.get_user("u1", slow_load), cache.invalidate("u1"))
+    await cache.get_user("u1", load)
+
+    assert load.calls == ["u1", "u1"]
+
+
+async def test_cache_stats_need_an_authenticated_user(
+    client: AsyncClient, default_user_headers: dict[str, str]
+) -> None:
+    url = app.url_path_for("get_user_cache_stats")
+
+    response = await client.get(url)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    response = await client.get(url, headers=default_user_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"]["misses"] == 1
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api import embeddings
+from app.models import EmbeddingCacheEntry
+
+
+class FakeEmbeddings:
+    model = "fake-model"
+
+    def __init__(self) -> None:
+        self.requests: list[list[str]] = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.requests.append(texts)
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return [[float(len(text)), 0.5] for text in texts]
+
+
+@pytest.fixture
+def cache(monkeypatch: pytest.MonkeyPatch) -> dict[bytes, bytes]:
+    cache: dict[bytes, bytes] = {}
+
+    async def cached(
+        self: embeddings.EmbeddingService, keys: list[bytes]
+    ) -> dict[bytes, list[float]]:
+        return {
+            key: embeddings.decode_vector(cache[key]) for key in keys if key in cache
+        }
+
+    async def save(
+        self: embeddings.EmbeddingService, vectors: dict[bytes, list[float]]
+    ) -> None:
+        cache.update(
+            {key: embeddings.encode_vector(vector) for key, vector in vectors.items()}
+        )
+
+    monkeypatch.setattr(embeddings.EmbeddingService, "_cached", cached)
+    monkeypatch.setattr(embeddings.EmbeddingService, "_save", save)
+    return cache
+
+
+def new_service(
+    batch_size: int = 2, concurrency: int = 2
+) -> tuple[embeddings.EmbeddingService, FakeEmbeddings]:
+    fake = FakeEmbeddings()
+    return embeddings.EmbeddingService(fake, batch_size, concurrency), fake  # type: ignore[arg-type]
+
+
+async def test_repeated_texts_are_embedded_once(cache: dict[bytes, bytes]) -> None:
+    service, fake = new_service(batch_size=10)
+
+    vectors = await service.aembed_documents(["a", "bb", "a", "a"])
+
+    assert fake.requests == [["a", "bb"]]
+    assert vectors == [[1.0, 0.5], [2.0, 0.5], [1.0, 0.5], [1.0, 0.5]]
+
+
+async def test_cached_texts_are_not_embedded_again(cache: dict[bytes, bytes]) -> None:
+    service, fake = new_service(batch_size=10)
+    stats = embeddings.track_embedding_stats()
+
+    await service.aembed_documents(["a", "bb"])
+    vectors = await service.aembed_documents(["bb", "ccc"])
+
+    assert fake.requests == [["a", "bb"], ["ccc"]]
+    assert vectors == [[2.0, 0.5], [3.0, 0.5]]
+    assert stats == embeddings.EmbeddingStats(
+        texts=4, unique_texts=4, cache_hits=1, embedded=3, requests=2
+    )
+
+
+async def test_batches_are_bounded_in_size_and_concurrency(
+    cache: dict[bytes, bytes],
+) -> None:
+    concurrency = 2
+    service, fake = new_service(batch_size=2, concurrency=concurrency)
+
+    await service.aembed_documents([str(i) for i in range(9)])
+
+    assert [len(request) for request in fake.requests] == [2, 2, 2, 2, 1]
+    assert fake.peak_in_flight == concurrency
+
+
+def test_vector_round_trips_as_float32() -> None:
+    vector = [0.25, -1.5, 3.0]
+
+    assert embeddings.decode_vector(embeddings.encode_vector(vector)) == vector
+    assert len(embeddings.encode_vector(vector)) == 4 * len(vector)
+
+
+def test_cache_key_depends_on_model() -> None:
+    assert embeddings.cache_key("model-a", "text") != embeddings.cache_key(
+        "model-b", "text"
+    )
+
+
+async def test_vectors_are_cached_in_postgres(session: AsyncSession) -> None:
+    service, _ = new_service(batch_size=10)
+    first = await service.aembed_documents(["a", "bb"])
+
+    # a new process finds them in the table
+    service, fake = new_service(batch_size=10)
+    second = await service.aembed_documents(["bb", "a", "ccc"])
+
+    assert fake.requests == [["ccc"]]
+    assert second == [first[1], first[0], [3.0, 0.5]]
+    count = await session.scalar(select(func.count()).select_from(EmbeddingCacheEntry))
+    assert count == len(second)
@@ -0,0 +1,250 @@
+import asyncio
+from typing import Any
+
+import pytest
+from langchain.indexes._sql_record_manager import UpsertionRecord
+from langchain_core.documents import Document
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api import notion
+
+INDEX_START = 100.0
+
+
+def summary(
+    page_id: str, last_edited_time: str = "2026-10-01T00:00:00.000Z"
+) -> dict[str, str]:
+    return {"id": page_id, "last_edited_time": last_edited_time}
+
+
+def new_run(
+    mode: str = "incremental", record_manager: Any = None
+) -> notion.IngestionRun:
+    return notion.IngestionRun(
+        notion_id="db",
+        mode=mode,
+        vectorstore=None,  # type: ignore[arg-type]
+        record_manager=record_manager,
+        doc_queue=asyncio.Queue(),
+        index_start_dt=INDEX_START,
+    )
+
+
+class FakeRecordManager:
+    namespace = "qdrant/my_docs"
+
+    def __init__(self, records: dict[str, tuple[str, float]]) -> None:
+        # uid: (group id, updated_at)
+        self.records = records
+
+    async def aget_time(self) -> float:
+        return INDEX_START + 1
+
+    async def alist_keys(
+        self, before: float | None = None, limit: int | None = None
+    ) -> list[str]:
+        keys = [
+            uid
+            for uid, (_, updated_at) in self.records.items()
+            if before is None or updated_at < before
+        ]
+        return keys[:limit]
+
+    async def adelete_keys(self, keys: list[str]) -> None:
+        for key in keys:
+            del self.records[key]
+
+
+class FakeVectorStore:
+    def __init__(self) -> None:
+        self.deleted: list[str] = []
+
+    async def adelete(self, ids: list[str]) -> None:
+        self.deleted.extend(ids)
+
+
+@pytest.fixture
+def kept(monkeypatch: pytest.MonkeyPatch) -> list[list[str]]:
+    """Pages refreshed by `_keep_unchanged_pages`, with p1 already indexed as is."""
+    kept: list[list[str]] = []
+
+    async def get_page_fingerprints(page_ids: list[str]) -> dict[str, str]:
+        return {"p1": notion.page_fingerprint(summary("p1"))}
+
+    async def keep_unchanged_pages(
+        run: notion.IngestionRun, page_ids: list[str]
+    ) -> None:
+        kept.append(page_ids)
+
+    monkeypatch.setattr(notion, "get_page_fingerprints", get_page_fingerprints)
+    monkeypatch.setattr(notion, "_keep_unchanged_pages", keep_unchanged_pages)
+    return kept
+
+
+async def test_unchanged_pages_are_skipped(kept: list[list[str]]) -> None:
+    run = new_run("full")
+
+    changed = await notion._changed_pages(run, [summary("p1"), summary("p2")])
+
+    assert [page_summary["id"] for page_summary, _ in changed] == ["p2"]
+    assert (run.cache_hits, run.cache_misses) == (1, 1)
+    # full cleanup must not delete the vectors of the skipped page
+    assert kept == [["p1"]]
+
+
+async def test_edited_pages_are_indexed_again(kept: list[list[str]]) -> None:
+    run = new_run()
+    edited = summary("p1", "2026-10-02T00:00:00.000Z")
+
+    changed = await notion._changed_pages(run, [edited])
+
+    assert changed == [
+        (
+            edited,
+            {
+                "page_id": "p1",
+                "database_id": "db",
+                "last_edited_time": edited["last_edited_time"],
+                "fingerprint": notion.page_fingerprint(edited),
+            },
+        )
+    ]
+    assert notion.page_fingerprint(edited) != notion.page_fingerprint(summary("p1"))
+    assert kept == []
+
+
+async def test_a_rebuild_indexes_unchanged_pages(kept: list[list[str]]) -> None:
+    run = new_run("rebuild")
+
+    changed = await notion._changed_pages(run, [summary("p1")])
+
+    assert [page_summary["id"] for page_summary, _ in changed] == ["p1"]
+
+
+async def test_records_of_deleted_pages_are_removed_by_full_cleanup() -> None:
+    # p1 was refreshed or indexed by this run, p2 was deleted from Notion
+    record_manager = FakeRecordManager(
+        {
+            "a": ("p1", INDEX_START + 1),
+            "b": ("p2", INDEX_START - 1),
+            "c": ("p2", INDEX_START - 1),
+        }
+    )
+    vectorstore = FakeVectorStore()
+
+    deleted = await notion._full_cleanup(
+        vectorstore,  # type: ignore[arg-type]
+        record_manager,  # type: ignore[arg-type]
+        INDEX_START,
+        cleanup_batch_size=1,
+    )
+
+    assert deleted == len(vectorstore.deleted)
+    assert sorted(vectorstore.deleted) == ["b", "c"]
+    assert list(record_manager.records) == ["a"]
+
+
+async def test_fingerprints_are_saved_only_after_their_batch_is_indexed(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    saved: list[dict[str, str]] = []
+    fail = [True]
+
+    async def aindex(*args: Any, **kwargs: Any) -> dict[str, int]:
+        if fail:
+            raise ConnectionError("qdrant is down")
+        return {}
+
+    async def save_page_fingerprints(fingerprints: list[dict[str, str]]) -> None:
+        saved.extend(fingerprints)
+
+    monkeypatch.setattr(notion, "aindex", aindex)
+    monkeypatch.setattr(notion, "save_page_fingerprints", save_page_fingerprints)
+    fingerprint = {"page_id": "p1", "fingerprint": "f"}
+
+    for _ in range(2):
+        run = new_run()
+        await run.doc_queue.put(
+            notion.PageDocs(
+                [Document(page_content="p1", metadata={"id": "p1"})], fingerprint
+            )
+        )
+        await run.doc_queue.put(None)
+        if fail:
+            with pytest.raises(ConnectionError):
+                await notion._index_stage(run, "incremental")
+            # the failed page is fetched and indexed again next time
+            assert saved == []
+            fail.clear()
+        else:
+            await notion._index_stage(run, "incremental")
+
+    assert saved == [fingerprint]
+
+
+async def test_fingerprints_are_stored_and_updated(session: AsyncSession) -> None:
+    first = notion.page_fingerprint(summary("p1"))
+    edited = summary("p1", "2026-10-02T00:00:00.000Z")
+
+    await notion.save_page_fingerprints(
+        [
+            {
+                "page_id": "p1",
+                "database_id": "db",
+                "last_edited_time": "t1",
+                "fingerprint": first,
+            }
+        ]
+    )
+    assert await notion.get_page_fingerprints(["p1", "p2"]) == {"p1": first}
+
+    await notion.save_page_fingerprints(
+        [
+            {
+                "page_id": "p1",
+                "database_id": "db",
+                "last_edited_time": edited["last_edited_time"],
+                "fingerprint": notion.page_fingerprint(edited),
+            }
+        ]
+    )
+    assert await notion.get_page_fingerprints(["p1"]) == {
+        "p1": notion.page_fingerprint(edited)
+    }
+
+
+async def test_records_of_unchanged_pages_are_refreshed(session: AsyncSession) -> None:
+    # the record manager's table, rolled back with the test transaction
+    await session.run_sync(
+        lambda sync_session: UpsertionRecord.__table__.create(
+            sync_session.connection(), checkfirst=True
+        )
+    )
+    namespace = FakeRecordManager.namespace
+    session.add_all(
+        [
+            UpsertionRecord(
+                key="a", namespace=namespace, group_id="p1", updated_at=1.0
+            ),
+            UpsertionRecord(
+                key="b", namespace=namespace, group_id="p2", updated_at=1.0
+            ),
+            UpsertionRecord(key="c", namespace="other", group_id="p1", updated_at=1.0),
+        ]
+    )
+    await session.commit()
+    record_manager = FakeRecordManager({})
+
+    await notion._keep_unchanged_pages(new_run("full", record_manager), ["p1"])
+
+    rows = await session.execute(
+        select(UpsertionRecord.key, UpsertionRecord.updated_at).order_by(
+            UpsertionRecord.key
+        )
+    )
+    assert list(rows) == [
+        ("a", await record_manager.aget_time()),
+        ("b", 1.0),
+        ("c", 1.0),
+    ]
@@ -0,0 +1,131 @@
+import asyncio
+from typing import Any
+
+import pytest
+from langchain_core.documents import Document
+
+from app.api import notion
+from app.core.config import get_settings
+
+BATCH_SIZE = 2
+QUEUE_SIZE = 1
+
+
+def page(page_id: str) -> notion.PageDocs:
+    return notion.PageDocs(
+        [Document(page_content=page_id, metadata={"id": page_id})],
+        {"page_id": page_id},
+    )
+
+
+def new_run() -> notion.IngestionRun:
+    return notion.IngestionRun(
+        notion_id="db",
+        mode="incremental",
+        vectorstore=None,  # type: ignore[arg-type]
+        record_manager=None,  # type: ignore[arg-type]
+        doc_queue=asyncio.Queue(maxsize=QUEUE_SIZE),
+    )
+
+
+@pytest.fixture
+def events(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """What the stages did, in order, with `aindex` and the fingerprint table faked."""
+    events: list[str] = []
+
+    async def aindex(docs: list[Document], *args: Any, **kwargs: Any) -> dict[str, int]:
+        await asyncio.sleep(0)
+        events.append("indexed " + ",".join(doc.metadata["id"] for doc in docs))
+        return {"num_added": len(docs)}
+
+    async def save_page_fingerprints(fingerprints: list[dict[str, str]]) -> None:
+        if fingerprints:
+            events.append("saved " + ",".join(f["page_id"] for f in fingerprints))
+
+    monkeypatch.setattr(notion, "aindex", aindex)
+    monkeypatch.setattr(notion, "save_page_fingerprints", save_page_fingerprints)
+    monkeypatch.setattr(get_settings(), "UPSERT_BATCH_SIZE", BATCH_SIZE)
+    return events
+
+
+def producer_of(page_ids: list[str], events: list[str]) -> Any:
+    async def producer(run: notion.IngestionRun) -> None:
+        for page_id in page_ids:
+            await run.doc_queue.put(page(page_id))
+            events.append(f"queued {page_id}")
+        await run.doc_queue.put(None)
+
+    return producer
+
+
+async def test_batches_are_indexed_while_pages_are_still_produced(
+    events: list[str],
+) -> None:
+    run = new_run()
+    page_ids = ["p1", "p2", "p3", "p4", "p5"]
+
+    await notion._run_stages(
+        run,
+        producer_of(page_ids, events),
+        notion._index_stage(run, "incremental"),
+    )
+
+    indexed = [event for event in events if event.startswith("indexed")]
+    assert indexed == ["indexed p1,p2", "indexed p3,p4", "indexed p5"]
+    # the bounded queue holds the producer back until the first batch is indexed
+    assert events.index("indexed p1,p2") < events.index("queued p5")
+    # fingerprints of a batch are saved right after it is indexed
+    assert events[events.index("indexed p1,p2") + 1] == "saved p1,p2"
+    assert run.total_vectors == len(page_ids)
+    assert run.totals["num_added"] == len(page_ids)
+
+
+async def test_a_failing_index_stage_cancels_the_producer(
+    events: list[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    run = new_run()
+    cancelled: list[str] = []
+
+    async def failing_aindex(*args: Any, **kwargs: Any) -> dict[str, int]:
+        raise ConnectionError("qdrant is down")
+
+    async def endless_producer(run: notion.IngestionRun) -> None:
+        try:
+            index = 0
+            while True:
+                index += 1
+                await run.doc_queue.put(page(f"p{index}"))
+        except asyncio.CancelledError:
+            cancelled.append("producer")
+            raise
+
+    monkeypatch.setattr(notion, "aindex", failing_aindex)
+
+    # the error itself, not an ExceptionGroup
+    with pytest.raises(ConnectionError):
+        await notion._run_stages(
+            run, endless_producer, notion._index_stage(run, "incremental")
+        )
+
+    assert cancelled == ["producer"]
+    assert not [event for event in events if event.startswith("saved")]
+
+
+async def test_a_failing_producer_cancels_the_index_stage(events: list[str]) -> None:
+    run = new_run()
+
+    async def failing_producer(run: notion.IngestionRun) -> None:
+        await run.doc_queue.put(page("p1"))
+        raise ValueError("notion is down")
+
+    index_stage = asyncio.ensure_future(notion._index_stage(run, "incremental"))
+
+    async def index_stage_result() -> None:
+        await index_stage
+
+    with pytest.raises(ValueError):
+        await notion._run_stages(run, failing_producer, index_stage_result())
+
+    # waiting for the end of the queue that never comes
+    assert index_stage.cancelled()
+    assert events == []
@@ -0,0 +1,229 @@
+import asyncio
+from collections.abc import Iterable
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_qdrant import Qdrant
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http import models
+
+from app.api import notion, qdrant_bulk
+from app.core.config import get_settings
+
+
+class FakeEmbeddings(Embeddings):
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return [float(len(text)), 1.0]
+
+
+class FakeAsyncClient:
+    def __init__(self, threshold: int | None) -> None:
+        self.threshold = threshold
+        self.updates: list[int | None] = []
+
+    async def get_collection(self, collection_name: str) -> SimpleNamespace:
+        return SimpleNamespace(
+            config=SimpleNamespace(
+                optimizer_config=SimpleNamespace(indexing_threshold=self.threshold)
+            )
+        )
+
+    async def update_collection(
+        self, collection_name: str, optimizers_config: models.OptimizersConfigDiff
+    ) -> None:
+        self.threshold = optimizers_config.indexing_threshold
+        self.updates.append(self.threshold)
+
+
+class FailingClient:
+    def upload_points(
+        self, collection_name: str, points: Iterable[models.PointStruct], **kwargs: Any
+    ) -> None:
+        next(iter(points))
+        raise ConnectionError("qdrant is down")
+
+
+@pytest.fixture
+def qdrant() -> QdrantClient:
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        "docs",
+        vectors_config=models.VectorParams(size=2, distance=models.Distance.COSINE),
+    )
+    return client
+
+
+async def test_streamed_points_are_readable_through_the_vectorstore(
+    qdrant: QdrantClient,
+) -> None:
+    embeddings = FakeEmbeddings()
+    vectorstore = Qdrant(qdrant, "docs", embeddings)
+    docs, uids, source_ids = qdrant_bulk.hash_documents(
+        [
+            Document(page_content="a", metadata={"id": "p1"}),
+            Document(page_content="bb", metadata={"id": "p2"}),
+            Document(page_content="a", metadata={"id": "p1"}),
+        ],
+        "id",
+    )
+
+    async with qdrant_bulk.PointStream(qdrant, "docs") as stream:
+        vectors = embeddings.embed_documents([doc.page_content for doc in docs])
+        for uid, doc, vector in zip(uids, docs, vectors):
+            await stream.send([qdrant_bulk.to_point(vectorstore, uid, doc, vector)])
+
+    assert source_ids == ["p1", "p2"]
+    assert stream.stats.points == len(docs)
+    assert stream.stats.points_per_second > 0
+    assert qdrant.count("docs").count == len(docs)
+    found = vectorstore.similarity_search("bb", k=1)
+    assert found[0].page_content == "bb"
+    assert found[0].metadata["id"] == "p2"
+    assert found[0].metadata["_id"] == uids[1]
+
+
+async def test_upload_errors_are_raised() -> None:
+    point = models.PointStruct(id=1, vector=[1.0, 0.0])
+
+    with pytest.raises(ConnectionError):
+        async with qdrant_bulk.PointStream(FailingClient(), "docs") as stream:  # type: ignore[arg-type]
+            for _ in range(50):
+                await stream.send([point])
+
+
+async def test_indexing_is_paused_during_the_load_and_restored() -> None:
+    client = FakeAsyncClient(threshold=10_000)
+
+    async with qdrant_bulk.deferred_indexing(client, "docs"):  # type: ignore[arg-type]
+        async with qdrant_bulk.deferred_indexing(client, "docs"):  # type: ignore[arg-type]
+            assert client.threshold == 0
+        assert client.threshold == 0
+
+    assert client.updates == [0, 10_000]
+
+
+async def test_indexing_is_restored_after_a_failed_load() -> None:
+    client = FakeAsyncClient(threshold=None)
+
+    with pytest.raises(RuntimeError):
+        async with qdrant_bulk.deferred_indexing(client, "docs"):  # type: ignore[arg-type]
+            raise RuntimeError("embedding failed")
+
+    assert client.threshold == get_settings().QDRANT_INDEXING_THRESHOLD
+
+
+async def test_a_disabled_indexing_threshold_is_restored_as_is() -> None:
+    client = FakeAsyncClient(threshold=0)
+
+    async with qdrant_bulk.deferred_indexing(client, "docs"):  # type: ignore[arg-type]
+        pass
+
+    assert client.threshold == 0
+
+
+@pytest.fixture
+def async_qdrant() -> AsyncQdrantClient:
+    return AsyncQdrantClient(":memory:")
+
+
+async def test_rebuild_switches_the_alias_to_the_new_collection(
+    async_qdrant: AsyncQdrantClient,
+) -> None:
+    vector_params = models.VectorParams(size=2, distance=models.Distance.COSINE)
+    await async_qdrant.create_collection("docs", vectors_config=vector_params)
+
+    first = await qdrant_bulk.create_shadow_collection(async_qdrant, "docs")
+    # the plain collection becomes an alias
+    assert await qdrant_bulk.switch_alias(async_qdrant, "docs", first) is None
+    second = await qdrant_bulk.create_shadow_collection(async_qdrant, "docs")
+    await async_qdrant.upsert(
+        second, points=[models.PointStruct(id=1, vector=[1.0, 0.0])]
+    )
+
+    assert await qdrant_bulk.switch_alias(async_qdrant, "docs", second) == first
+    assert (await async_qdrant.count("docs")).count == 1
+    assert (
+        await async_qdrant.get_collection(second)
+    ).config.params.vectors == vector_params
+
+
+async def test_alias_creation_is_retried_after_the_plain_collection_is_deleted(
+    async_qdrant: AsyncQdrantClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    await async_qdrant.create_collection(
+        "docs",
+        vectors_config=models.VectorParams(size=2, distance=models.Distance.COSINE),
+    )
+    shadow = await qdrant_bulk.create_shadow_collection(async_qdrant, "docs")
+    update_collection_aliases = async_qdrant.update_collection_aliases
+    failures = [ConnectionError("qdrant is restarting")]
+
+    async def flaky_update_collection_aliases(**kwargs: Any) -> bool:
+        if failures:
+            raise failures.pop()
+        return await update_collection_aliases(**kwargs)
+
+    async def no_sleep(delay: float) -> None:
+        pass
+
+    monkeypatch.setattr(
+        async_qdrant, "update_collection_aliases", flaky_update_collection_aliases
+    )
+    monkeypatch.setattr(asyncio, "sleep", no_sleep)
+
+    assert await qdrant_bulk.switch_alias(async_qdrant, "docs", shadow) is None
+    assert failures == []
+    assert await qdrant_bulk.alias_target(async_qdrant, "docs") == shadow
+
+
+async def test_a_failed_first_switch_keeps_the_rebuilt_collection(
+    qdrant: QdrantClient,
+    async_qdrant: AsyncQdrantClient,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    await async_qdrant.create_collection(
+        "docs",
+        vectors_config=models.VectorParams(size=2, distance=models.Distance.COSINE),
+    )
+    run = notion.IngestionRun(
+        notion_id="db",
+        mode="rebuild",
+        vectorstore=Qdrant(qdrant, "docs", FakeEmbeddings(), async_client=async_qdrant),
+        record_manager=None,  # type: ignore[arg-type]
+        doc_queue=asyncio.Queue(),
+    )
+    load = notion.BulkLoad(
+        stats=qdrant_bulk.BulkUploadStats(), indexed=[], fingerprints=[]
+    )
+
+    async def run_stages(*args: Any) -> notion.BulkLoad:
+        return load
+
+    async def failing_update_collection_aliases(**kwargs: Any) -> bool:
+        raise ConnectionError("qdrant is restarting")
+
+    async def no_sleep(delay: float) -> None:
+        pass
+
+    monkeypatch.setattr(notion, "_run_stages", run_stages)
+    monkeypatch.setattr(notion, "_bulk_index_stage", lambda run: None)
+    monkeypatch.setattr(
+        async_qdrant, "update_collection_aliases", failing_update_collection_aliases
+    )
+    monkeypatch.setattr(asyncio, "sleep", no_sleep)
+
+    with pytest.raises(ConnectionError):
+        await notion._rebuild_collection(run, producer=None)
+
+    # the plain collection was deleted, the rebuilt one is the copy left
+    collections = [c.name for c in (await async_qdrant.get_collections()).collections]
+    assert "docs" not in collections
+    assert len(collections) == 1
+    assert collections[0].startswith("docs")
+    assert run.vectorstore.collection_name == "docs"
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+from app.api import notion
+
+
+class FakeEncoder:
+    def __init__(self) -> None:
+        self.calls: list[tuple[list[str], int]] = []
+
+    def encode_ordinary_batch(
+        self, texts: list[str], *, num_threads: int
+    ) -> list[list[int]]:
+        self.calls.append((texts, num_threads))
+        return [[0] * len(text.split()) for text in texts]
+
+
+@pytest.fixture
+def encoder(monkeypatch: pytest.MonkeyPatch) -> FakeEncoder:
+    encoder = FakeEncoder()
+    monkeypatch.setattr(notion, "get_encoder", lambda: encoder)
+    monkeypatch.setattr(notion, "CHUNK_SIZE", 10)
+    monkeypatch.setattr(notion, "CHUNK_OVERLAP", 0)
+    return encoder
+
+
+async def test_pages_are_counted_as_they_are_split(encoder: FakeEncoder) -> None:
+    run = notion.IngestionRun(
+        notion_id="db",
+        mode="incremental",
+        vectorstore=None,  # type: ignore[arg-type]
+        record_manager=None,  # type: ignore[arg-type]
+        doc_queue=asyncio.Queue(),
+    )
+
+    first = await notion._split_page(
+        run, "p1", [Document(page_content="one two three")]
+    )
+    await notion._split_page(run, "p2", [Document(page_content="four")])
+
+    # one batch per page, of all its chunks
+    assert [texts for texts, _ in encoder.calls] == [
+        [doc.page_content for doc in first.docs],
+        ["four"],
+    ]
+    assert run.token_stats.summary() == {
+        "pages": 2,
+        "chunks": len(first.docs) + 1,
+        "tokens": 4,
+        "max_page_tokens": 3,
+        "max_page_id": "p1",
+        "max_chunk_tokens": max(len(doc.page_content.split()) for doc in first.docs),
+        "mean_page_tokens": 2.0,
+    }
+
+
+def test_empty_pages_are_counted() -> None:
+    stats = notion.TokenStats()
+
+    stats.add_page("p1", [])
+
+    assert stats.summary()["pages"] == 1
+    assert stats.summary()["max_page_id"] is None
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException, status
+
+from app.api import notion
+
+
+async def test_upserts_wait_for_a_rebuild_and_a_rebuild_for_upserts() -> None:
+    gate = notion.UpsertGate()
+    events: list[str] = []
+    upsert_running = asyncio.Event()
+    finish_upsert = asyncio.Event()
+
+    async def upsert(name: str, finish: asyncio.Event | None = None) -> None:
+        async with gate.upsert():
+            events.append(f"{name} start")
+            upsert_running.set()
+            if finish is not None:
+                await finish.wait()
+            events.append(f"{name} end")
+
+    async def rebuild() -> None:
+        async with gate.rebuild():
+            events.append("rebuild start")
+            await asyncio.sleep(0)
+            events.append("rebuild end")
+
+    first = asyncio.create_task(upsert("first", finish_upsert))
+    await upsert_running.wait()
+    rebuilding = asyncio.create_task(rebuild())
+    await asyncio.sleep(0)
+    second = asyncio.create_task(upsert("second"))
+    await asyncio.sleep(0)
+    finish_upsert.set()
+    await asyncio.gather(first, rebuilding, second)
+
+    assert events == [
+        "first start",
+        "first end",
+        "rebuild start",
+        "rebuild end",
+        "second start",
+        "second end",
+    ]
+
+
+async def test_a_second_rebuild_is_rejected() -> None:
+    gate = notion.UpsertGate()
+
+    async with gate.rebuild():
+        with pytest.raises(HTTPException) as error:
+            async with gate.rebuild():
+                pass
+
+    assert error.value.status_code == status.HTTP_409_CONFLICT
+    # the rejected rebuild leaves the gate to the running one
+    async with gate.upsert():
+        pass
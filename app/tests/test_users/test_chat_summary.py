@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.api.endpoints import users
+from app.tests.fake_mongo import Collection
+
+
+def history_message(msg_type: str, content: str) -> dict:
+    return {"type": msg_type, "data": {"content": content}}
+
+
+@pytest.fixture
+def history(monkeypatch: pytest.MonkeyPatch) -> list[dict]:
+    history: list[dict] = []
+
+    async def since(session_id: str, offset: int) -> tuple[int, list]:
+        turns = [{m["type"]: m["data"]["content"]} for m in history[offset:]]
+        return len(history), turns
+
+    monkeypatch.setattr(users, "db", SimpleNamespace(HistorySummary=Collection()))
+    monkeypatch.setattr(users, "chat_history", SimpleNamespace(since=since))
+    return history
+
+
+@pytest.fixture
+def llm_calls(monkeypatch: pytest.MonkeyPatch) -> list[tuple[str, str]]:
+    llm_calls: list[tuple[str, str]] = []
+
+    async def update_chat_summary(summary: str, new_messages: str) -> str:
+        llm_calls.append((summary, new_messages))
+        return f"summary of {len(llm_calls)} calls"
+
+    monkeypatch.setattr(users, "update_chat_summary", update_chat_summary)
+    return llm_calls
+
+
+async def test_chat_summary_only_folds_in_new_messages(
+    history: list[dict], llm_calls: list[tuple[str, str]]
+) -> None:
+    history.extend([history_message("human", "hi"), history_message("ai", "hello")])
+    assert await users.get_chat_summary("s1") == "summary of 1 calls"
+
+    history.append(history_message("human", "write a script"))
+    assert await users.get_chat_summary("s1") == "summary of 2 calls"
+
+    assert llm_calls == [
+        ("", str([{"human": "hi"}, {"ai": "hello"}])),
+        ("summary of 1 calls", str([{"human": "write a script"}])),
+    ]
+
+
+async def test_chat_summary_is_cached_for_unchanged_history(
+    history: list[dict], llm_calls: list[tuple[str, str]]
+) -> None:
+    history.append(history_message("human", "hi"))
+
+    first = await users.get_chat_summary("s1")
+    second = await users.get_chat_summary("s1")
+
+    assert first == second
+    assert len(llm_calls) == 1
+
+
+async def test_chat_summary_restarts_when_history_shrinks(
+    history: list[dict], llm_calls: list[tuple[str, str]]
+) -> None:
+    history.extend([history_message("human", "hi"), history_message("ai", "hello")])
+    await users.get_chat_summary("s1")
+
+    history[:] = [history_message("human", "new chat")]
+    await users.get_chat_summary("s1")
+
+    assert llm_calls[-1] == ("", str([{"human": "new chat"}]))
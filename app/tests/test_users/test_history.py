@@ -0,0 +1,127 @@
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from app.api import history
+from app.core.config import get_settings
+from app.tests.fake_mongo import Collection, Document
+
+BUCKET_THRESHOLD = 4
+BUCKET_SIZE = 2
+
+
+def message(index: int) -> Document:
+    return history.history_message(f"m{index}", "human" if index % 2 == 0 else "ai")
+
+
+def turn(index: int) -> Document:
+    return {"human" if index % 2 == 0 else "ai": f"m{index}"}
+
+
+@pytest.fixture(autouse=True)
+def bucket_settings(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(get_settings(), "HISTORY_BUCKET_THRESHOLD", BUCKET_THRESHOLD)
+    monkeypatch.setattr(get_settings(), "HISTORY_BUCKET_SIZE", BUCKET_SIZE)
+
+
+@pytest.fixture
+def db() -> SimpleNamespace:
+    return SimpleNamespace(History=Collection(), HistoryBucket=Collection())
+
+
+@pytest.fixture
+def chat_history(db: SimpleNamespace) -> history.ChatHistory:
+    return history.ChatHistory(db)
+
+
+async def append(chat_history: history.ChatHistory, indexes: range) -> None:
+    assert await chat_history.append("s1", [message(i) for i in indexes])
+
+
+async def test_reads_before_compaction(
+    db: SimpleNamespace, chat_history: history.ChatHistory
+) -> None:
+    await db.History.insert_one({"sessionId": "s1", "messages": []})
+    await append(chat_history, range(3))
+
+    assert await chat_history.since("s1", 0) == (3, [turn(i) for i in range(3)])
+    assert await chat_history.since("s1", 2) == (3, [turn(2)])
+    assert await chat_history.since("s1", 3) == (3, [])
+    assert db.HistoryBucket.documents == []
+
+
+async def test_reads_after_compaction(
+    db: SimpleNamespace, chat_history: history.ChatHistory
+) -> None:
+    count = 7
+    await db.History.insert_one({"sessionId": "s1", "messages": []})
+    await append(chat_history, range(count))
+
+    # moved in buckets until the head is back under the threshold
+    (head,) = db.History.documents
+    assert head["archived_count"] == count - len(head["messages"])
+    assert len(head["messages"]) <= BUCKET_THRESHOLD
+    assert [(b["start"], b["end"]) for b in db.HistoryBucket.documents] == [
+        (start, start + BUCKET_SIZE)
+        for start in range(0, head["archived_count"], BUCKET_SIZE)
+    ]
+    assert await chat_history.since("s1", 0) == (count, [turn(i) for i in range(count)])
+    # offsets inside a bucket, at a bucket boundary and in the head document
+    for offset in range(count + 1):
+        assert await chat_history.since("s1", offset) == (
+            count,
+            [turn(i) for i in range(offset, count)],
+        )
+
+
+async def test_only_human_and_ai_messages_are_read(
+    db: SimpleNamespace, chat_history: history.ChatHistory
+) -> None:
+    await db.History.insert_one(
+        {
+            "sessionId": "s1",
+            "messages": [message(0), history.history_message("tool output", "tool")],
+        }
+    )
+
+    assert await chat_history.since("s1", 0) == (2, [turn(0)])
+
+
+async def test_missing_session(chat_history: history.ChatHistory) -> None:
+    assert not await chat_history.append("s1", [message(0)])
+    assert await chat_history.since("s1", 0) == (0, [])
+
+
+async def test_a_push_racing_a_trim_is_kept(
+    db: SimpleNamespace, chat_history: history.ChatHistory
+) -> None:
+    count = 5
+    await db.History.insert_one(
+        {"sessionId": "s1", "messages": [message(i) for i in range(count)]}
+    )
+    update_bucket = db.HistoryBucket.update_one
+
+    async def push_after_the_bucket_is_written(*args: Any, **kwargs: Any) -> Any:
+        result = await update_bucket(*args, **kwargs)
+        if len(db.History.documents[0]["messages"]) == count:
+            # another request appends between the bucket write and the trim
+            await db.History.update_one(
+                {"sessionId": "s1"}, {"$push": {"messages": message(count)}}
+            )
+        return result
+
+    db.HistoryBucket.update_one = push_after_the_bucket_is_written
+    await chat_history.compact("s1")
+
+    # the first trim saw a changed head and was retried on the new one
+    (head,) = db.History.documents
+    assert head["archived_count"] == BUCKET_SIZE
+    assert len(head["messages"]) == count + 1 - BUCKET_SIZE
+    assert [(b["start"], b["end"]) for b in db.HistoryBucket.documents] == [
+        (0, BUCKET_SIZE)
+    ]
+    assert await chat_history.since("s1", 0) == (
+        count + 1,
+        [turn(i) for i in range(count + 1)],
+    )
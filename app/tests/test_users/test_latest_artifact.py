@@ -0,0 +1,44 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.api.endpoints import users
+from app.tests.fake_mongo import Collection
+
+
+@pytest.fixture
+def ideation(monkeypatch: pytest.MonkeyPatch) -> Collection:
+    ideation = Collection()
+    monkeypatch.setattr(users, "read_db", {"Ideation": ideation})
+    return ideation
+
+
+async def test_latest_artifact_returns_newest_of_chat(ideation: Collection) -> None:
+    chat_id, other_chat_id = ObjectId(), ObjectId()
+    now = datetime.now(UTC)
+    for chat, age, name in [
+        (chat_id, 2, "old"),
+        (chat_id, 0, "new"),
+        (chat_id, 1, "middle"),
+        (other_chat_id, -1, "other chat"),
+    ]:
+        await ideation.insert_one(
+            {
+                "_id": ObjectId(),
+                "chat_id": chat,
+                "created_at": now - timedelta(days=age),
+                "name": name,
+            }
+        )
+
+    document = await users.latest_artifact("Ideation", str(chat_id))
+
+    assert document is not None
+    assert document["name"] == "new"
+    assert document["chat_id"] == str(chat_id)
+    assert isinstance(document["_id"], str)
+
+
+async def test_latest_artifact_of_chat_without_artifacts(ideation: Collection) -> None:
+    assert await users.latest_artifact("Ideation", str(ObjectId())) is None
@@ -0,0 +1,128 @@
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+from app.api.endpoints import users
+from app.core.config import get_settings
+from app.tests.fake_mongo import Collection
+
+MESSAGE_KEYS = ("timestamp", "_id")
+
+
+@pytest.fixture
+def read_db(monkeypatch: pytest.MonkeyPatch) -> SimpleNamespace:
+    collections = SimpleNamespace(Message=Collection(), Chat=Collection())
+    monkeypatch.setattr(users, "read_db", collections)
+    return collections
+
+
+def test_cursor_round_trip() -> None:
+    position = {"timestamp": "2024-09-01T10:00:00", "_id": str(ObjectId())}
+
+    assert users.decode_cursor(users.encode_cursor(position), MESSAGE_KEYS) == position
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64 !",
+        users.encode_cursor({"timestamp": 1}),
+        users.encode_cursor({"_id": "x", "timestamp": 1}),
+        users.encode_cursor({"_id": str(ObjectId())}),
+        users.encode_cursor({"_id": str(ObjectId()), "timestamp": {"$ne": None}}),
+        users.encode_cursor([str(ObjectId()), 1]),  # type: ignore[arg-type]
+    ],
+)
+def test_invalid_cursor_is_rejected(cursor: str) -> None:
+    with pytest.raises(HTTPException) as error:
+        users.decode_cursor(cursor, MESSAGE_KEYS)
+
+    assert error.value.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_page_size_is_capped() -> None:
+    settings = get_settings()
+
+    assert users.page_size(None) == settings.MONGO_PAGE_SIZE
+    assert users.page_size(10**9) == settings.MONGO_MAX_PAGE_SIZE
+
+
+async def test_messages_are_paged_in_timestamp_order(
+    read_db: SimpleNamespace,
+) -> None:
+    chat_id, other_chat_id = ObjectId(), ObjectId()
+    # two messages share a timestamp, _id breaks the tie
+    for chat, timestamp, message in [
+        (chat_id, 2.0, "third"),
+        (chat_id, 1.0, "first"),
+        (other_chat_id, 1.5, "other chat"),
+        (chat_id, 1.5, "second"),
+        (chat_id, 2.0, "fourth"),
+        (chat_id, 3.0, "fifth"),
+    ]:
+        await read_db.Message.insert_one(
+            {
+                "_id": ObjectId(),
+                "chat_id": chat,
+                "timestamp": timestamp,
+                "message": message,
+            }
+        )
+
+    pages = []
+    cursor = None
+    while True:
+        page = await users.get_messages_by_chat(str(chat_id), cursor=cursor, limit=2)
+        pages.append([message["message"] for message in page["data"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert pages == [["first", "second"], ["third", "fourth"], ["fifth"]]
+
+
+async def test_chats_are_paged_in_creation_order(
+    read_db: SimpleNamespace,
+) -> None:
+    chat_ids = [ObjectId() for _ in range(3)]
+    for chat_id in reversed(chat_ids):
+        await read_db.Chat.insert_one({"_id": chat_id, "initial_message": "hi"})
+
+    first = await users.get_all_chats(cursor=None, limit=2)
+    second = await users.get_all_chats(cursor=first["next_cursor"], limit=2)
+
+    assert [chat["_id"] for chat in first["data"] + second["data"]] == [
+        str(chat_id) for chat_id in chat_ids
+    ]
+    assert second["next_cursor"] is None
+
+
+@pytest.mark.usefixtures("read_db")
+async def test_message_cursor_without_timestamp_is_a_bad_request() -> None:
+    # a cursor of the chat listing
+    cursor = users.encode_cursor({"_id": str(ObjectId())})
+
+    with pytest.raises(HTTPException) as error:
+        await users.get_messages_by_chat(str(ObjectId()), cursor=cursor, limit=2)
+
+    assert error.value.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.usefixtures("read_db")
+async def test_invalid_chat_id_is_a_bad_request() -> None:
+    with pytest.raises(HTTPException) as error:
+        await users.get_messages_by_chat("not an id", cursor=None, limit=2)
+
+    assert error.value.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.usefixtures("read_db")
+async def test_invalid_chat_cursor_is_a_bad_request() -> None:
+    cursor = users.encode_cursor({"_id": "not an id"})
+
+    with pytest.raises(HTTPException) as error:
+        await users.get_all_chats(cursor=cursor, limit=2)
+
+    assert error.value.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,123 @@
+from collections import defaultdict
+from types import TracebackType
+from typing import Any
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import history
+from app.tests.fake_mongo import Collection
+
+
+class FakeTransaction:
+    def __init__(self, events: list[str]) -> None:
+        self.events = events
+
+    async def __aenter__(self) -> None:
+        self.events.append("start")
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        self.events.append("abort" if exc_type else "commit")
+
+
+class FakeSession:
+    def __init__(self) -> None:
+        self.events: list[str] = []
+
+    async def __aenter__(self) -> "FakeSession":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.events.append("end")
+
+    def start_transaction(self) -> FakeTransaction:
+        return FakeTransaction(self.events)
+
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.sessions: list[FakeSession] = []
+
+    async def start_session(self) -> FakeSession:
+        self.sessions.append(FakeSession())
+        return self.sessions[-1]
+
+
+class FakeDatabase(defaultdict[str, Collection]):
+    def __init__(self) -> None:
+        super().__init__(Collection)
+        self.client = FakeClient()
+
+    def __getattr__(self, name: str) -> Collection:
+        return self[name]
+
+
+@pytest.fixture
+def db() -> FakeDatabase:
+    db = FakeDatabase()
+    db["History"].documents.append({"sessionId": "s1", "messages": []})
+    return db
+
+
+async def test_write_batch_pushes_messages_of_a_session_at_once(
+    db: FakeDatabase,
+) -> None:
+    batch = history.WriteBatch(history.ChatHistory(db))
+
+    batch.add_message("first", "s1", "human")
+    batch.add_message("second", "s1", "ai")
+    document_id = batch.insert("Scripts", {"script": "text"})
+    await batch.flush(transaction=False)
+
+    assert db["History"].documents[0]["messages"] == [
+        history.history_message("first", "human"),
+        history.history_message("second", "ai"),
+    ]
+    # one push for both messages
+    assert db["History"].sessions == [None]
+    assert db["Scripts"].documents == [{"_id": document_id, "script": "text"}]
+    assert db.client.sessions == []
+
+
+async def test_write_batch_skips_inserts_for_missing_session(db: FakeDatabase) -> None:
+    batch = history.WriteBatch(history.ChatHistory(db))
+
+    batch.add_message("first", "s2", "human")
+    batch.insert("Scripts", {"script": "text"})
+    with pytest.raises(HTTPException):
+        await batch.flush(transaction=False)
+
+    assert db["Scripts"].documents == []
+
+
+async def test_write_batch_writes_in_one_transaction(db: FakeDatabase) -> None:
+    batch = history.WriteBatch(history.ChatHistory(db))
+
+    batch.add_message("first", "s1", "human")
+    batch.insert("Scripts", {"script": "text"})
+    await batch.flush(transaction=True)
+
+    (session,) = db.client.sessions
+    assert session.events == ["start", "commit", "end"]
+    assert db["History"].sessions == [session]
+    assert db["Scripts"].sessions == [session]
+
+
+async def test_write_batch_aborts_the_transaction_for_missing_session(
+    db: FakeDatabase,
+) -> None:
+    batch = history.WriteBatch(history.ChatHistory(db))
+
+    batch.add_message("first", "s2", "human")
+    batch.insert("Scripts", {"script": "text"})
+    with pytest.raises(HTTPException):
+        await batch.flush(transaction=True)
+
+    (session,) = db.client.sessions
+    assert session.events == ["start", "abort", "end"]
+    assert db["Scripts"].sessions == []